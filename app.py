@@ -1,34 +1,101 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, g, render_template, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 import os
 from datetime import datetime
 from lxml import etree as ET
 import logging
+import math
+import random
 import re
 import traceback
 import time
+from concurrent.futures import ThreadPoolExecutor
+from workout_parser import (
+    parse_description, node_duration, effort_power, effort_cadence,
+    Effort, OnOff, Repeat, Note, ParseError
+)
+from render_cache import RenderCache, make_key
+from segment_compactor import compact_segments
+import workout_ir as ir
+from batch_workout_generator import WorkoutGenerator, check_sections
+from batch_export import parse_batch_body, render_in_order, stream_zip
+from workout_metrics import batch_metrics
+from zone_table import ZoneTable, load_zone_table
+from workout_template import compile_template, iter_roster, athlete_workout_name
+from template_registry import builtin_templates
+import bookend_workout  # noqa: F401  (registers the bookend template)
+import workout_generator  # noqa: F401  (registers the high_intensity template)
+from config import Config
+from models import Workout, db
+from sqlalchemy import update
+from werkzeug.exceptions import HTTPException
+from upload_queue import UploadQueue
+from output_store import OutputStore
+import app_metrics
+from app_metrics import stage
+from request_capture import RequestCapture
+from workout_library import DEFAULT_PAGE_SIZE, init_library, list_workouts, search_workouts
 
-# Set up logging
+# Set up logging: INFO by default, DEBUG only when asked for
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+# One request line is logged for this fraction of requests, plus every error and slow request
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', 0.01))
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', 1.0))
+
+# Set CAPTURE_REQUESTS_FILE to record anonymized /generate traffic for benchmarks/replay.py
+CAPTURED_ENDPOINTS = {'generate_workout'}
+request_capture = None
+if os.environ.get('CAPTURE_REQUESTS_FILE'):
+    request_capture = RequestCapture(
+        os.environ['CAPTURE_REQUESTS_FILE'],
+        sample_rate=float(os.environ.get('CAPTURE_SAMPLE_RATE', 1.0)),
+        salt=os.environ.get('CAPTURE_SALT')
+    )
+
 app = Flask(__name__, 
     static_folder='static',
     template_folder='templates'
 )
 CORS(app)
+# Bodies are parsed in full before any per-field limit applies; a 1000-item batch fits easily
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_REQUEST_BYTES', 4 * 1024 * 1024))
+app.config['SQLALCHEMY_DATABASE_URI'] = Config.SQLALCHEMY_DATABASE_URI
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = Config.SQLALCHEMY_TRACK_MODIFICATIONS
+db.init_app(app)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    start = g.pop('request_start', None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or 'unmatched'
+    app_metrics.REQUEST_SECONDS.observe(elapsed, endpoint)
+    app_metrics.REQUESTS.inc(endpoint, request.method, str(response.status_code))
+    if response.status_code >= 500:
+        app_metrics.ERRORS.inc(endpoint)
+    if response.status_code >= 500 or elapsed >= SLOW_REQUEST_SECONDS:
+        logger.warning("%s %s %s %.1f ms", request.method, request.path, response.status_code, elapsed * 1000)
+    elif random.random() < REQUEST_LOG_SAMPLE_RATE:
+        logger.info("%s %s %s %.1f ms", request.method, request.path, response.status_code, elapsed * 1000)
+    if request_capture is not None and endpoint in CAPTURED_ENDPOINTS:
+        request_capture.record(request.method, request.path, request.get_json(silent=True),
+                               response.status_code, elapsed, response.content_length)
+    return response
 
 @app.route('/')
 def index():
     try:
-        logger.debug("Attempting to render index.html")
-        logger.debug(f"Current directory: {os.getcwd()}")
-        logger.debug(f"Template folder: {app.template_folder}")
-        logger.debug(f"Templates available: {os.listdir(app.template_folder)}")
-        return render_template('index.html')
+        return render_template('index.html', templates=builtin_templates.cards(TEMPLATE_CARD_ORDER))
     except Exception as e:
         logger.error(f"Error rendering index.html: {str(e)}")
         logger.error(traceback.format_exc())
@@ -38,14 +105,81 @@ def index():
 def test():
     return "App is working!"
 
-# Create a directory for workout files
-if 'DYNO' in os.environ:  # Running on Heroku
+# Create a directory for workout files; WORKOUT_DIR overrides the default location
+if os.environ.get('WORKOUT_DIR'):
+    WORKOUT_DIR = os.environ['WORKOUT_DIR']
+elif 'DYNO' in os.environ:  # Running on Heroku
     WORKOUT_DIR = '/tmp/generated_workouts'  # Use Heroku's ephemeral filesystem
 else:
     WORKOUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generated_workouts')
 os.makedirs(WORKOUT_DIR, exist_ok=True)
 logger.info(f"Using directory for workouts: {WORKOUT_DIR}")
 
+# Saved workouts live in a content-addressed, sharded store, swept by age and total size
+output_store = OutputStore(
+    os.path.join(WORKOUT_DIR, 'store'),
+    ttl=int(os.environ.get('OUTPUT_TTL', 24 * 3600)),
+    max_bytes=int(os.environ.get('OUTPUT_MAX_BYTES', 512 * 1024 * 1024)),
+    sweep_interval=int(os.environ.get('OUTPUT_SWEEP_INTERVAL', 300))
+).start_sweeper()
+
+app_metrics.register_stats('output_store', output_store.stats)
+
+# Zone boundaries and targets; set ZONE_TABLE_FILE to a JSON table to use a coach's own zones
+zone_table = load_zone_table(os.environ.get('ZONE_TABLE_FILE'))
+
+# Cache of rendered ZWO bytes, keyed by the inputs that determine them.
+# Bump RENDER_VERSION whenever build_workout_ir or the rendering changes its output.
+RENDER_VERSION = 5
+render_cache = RenderCache(
+    max_entries=int(os.environ.get('RENDER_CACHE_ENTRIES', 256)),
+    disk_dir=os.path.join(WORKOUT_DIR, 'cache'),
+    max_disk_bytes=int(os.environ.get('RENDER_CACHE_DISK_BYTES', 64 * 1024 * 1024))
+)
+app_metrics.register_stats('render_cache', render_cache.stats)
+
+# Generated workouts are served from memory. Set PERSIST_WORKOUTS to "disk"
+# or "disk,s3" to also keep a copy, written by a background thread.
+PERSIST_TARGETS = {t.strip() for t in os.environ.get('PERSIST_WORKOUTS', '').split(',') if t.strip()}
+persist_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='persist')
+
+def record_s3_key(entry):
+    """Point the uploaded workout's row, if it has one, at its S3 copy."""
+    if entry.workout_id is None:
+        return
+    with app.app_context():
+        db.session.execute(update(Workout).where(Workout.id == entry.workout_id).values(s3_key=entry.s3_key))
+        db.session.commit()
+
+# S3 copies go through a write-behind queue spooled to disk, so they are
+# retried on failure and picked up again after a restart - but only if the
+# spool is on durable storage. The default under WORKOUT_DIR is /tmp on
+# Heroku, which is wiped with the dyno, so pending uploads are lost there
+# unless UPLOAD_SPOOL_DIR points at a persistent volume.
+upload_queue = None
+if 's3' in PERSIST_TARGETS:
+    from storage import Storage
+    if 'DYNO' in os.environ and not os.environ.get('UPLOAD_SPOOL_DIR'):
+        logger.warning("UPLOAD_SPOOL_DIR is not set; pending S3 uploads will not survive a dyno restart")
+    upload_queue = UploadQueue(
+        os.environ.get('UPLOAD_SPOOL_DIR', os.path.join(WORKOUT_DIR, 'spool')),
+        Storage,
+        workers=int(os.environ.get('UPLOAD_WORKERS', 2)),
+        max_attempts=int(os.environ.get('UPLOAD_MAX_ATTEMPTS', 8)),
+        on_uploaded=record_s3_key
+    ).start()
+    app_metrics.register_stats('upload_queue', upload_queue.stats)
+
+if request_capture is not None:
+    app_metrics.register_stats('request_capture', request_capture.stats)
+
+# Shared pool for /generate/batch so concurrent batches can't oversubscribe the dyno
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 4))
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 1000))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch')
+ROSTER_MAX_ATHLETES = int(os.environ.get('ROSTER_MAX_ATHLETES', 5000))
+section_generator = WorkoutGenerator(output_dir=WORKOUT_DIR, zone_table=zone_table)
+
 def sanitize_filename(filename):
     """Sanitize filename by removing invalid characters."""
     # Replace invalid characters with underscores
@@ -61,215 +195,81 @@ def sanitize_filename(filename):
     return filename if filename else "workout"  # Fallback if filename is empty
 
 def parse_workout_description(description):
-    """Parse the workout description into structured segments."""
-    sections = {
-        'warmup': [],
-        'main': [],
-        'cooldown': []
-    }
-    
-    lines = description.split('\n')
-    current_section = 'main'  # Default to main if no section specified
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        # Identify if line contains base/warmup info
-        if 'base' in line.lower() or 'z1-z2' in line.lower():
-            sections['warmup'].append(line)
-            continue
-            
-        # Add to main set by default
-        sections['main'].append(line)
-    
-    return sections
+    """Parse the workout description into a typed AST (see workout_parser)."""
+    return parse_description(description)
 
-def parse_interval_set(text):
-    """Parse interval notation like '6x5' / 3' recovery'."""
-    try:
-        # Extract sets and interval structure
-        sets_match = re.search(r'(\d+)x(\d+)', text)
-        if sets_match:
-            sets = int(sets_match.group(1))
-            interval_length = int(sets_match.group(2))
-        else:
-            sets = 1
-            interval_length = 0
-
-        # Extract recovery
-        recovery_match = re.search(r'(\d+)\'\s*recovery', text)
-        recovery = int(recovery_match.group(1)) * 60 if recovery_match else 0
-
-        # Look for SFR notation
-        sfr_match = re.search(r'SFR.*?(\d+)-(\d+)r', text)
-        sfr_cadence = None
-        if sfr_match:
-            sfr_cadence_low = int(sfr_match.group(1))
-            sfr_cadence_high = int(sfr_match.group(2))
-            sfr_cadence = (sfr_cadence_low + sfr_cadence_high) // 2
-
-        return {
-            'sets': sets,
-            'interval_length': interval_length * 60,  # Convert to seconds
-            'recovery': recovery,
-            'sfr_cadence': sfr_cadence
-        }
-    except Exception as e:
-        logger.error(f"Error parsing interval set: {e}")
-        return None
+def effort_segment(effort, default_power=None):
+    """Steady segment for a single effort."""
+    return ir.steady(effort.duration, effort_power(effort, default_power, zone_table), effort_cadence(effort))
 
-def parse_power_zone(text):
-    """Convert zone notation to FTP percentages."""
-    text = text.lower()
-    
-    # Handle max efforts
-    if 'max' in text:
-        return 1.2  # 120% FTP
-        
-    # Handle zone notation
-    if 'z1' in text:
-        return 0.5  # 50% FTP
-    elif 'z2' in text:
-        return 0.65  # 65% FTP
-    elif 'z3' in text:
-        return 0.83  # 83% FTP
-    elif 'z4' in text:
-        return 0.98  # 98% FTP
-    elif 'z5' in text:
-        return 1.13  # 113% FTP
-    elif 'z6' in text:
-        return 1.2  # 120% FTP
-        
-    # Default to Z2 if no zone specified
-    return 0.65
-
-def parse_duration(text):
-    """Extract duration in seconds from text."""
-    # Default duration (5 minutes)
-    duration = 300
-    
-    # Look for time indicators
-    if 'min' in text.lower():
-        try:
-            duration = int(re.search(r'(\d+)\s*min', text.lower()).group(1)) * 60
-        except (AttributeError, ValueError):
-            pass
-    elif 'sec' in text.lower():
-        try:
-            duration = int(re.search(r'(\d+)\s*sec', text.lower()).group(1))
-        except (AttributeError, ValueError):
-            pass
-            
-    return str(duration)
-
-def create_30_30_workout(workout_section):
-    """Create a 30/30 over/under workout structure."""
-    # Warm-up (15 minutes progressive)
-    ET.SubElement(workout_section, "Warmup",
-                 Duration="900",  # 15 minutes
-                 PowerLow="0.50",  # 50% FTP
-                 PowerHigh="0.75",  # 75% FTP
-                 Cadence="85")
-
-    # 5 minutes steady state
-    ET.SubElement(workout_section, "SteadyState",
-                 Duration="300",  # 5 minutes
-                 Power="0.75",    # 75% FTP
-                 Cadence="90")
-
-    # Main set: 3 sets of 10 minutes (30 sec over, 30 sec under)
-    for _ in range(3):
-        # 10 minutes of 30/30s (20 repetitions)
-        ET.SubElement(workout_section, "IntervalsT",
-                     Repeat="10",           # 10 repeats = 10 minutes
-                     OnDuration="30",       # 30 seconds over
-                     OffDuration="30",      # 30 seconds under
-                     OnPower="1.05",        # 105% FTP (over)
-                     OffPower="0.95",       # 95% FTP (under)
-                     Cadence="90")
-        
+def on_off_repeat(repeat, on, off):
+    """IntervalsT for a simple on/off repetition."""
+    return ir.intervals(repeat, on.duration, effort_power(on, 1.0, zone_table),  # 100% FTP unless specified
+                        off.duration, effort_power(off, None, zone_table), effort_cadence(on))
+
+def done_as_nodes(effort):
+    """Fill an effort's duration with its "done as..." sub-block."""
+    body_duration = sum(node_duration(node) for node in effort.body)
+    if not body_duration:
+        return [effort_segment(effort, 1.0)]
+    copies = max(1, effort.duration // body_duration)
+    segments = [node for node in effort.body if not isinstance(node, Note)]
+    if len(segments) == 1 and isinstance(segments[0], OnOff) and not segments[0].on.body:
+        return [on_off_repeat(copies, segments[0].on, segments[0].off)]
+    body = [segment for node in segments for segment in workout_nodes(node)]
+    return [ir.Repeat(copies, body)]
+
+def workout_nodes(node):
+    """IR nodes for one parsed description node."""
+    if isinstance(node, Repeat):
+        child = node.child
+        if isinstance(child, OnOff) and not child.on.body:
+            return [on_off_repeat(node.count, child.on, child.off)]
+        if isinstance(child, Effort) and not child.body:
+            # Repeated efforts ("2x20") are work: 100% FTP unless specified
+            return [ir.Repeat(node.count, [effort_segment(child, 1.0)])]
+        return [ir.Repeat(node.count, workout_nodes(child))]
+    if isinstance(node, OnOff):
+        if node.on.body:
+            return done_as_nodes(node.on) + [effort_segment(node.off)]
+        return [on_off_repeat(1, node.on, node.off)]
+    if isinstance(node, Effort):
+        return done_as_nodes(node) if node.body else [effort_segment(node)]
+    return []
+
+def thirty_thirty_segments():
+    """Segments for the 30/30 over/under workout."""
+    segments = [
+        ir.warmup(900, 0.50, 0.75, 85),     # 15 minutes progressive, 50-75% FTP
+        ir.steady(300, 0.75, 90),           # 5 minutes steady state @ 75% FTP
+    ]
+    # Main set: 3 sets of 10 minutes (30 sec over @ 105%, 30 sec under @ 95%)
+    for set_index in range(3):
+        segments.append(ir.intervals(10, 30, 1.05, 30, 0.95, 90))
         # 3 minutes recovery between sets
-        if _ < 2:  # Don't add recovery after last set
-            ET.SubElement(workout_section, "SteadyState",
-                         Duration="180",     # 3 minutes
-                         Power="0.65",       # 65% FTP
-                         Cadence="85")
-
-    # Cool-down (10 minutes)
-    ET.SubElement(workout_section, "Cooldown",
-                 Duration="600",  # 10 minutes
-                 PowerLow="0.75", # 75% FTP
-                 PowerHigh="0.50", # 50% FTP
-                 Cadence="85")
-
-def create_gavin_special_workout(workout_section):
-    """Create the Gavin Special workout structure."""
-    # Progressive Warm-up (15 minutes)
-    ET.SubElement(workout_section, "Warmup",
-                 Duration="900",  # 15 minutes
-                 PowerLow="0.50",  # Z1
-                 PowerHigh="0.75",  # Z2
-                 Cadence="85")
-    
-    # High cadence section (10 minutes at Z3)
-    ET.SubElement(workout_section, "SteadyState",
-                 Duration="600",  # 10 minutes
-                 Power="0.85",    # Z3
-                 Cadence="100")
-    
-    # 3x30s building efforts
-    for _ in range(3):
-        ET.SubElement(workout_section, "Ramp",
-                     Duration="30",   # 30 seconds
-                     PowerLow="0.85", # Z3
-                     PowerHigh="1.05", # Z5
-                     Cadence="95")
-        ET.SubElement(workout_section, "SteadyState",
-                     Duration="30",   # 30 seconds recovery
-                     Power="0.65",    # Z2
-                     Cadence="85")
-    
+        if set_index < 2:  # Don't add recovery after last set
+            segments.append(ir.steady(180, 0.65, 85))
+    segments.append(ir.cooldown(600, 0.75, 0.50, 85))  # 10 minutes
+    return segments
+
+def gavin_special_segments():
+    """Segments for the Gavin Special workout."""
+    segments = [
+        ir.warmup(900, 0.50, 0.75, 85),     # 15 minute progressive warm-up, Z1 to Z2
+        ir.steady(600, 0.85, 100),          # 10 minutes high cadence Z3
+        # 3x30s building efforts, Z3 to Z5, with 30 seconds Z2 recovery
+        ir.Repeat(3, [ir.ramp(30, 0.85, 1.05, 95), ir.steady(30, 0.65, 85)]),
+    ]
     # Main Set (4 x 8-minute blocks)
-    for _ in range(4):
-        # First 40/20 block (2 minutes = 3 repeats)
-        ET.SubElement(workout_section, "IntervalsT",
-                     Repeat="3",
-                     OnDuration="40",
-                     OffDuration="20",
-                     OnPower="1.2",    # Z6/Max
-                     OffPower="0.65",   # Z2
-                     Cadence="100")
-        
-        # 4 min Z3/Z4 block
-        ET.SubElement(workout_section, "SteadyState",
-                     Duration="240",    # 4 minutes
-                     Power="0.9",       # Z3/Z4
-                     Cadence="90")
-        
-        # Second 40/20 block
-        ET.SubElement(workout_section, "IntervalsT",
-                     Repeat="3",
-                     OnDuration="40",
-                     OffDuration="20",
-                     OnPower="1.2",    # Z6/Max
-                     OffPower="0.65",   # Z2
-                     Cadence="100")
-        
+    for block in range(4):
+        segments.append(ir.intervals(3, 40, 1.2, 20, 0.65, 100))  # 40/20s, Z6/Max and Z2
+        segments.append(ir.steady(240, 0.9, 90))                   # 4 min Z3/Z4 block
+        segments.append(ir.intervals(3, 40, 1.2, 20, 0.65, 100))
         # Recovery
-        if _ < 3:  # Don't add recovery after last set
-            ET.SubElement(workout_section, "SteadyState",
-                         Duration="240",    # 4 minutes
-                         Power="0.65",      # Z2
-                         Cadence="85")
-    
-    # Cool-down (10 minutes)
-    ET.SubElement(workout_section, "Cooldown",
-                 Duration="600",  # 10 minutes
-                 PowerLow="0.75", # Z2
-                 PowerHigh="0.50", # Z1
-                 Cadence="85")
+        if block < 3:  # Don't add recovery after last set
+            segments.append(ir.steady(240, 0.65, 85))
+    segments.append(ir.cooldown(600, 0.75, 0.50, 85))  # 10 minutes, Z2 to Z1
+    return segments
 
 def format_workout_description(workout_name, description):
     """Format the workout description with pre-activity instructions and structure."""
@@ -317,139 +317,362 @@ def format_workout_description(workout_name, description):
 - 10 min easy"""
     return description
 
-def create_workout_xml(name, description):
-    """Create the XML structure for a workout."""
-    # Create root element
-    workout_file = ET.Element("workout_file")
-    
-    # Add author
-    author = ET.SubElement(workout_file, "author")
-    author.text = "Gravel God Cycling"
-    
-    # Add name
-    workout_name = ET.SubElement(workout_file, "name")
-    workout_name.text = name
-    
-    # Add description
-    workout_description = ET.SubElement(workout_file, "description")
-    workout_description.text = format_workout_description(name, description)
-    
-    # Add sportType
-    sport_type = ET.SubElement(workout_file, "sportType")
-    sport_type.text = "bike"
-    
-    # Add workout tag
-    tags = ET.SubElement(workout_file, "tags")
-    tag = ET.SubElement(tags, "tag")
-    tag.text = "Gravel God Cycling"
-    
-    # Add workout section
-    workout = ET.SubElement(workout_file, "workout")
-    
-    # Parse the description and create workout structure
-    sections = parse_workout_description(description)
-    
+TEMPLATE_CARD_ORDER = ['gavin', 'bookend']
+
+def builtin_workout(name, segments):
+    return ir.Workout(name, format_workout_description(name, ''), segments, tags=["Gravel God Cycling"])
+
+builtin_templates.register('gavin', lambda: builtin_workout("Gavin Special", gavin_special_segments()),
+                           card=True, title="Gavin Special",
+                           summary="High-intensity intervals with perfect recovery ratios",
+                           badges=["40/20s", "Z6"])
+builtin_templates.register('30_30', lambda: builtin_workout("30/30 Over Under", thirty_thirty_segments()))
+
+def build_workout_ir(name, description, compact=True):
+    """Parse a description into a workout IR, compacted unless told otherwise."""
+    with stage('description_parse'):
+        parsed = parse_workout_description(description)
+    with stage('ir_build'):
+        return _build_parsed_ir(name, description, parsed, compact)
+
+def _build_parsed_ir(name, description, parsed, compact):
+    segments = []
     # Add warmup if present
-    if sections['warmup']:
-        ET.SubElement(workout, "Warmup",
-                     Duration="900",  # 15 minutes
-                     PowerLow="0.50",  # Z1
-                     PowerHigh="0.75",  # Z2
-                     Cadence="85")
-    
+    if parsed.base is not None:
+        segments.append(ir.warmup(900, 0.50, 0.75, 85))  # 15 minutes, Z1 to Z2
     # Process main set
-    for line in sections['main']:
-        if 'x' in line:  # Interval set
-            interval_data = parse_interval_set(line)
-            if interval_data:
-                # Add intervals
-                ET.SubElement(workout, "IntervalsT",
-                            Repeat=str(interval_data['sets']),
-                            OnDuration=str(interval_data['interval_length']),
-                            OffDuration=str(interval_data['recovery']),
-                            OnPower="1.0",  # 100% FTP
-                            OffPower="0.65",  # Recovery
-                            Cadence="90")
-        else:
-            # Add steady state
-            ET.SubElement(workout, "SteadyState",
-                        Duration=parse_duration(line),
-                        Power=str(parse_power_zone(line)),
-                        Cadence="90")
-    
+    for node in parsed.items:
+        segments.extend(workout_nodes(node))
     # Add cooldown
-    ET.SubElement(workout, "Cooldown",
-                 Duration="600",  # 10 minutes
-                 PowerLow="0.75",  # Z2
-                 PowerHigh="0.50",  # Z1
-                 Cadence="85")
-    
-    return workout_file
-
-def generate_zwo_file(name, description):
-    """Generate a ZWO file from the workout description."""
-    try:
-        # Sanitize the filename
-        safe_filename = sanitize_filename(name)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{safe_filename}_{timestamp}.zwo"
-        
-        # Create full path
-        filepath = os.path.join(WORKOUT_DIR, filename)
-        
-        # Create the XML structure
-        workout_xml = create_workout_xml(name, description)
-        
-        # Save the file
-        with open(filepath, 'wb') as f:
-            f.write(ET.tostring(workout_xml, pretty_print=True, xml_declaration=True, encoding='UTF-8'))
-        
-        return filename
-        
-    except Exception as e:
-        logger.error(f"Error generating ZWO file: {str(e)}\n{traceback.format_exc()}")
-        raise
+    segments.append(ir.cooldown(600, 0.75, 0.50, 85))  # 10 minutes, Z2 to Z1
+    segments = compact_segments(segments) if compact else ir.expand(segments)
+    return ir.Workout(name, format_workout_description(name, description), segments,
+                      tags=["Gravel God Cycling"])
+
+def render_cache_key(name, description):
+    """Cache key covering everything that changes the rendered workout."""
+    return make_key(RENDER_VERSION, name, description, zone_table.to_dict())
+
+def render_workout(name, description):
+    """Return the serialized ZWO bytes for a workout, using the render cache."""
+    def render():
+        workout = build_workout_ir(name, description)
+        with stage('xml_build'):
+            workout_xml = ir.to_element(workout, ET)
+        with stage('serialize'):
+            return ET.tostring(workout_xml, pretty_print=True, xml_declaration=True, encoding='UTF-8')
+    return render_cache.get_or_render(render_cache_key(name, description), render)
+
+def workout_filename(name):
+    """Build the timestamped download filename for a workout."""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"{sanitize_filename(name)}_{timestamp}.zwo"
+
+def save_workout_file(name, data, workout_id=None):
+    """Save rendered workout bytes in the output store (and queue the S3 upload
+    if enabled); returns the collision-free store filename. Once uploaded, the
+    library row ``workout_id``, if given, gets the object's S3 key."""
+    with stage('disk_write'):
+        filename = output_store.put(sanitize_filename(name), data)
+    if upload_queue is not None:
+        upload_queue.enqueue(filename, data, workout_id=workout_id)
+    return filename
+
+def persist_in_background(name, data, workout_id=None):
+    """Queue an opt-in copy of a served workout without blocking the request."""
+    if not PERSIST_TARGETS:
+        return None
+    future = persist_executor.submit(save_workout_file, name, data, workout_id)
+    future.add_done_callback(_log_persist_failure)
+    return future
+
+def _log_persist_failure(future):
+    if future.exception() is not None:
+        logger.error(f"Error persisting workout: {future.exception()}")
+
+def zwo_response(filename, data):
+    """Build an attachment response straight from in-memory ZWO bytes."""
+    timer = stage('send').start()
+    response = Response(
+        data,
+        mimetype='application/xml',
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Content-Length': str(len(data))
+        }
+    )
+    # Closed once the server has written the body
+    response.call_on_close(timer.stop)
+    return response
 
 @app.route('/generate', methods=['POST'])
 def generate_workout():
     try:
-        data = request.get_json()
-        
-        # Get the workout name and description
-        workout_name = data.get('name', '').strip()
-        workout_description = data.get('description', '').strip()
+        with stage('request_parse'):
+            data = request.get_json()
+
+            # Get the workout name and description
+            workout_name = data.get('name', '').strip()
+            workout_description = data.get('description', '').strip()
+            # Set when re-rendering a saved library workout, so its row learns the S3 key
+            workout_id = data.get('workout_id')
         
         if not workout_name or not workout_description:
             return jsonify({'error': 'Missing workout name or description'}), 400
+        if workout_id is not None:
+            if not isinstance(workout_id, int) or isinstance(workout_id, bool):
+                return jsonify({'error': 'workout_id must be an integer'}), 400
+            if db.session.get(Workout, workout_id) is None:
+                return jsonify({'error': f'Workout {workout_id} not found'}), 404
             
-        # Generate the workout file
-        filename = generate_zwo_file(workout_name, workout_description)
-        
-        # Create full path for the workout file
-        filepath = os.path.join(WORKOUT_DIR, filename)
+        # Render the workout in memory; saving a copy is opt-in and off the request path
+        filename = workout_filename(workout_name)
+        zwo_bytes = render_workout(workout_name, workout_description)
+        persist_in_background(workout_name, zwo_bytes, workout_id)
         
-        # Return the file
-        return send_file(
-            filepath,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/xml'
-        )
+        return zwo_response(filename, zwo_bytes)
         
+    except ParseError as e:
+        return jsonify({'error': f'Could not parse workout description: {str(e)}'}), 400
+    except HTTPException:
+        # e.g. a body over MAX_CONTENT_LENGTH (413)
+        raise
     except Exception as e:
         logger.error(f"Error generating workout: {str(e)}\n{traceback.format_exc()}")
         return jsonify({'error': f'Error generating workout: {str(e)}'}), 500
 
+def batch_item_name(item):
+    return str(item.get('name') or item.get('workout_name') or 'workout').strip()
+
+def render_batch_item(item):
+    """Render one /generate/batch item in either accepted format."""
+    if 'sections' in item:
+        workout_data = dict(item)
+        workout_data.setdefault('workout_name', batch_item_name(item))
+        workout_data.setdefault('description', '')
+        return section_generator.render_workout(workout_data)
+    name = batch_item_name(item)
+    description = str(item.get('description', '')).strip()
+    if not description:
+        raise ValueError('Missing workout description')
+    return render_workout(name, description)
+
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    """Render a JSON array or JSON Lines batch and stream back a ZIP."""
+    try:
+        items = parse_batch_body(request.get_data(as_text=True))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid batch: {str(e)}'}), 400
+    if not items:
+        return jsonify({'error': 'Empty batch'}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Batch is limited to {BATCH_MAX_ITEMS} workouts'}), 400
+    # Out-of-range sections would be expanded before failing, so refuse the batch up front
+    for index, item in enumerate(items):
+        if 'sections' in item:
+            try:
+                check_sections(item['sections'])
+            except ValueError as e:
+                return jsonify({'error': f'Workout {index}: {str(e)}'}), 400
+
+    results = render_in_order(items, render_batch_item, batch_executor, window=2 * BATCH_WORKERS)
+    archive = stream_zip(results, batch_item_name, lambda name: f"{sanitize_filename(name)}.zwo")
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return Response(
+        stream_with_context(archive),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="workouts_{timestamp}.zip"'}
+    )
+
+def build_batch_item_ir(item):
+    """Workout IR for one item in either /generate/batch format."""
+    if 'sections' in item:
+        workout_data = dict(item)
+        workout_data.setdefault('workout_name', batch_item_name(item))
+        workout_data.setdefault('description', '')
+        return section_generator.build_workout_ir(workout_data)
+    description = str(item.get('description', '')).strip()
+    if not description:
+        raise ValueError('Missing workout description')
+    return build_workout_ir(batch_item_name(item), description)
+
+@app.route('/generate/roster', methods=['POST'])
+def generate_roster():
+    """Render one workout for a roster of athletes and stream back a ZIP.
+
+    The body is a /generate/batch item plus ``athletes``: a list of
+    ``{"name", "ftp", "watts"}`` objects. The workout is compiled once and
+    each athlete's file is spliced from the pre-serialized template.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    athletes = data.get('athletes')
+    if not isinstance(athletes, list) or not athletes:
+        return jsonify({'error': 'athletes must be a non-empty list'}), 400
+    if len(athletes) > ROSTER_MAX_ATHLETES:
+        return jsonify({'error': f'Roster is limited to {ROSTER_MAX_ATHLETES} athletes'}), 400
+    try:
+        template = compile_template(build_batch_item_ir(data))
+    except (ParseError, ValueError, KeyError) as e:
+        return jsonify({'error': f'Invalid workout: {str(e)}'}), 400
+
+    archive = stream_zip(iter_roster(template, athletes),
+                         lambda athlete: athlete_workout_name(template.name, athlete),
+                         lambda name: f"{sanitize_filename(name)}.zwo")
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return Response(
+        stream_with_context(archive),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{sanitize_filename(template.name)}_roster_{timestamp}.zip"'}
+    )
+
+@app.route('/workouts/metrics', methods=['POST'])
+def workouts_metrics():
+    """NP, IF, TSS, kJ and time in zone for a batch of workouts at a given FTP."""
+    data = request.get_json(silent=True) or {}
+    items = data.get('workouts')
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return jsonify({'error': 'workouts must be a list of objects'}), 400
+    try:
+        ftp = float(data.get('ftp', 0))
+    except (TypeError, ValueError):
+        ftp = 0
+    if not math.isfinite(ftp) or ftp <= 0:
+        return jsonify({'error': 'ftp must be a positive number of watts'}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Batch is limited to {BATCH_MAX_ITEMS} workouts'}), 400
+    # An athlete's own zones can be sent along; otherwise the app's table is used
+    zones = zone_table
+    if data.get('zones') is not None:
+        try:
+            zones = ZoneTable.from_dict(data['zones'])
+        except (AttributeError, TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid zones: {str(e)}'}), 400
+
+    workouts = []
+    for index, item in enumerate(items):
+        try:
+            workouts.append(build_batch_item_ir(item))
+        except (ParseError, ValueError, KeyError) as e:
+            return jsonify({'error': f'Workout {index}: {str(e)}'}), 400
+    metrics = batch_metrics(workouts, ftp, zones)
+    for item, result in zip(items, metrics):
+        result['name'] = batch_item_name(item)
+    return jsonify({'ftp': ftp, 'workouts': metrics})
+
+@app.route('/templates')
+def list_templates():
+    """Built-in templates with the name and description to prefill the form."""
+    templates = []
+    for key in builtin_templates.keys():
+        template = builtin_templates.get(key)
+        templates.append({'key': key, 'name': template.name, 'description': template.description})
+    return jsonify(templates)
+
+@app.route('/templates/<key>')
+def download_template(key):
+    """Serve a pre-rendered built-in template, optionally renamed with ?name=."""
+    if key not in builtin_templates:
+        return jsonify({'error': f'Unknown template: {key}'}), 404
+    name = request.args.get('name', '').strip() or None
+    try:
+        data = builtin_templates.render(key, name=name)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return zwo_response(f"{sanitize_filename(name or builtin_templates.get(key).name or key)}.zwo", data)
+
+def optional_arg(name, convert):
+    """A query-string value converted with ``convert``, or None if absent/blank."""
+    value = request.args.get(name, '').strip()
+    if not value:
+        return None
+    try:
+        return convert(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+
+@app.route('/library/search')
+def library_search():
+    """Search saved workouts: ?q= text plus duration/power/Z5/category filters.
+
+    Durations and Z5 time are in seconds, max_power a decimal of FTP.
+    Pages are newest first; pass next_cursor back as ?after= for the next.
+    """
+    try:
+        workouts, next_cursor = search_workouts(
+            query=request.args.get('q', '').strip() or None,
+            category=request.args.get('category', '').strip() or None,
+            min_duration=optional_arg('min_duration', int),
+            max_duration=optional_arg('max_duration', int),
+            max_power=optional_arg('max_power', float),
+            min_z5_seconds=optional_arg('min_z5_seconds', int),
+            templates_only=request.args.get('templates') in ('1', 'true'),
+            after=optional_arg('after', int),
+            limit=optional_arg('limit', int) or DEFAULT_PAGE_SIZE,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return workout_page(workouts, next_cursor)
+
+@app.route('/library/workouts')
+def library_workouts():
+    """Saved workouts, newest first, optionally for one ?user_id= or ?category=.
+
+    Pages are keyset-paginated; pass next_cursor back as ?after= for the next.
+    """
+    try:
+        workouts, next_cursor = list_workouts(
+            user_id=optional_arg('user_id', int),
+            category=request.args.get('category', '').strip() or None,
+            templates_only=request.args.get('templates') in ('1', 'true'),
+            after=request.args.get('after', '').strip() or None,
+            limit=optional_arg('limit', int) or DEFAULT_PAGE_SIZE,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return workout_page(workouts, next_cursor)
+
+def workout_page(workouts, next_cursor):
+    """JSON page of workouts with an ETag, answering 304 if the client's copy is current."""
+    response = jsonify({'workouts': [workout.to_dict() for workout in workouts], 'next_cursor': next_cursor})
+    response.add_etag()
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(render_cache.stats())
+
+@app.route('/uploads/stats')
+def upload_stats():
+    """Write-behind upload queue depth, lag and counters."""
+    if upload_queue is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **upload_queue.stats()})
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text-format metrics for this worker."""
+    return Response(app_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/outputs/stats')
+def output_stats():
+    return jsonify(output_store.stats())
+
 @app.route('/download/<filename>')
 def download(filename):
     try:
-        filepath = os.path.join(WORKOUT_DIR, filename)
-        logger.info(f"Attempting to download: {filepath}")
-        
-        if not os.path.exists(filepath):
-            raise FileNotFoundError(f"Workout file not found: {filename}")
-            
+        # The shard is part of the name, so this is one stat, not a directory scan
+        filepath = output_store.open_path(filename)
+        logger.debug("Serving download: %s", filepath)
         return send_file(filepath, as_attachment=True)
+    except FileNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 404
     except Exception as e:
         logger.error(f"Error in download: {e}\n{traceback.format_exc()}")
         return jsonify({
@@ -457,6 +680,24 @@ def download(filename):
             'message': str(e)
         }), 500
 
+# Pre-render the built-in templates once per worker
+builtin_templates.warm()
+
+def init_db():
+    """Create the tables and bring the library schema up to date; safe to repeat."""
+    with app.app_context():
+        db.create_all()
+        init_library()
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create or migrate the database schema."""
+    init_db()
+
+# Schema changes race when every gunicorn worker runs them at once, so they
+# are not made at import: the Procfile runs ``flask --app app init-db`` in
+# the release phase, before any worker starts
 if __name__ == '__main__':
+    init_db()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,163 @@
+"""In-process request metrics in the Prometheus text format.
+
+Counters and fixed-bucket histograms are plain Python objects behind a
+lock; observing a value is a bisect and a few additions, so timers can sit
+on the hot path of every request. :func:`render` writes everything in the
+text exposition format for a ``/metrics`` endpoint, plus gauges pulled at
+scrape time from registered ``stats()`` callables (caches, queues).
+
+The numbers live in the process that observed them. Under gunicorn with
+several workers each scrape of ``/metrics`` is answered by whichever worker
+takes the request, so successive scrapes mix unrelated counters and rates
+come out wrong. Run a single worker (``-w 1``, with ``--threads`` for
+concurrency) when the metrics matter, or scrape each worker directly.
+"""
+import re
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Seconds; spans a cached render (sub-millisecond) up to a large batch
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NAME_RE = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    text = ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                    for name, value in pairs)
+    return '{' + text + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels) -> 'Timer':
+        return Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Timer:
+    """``with histogram.time(label):`` - observes the elapsed seconds on exit.
+
+    For a span that doesn't fit a ``with`` block, call :meth:`start` and
+    later :meth:`stop`.
+    """
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = None
+
+    def start(self) -> 'Timer':
+        self.started = perf_counter()
+        return self
+
+    def stop(self) -> float:
+        """Observe and return the seconds since :meth:`start`."""
+        if self.started is None:
+            raise RuntimeError("Timer stopped before it was started")
+        elapsed = perf_counter() - self.started
+        self.started = None
+        self.histogram.observe(elapsed, *self.labels)
+        return elapsed
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+REQUESTS = Counter('zwo_http_requests_total', 'HTTP requests by endpoint, method and status.',
+                   ('endpoint', 'method', 'status'))
+ERRORS = Counter('zwo_http_errors_total', 'Requests that raised or returned a 5xx, by endpoint.', ('endpoint',))
+REQUEST_SECONDS = Histogram('zwo_http_request_duration_seconds', 'Request handling time by endpoint.',
+                            ('endpoint',))
+STAGE_SECONDS = Histogram('zwo_stage_duration_seconds',
+                          'Time spent in each stage of workout generation.', ('stage',))
+
+_metrics = [REQUESTS, ERRORS, REQUEST_SECONDS, STAGE_SECONDS]
+_stats_sources: List[Tuple[str, Callable[[], Optional[Dict]]]] = []
+
+
+def stage(name: str) -> Timer:
+    """Time one stage of the hot path: ``with stage('serialize'): ...``."""
+    return Timer(STAGE_SECONDS, (name,))
+
+
+def register_stats(prefix: str, stats: Callable[[], Optional[Dict]]):
+    """Expose the numeric values of ``stats()`` as ``zwo_<prefix>_<key>`` gauges at scrape time."""
+    _stats_sources.append((prefix, stats))
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for prefix, stats in _stats_sources:
+        for key, value in sorted((stats() or {}).items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = _NAME_RE.sub('_', f"zwo_{prefix}_{key}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_number(value)}")
+    return '\n'.join(lines) + '\n'
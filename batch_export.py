@@ -0,0 +1,107 @@
+"""Render many workouts concurrently and stream them out as a ZIP archive.
+
+Used by the ``/generate/batch`` route. Items are rendered on a shared,
+bounded thread pool with only a small window of them in flight, and each
+finished entry is flushed to the client before the next one is awaited,
+so neither the rendered trees nor the whole archive are ever held in
+memory at once.
+"""
+import json
+import os
+import zipfile
+from collections import deque
+
+
+class _ZipSink:
+    """Write-only, non-seekable file object that collects ZIP output.
+
+    zipfile falls back to data descriptors when it cannot seek, which is
+    what lets entries be streamed as soon as they are written.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parse_batch_body(body):
+    """Parse a batch request body: a JSON array or JSON Lines of objects."""
+    text = body.strip()
+    if text.startswith('['):
+        items = json.loads(text)
+    else:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if not all(isinstance(item, dict) for item in items):
+        raise ValueError("Each batch item must be a JSON object")
+    return items
+
+
+def render_in_order(items, render_item, executor, window):
+    """Yield ``(index, item, data, error)`` in input order.
+
+    At most ``window`` items are submitted ahead of the one being yielded.
+    """
+    pending = deque()
+    items = iter(enumerate(items))
+    try:
+        for index, item in items:
+            pending.append((index, item, executor.submit(render_item, item)))
+            if len(pending) >= window:
+                yield _result(*pending.popleft())
+        while pending:
+            yield _result(*pending.popleft())
+    finally:
+        for _, _, future in pending:
+            future.cancel()
+
+
+def _result(index, item, future):
+    try:
+        return index, item, future.result(), None
+    except Exception as e:
+        return index, item, None, e
+
+
+def stream_zip(results, item_name, entry_name):
+    """Stream a ZIP of rendered results, ending with a manifest.json entry.
+
+    ``item_name(item)`` gives the display name of an item and
+    ``entry_name(name)`` the file name to use inside the archive.
+    """
+    sink = _ZipSink()
+    manifest = []
+    used_names = set()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, item, data, error in results:
+            name = item_name(item)
+            if error is not None:
+                manifest.append({'index': index, 'name': name, 'status': 'error', 'error': str(error)})
+                continue
+            filename = entry_name(name)
+            stem, ext = os.path.splitext(filename)
+            copy = 1
+            while filename in used_names:
+                copy += 1
+                filename = f"{stem}_{copy}{ext}"
+            used_names.add(filename)
+            archive.writestr(filename, data)
+            manifest.append({'index': index, 'name': name, 'status': 'ok', 'file': filename})
+            yield sink.drain()
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+    yield sink.drain()
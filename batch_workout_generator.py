@@ -2,54 +2,36 @@ import xml.etree.ElementTree as ET
 import os
 from datetime import datetime
 import json
-from typing import List, Dict
+import codecs
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Dict, Tuple, Iterable, Iterator, Optional
+from segment_compactor import compact_segments
+import workout_ir as ir
+from zwo_writer import serialize, write_workout
+from zone_table import DEFAULT_ZONE_TABLE, ZoneTable
+from workout_parser import MAX_WORKOUT_DURATION
 
 class WorkoutGenerator:
-    def __init__(self, output_dir: str = None):
+    def __init__(self, output_dir: str = None, zone_table: ZoneTable = None):
         self.output_dir = output_dir or os.path.expanduser("~/Desktop")
         os.makedirs(self.output_dir, exist_ok=True)
         
-        # Define zone boundaries based on FTP percentages
-        self.zones = {
-            "Z1": (0, 0.55),
-            "Z2": (0.56, 0.75),
-            "Z3": (0.76, 0.90),
-            "Z4": (0.91, 1.05),
-            "Z5": (1.06, 1.20),
-            "Z6": "Max Effort",
-            "Z7": "Max Effort"
-        }
-        
-        # Define RPE scale
-        self.rpe_scale = {
-            "Z1": "1-2",
-            "Z2": "2-3",
-            "Z3": "4-5",
-            "Z4": "6-7",
-            "Z5": "8-9",
-            "Z6": "9-10",
-            "Z7": "10"
-        }
+        # Zone boundaries (as decimal of FTP) and RPE scale
+        self.zone_table = zone_table or DEFAULT_ZONE_TABLE
+        self.zones = self.zone_table.zones
+        self.rpe_scale = self.zone_table.rpe_scale
+
+        # Structured errors from the most recent batch_generate call
+        self.errors = []
 
     def power_to_zone(self, power_decimal: float) -> str:
         """Convert power as decimal of FTP to appropriate zone."""
-        for zone, (lower, upper) in self.zones.items():
-            if isinstance(lower, (int, float)) and isinstance(upper, (int, float)):
-                if lower <= power_decimal <= upper:
-                    return f"{zone}, RPE {self.rpe_scale[zone]}"
-        if power_decimal > 1.20:
-            return f"Max Effort, RPE {self.rpe_scale['Z6']}"
-        return "Z1, RPE 1-2"  # Default fallback
-
-    def generate_workout(self, workout_data: Dict) -> str:
-        """Generate a single workout file and return the filename."""
-        # Create the root element
-        workout = ET.Element("workout_file")
-
-        # Add required elements in correct order
-        ET.SubElement(workout, "author").text = "Gravel God Cycling"
-        ET.SubElement(workout, "name").text = workout_data["workout_name"]
-        
+        return self.zone_table.label(power_decimal)
+
+    def build_workout_ir(self, workout_data: Dict, compact: bool = True) -> ir.Workout:
+        """Build the workout IR for a single workout."""
         # Standard pre-activity instructions
         standard_instructions = """► Pre-activity Instructions:
 - Ensure adequate carbohydrate intake (50-75g/hour for workouts >90min)
@@ -67,88 +49,321 @@ class WorkoutGenerator:
         
         # Combine standard instructions with workout-specific description
         full_description = standard_instructions + workout_data["description"]
-        
-        # Add description with proper CDATA formatting
-        desc = ET.SubElement(workout, "description")
-        desc.text = full_description
-        
-        sport_type = ET.SubElement(workout, "sportType")
-        sport_type.text = "bike"
-        
-        # Empty tags element
-        ET.SubElement(workout, "tags")
-
-        # Create workout section
-        workout_section = ET.SubElement(workout, "workout")
 
         # Add workout sections based on the structure
+        check_sections(workout_data.get("sections", []))
+        segments = []
         for section in workout_data.get("sections", []):
             if section["type"] == "Warmup":
-                ET.SubElement(workout_section, "Warmup", 
-                            Duration=str(section["duration"]), 
-                            PowerLow=str(section["power_low"]), 
-                            PowerHigh=str(section["power_high"]))
+                segments.append(ir.warmup(section["duration"], float(section["power_low"]),
+                                          float(section["power_high"])))
             elif section["type"] == "Cooldown":
-                ET.SubElement(workout_section, "Cooldown", 
-                            Duration=str(section["duration"]), 
-                            PowerLow=str(section["power_low"]), 
-                            PowerHigh=str(section["power_high"]))
+                segments.append(ir.cooldown(section["duration"], float(section["power_low"]),
+                                            float(section["power_high"])))
             elif section["type"] == "Intervals":
-                for _ in range(section["repeats"]):
-                    ET.SubElement(workout_section, "SteadyState", 
-                                Duration=str(section["on_duration"]), 
-                                Power=str(section["on_power"]))
-                    ET.SubElement(workout_section, "SteadyState", 
-                                Duration=str(section["off_duration"]), 
-                                Power=str(section["off_power"]))
+                segments.append(ir.intervals(section["repeats"],
+                                             section["on_duration"], float(section["on_power"]),
+                                             section["off_duration"], float(section["off_power"])))
             elif section["type"] == "Tempo":
-                for _ in range(section["repeats"]):
-                    ET.SubElement(workout_section, "SteadyState", 
-                                Duration=str(section["duration"]), 
-                                Power=str(section["power"]))
-                    if section.get("recovery_duration"):
-                        ET.SubElement(workout_section, "SteadyState", 
-                                    Duration=str(section["recovery_duration"]), 
-                                    Power=str(section["recovery_power"]))
-
-        # Convert XML to a formatted string
-        tree = ET.ElementTree(workout)
-        ET.indent(tree, space="\t")
+                body = [ir.steady(section["duration"], float(section["power"]))]
+                if section.get("recovery_duration"):
+                    body.append(ir.steady(section["recovery_duration"], float(section["recovery_power"])))
+                segments.append(ir.Repeat(section["repeats"], body))
+
+        segments = compact_segments(segments) if compact else ir.expand(segments)
+        return ir.Workout(workout_data["workout_name"], full_description, segments)
+
+    def build_workout(self, workout_data: Dict, compact: bool = True) -> ET.Element:
+        """Build the workout_file element for a single workout."""
+        return ir.to_element(self.build_workout_ir(workout_data, compact), ET)
+
+    def render_workout(self, workout_data: Dict) -> bytes:
+        """Render a single workout to ZWO bytes without touching the disk."""
+        return serialize(self.build_workout_ir(workout_data))
+
+    def generate_workout(self, workout_data: Dict, index: Optional[int] = None) -> str:
+        """Generate a single workout file and return the filename.
+
+        Batches pass each workout's ``index`` so that workouts with the same
+        name written in the same second get distinct files.
+        """
+        workout = self.build_workout_ir(workout_data)
 
         # Generate filename with timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if index is not None:
+            timestamp = f"{timestamp}_{index:05d}"
         filename = os.path.join(self.output_dir, 
                               f"{workout_data['workout_name'].replace(' ', '_')}_{timestamp}.zwo")
 
-        # Save to file with proper XML declaration and CDATA
+        # Stream the XML straight into the file
         with open(filename, "wb") as f:
-            f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
-            xml_str = ET.tostring(workout, encoding='unicode')
-            xml_str = xml_str.replace('<description>', '<description><![CDATA[')
-            xml_str = xml_str.replace('</description>', ']]></description>')
-            f.write(xml_str.encode('utf-8'))
+            write_workout(workout, f)
 
         return filename
 
-    def batch_generate(self, workout_descriptions: List[Dict]) -> List[str]:
-        """Generate multiple workout files from a list of descriptions."""
+    def batch_generate(self, workout_descriptions: List[Dict], workers: int = 1) -> List[str]:
+        """Generate multiple workout files from a list of descriptions.
+
+        With ``workers`` > 1 the workouts are built on a process pool. Either
+        way the returned filenames are in input order, and failures are
+        recorded in ``self.errors`` rather than raised.
+        """
+        workout_descriptions = list(workout_descriptions)
+        if workers and workers > 1 and len(workout_descriptions) > 1:
+            results = self._generate_parallel(workout_descriptions, workers)
+        else:
+            results = _generate_chunk(self, list(enumerate(workout_descriptions)))
+
         generated_files = []
-        for workout_data in workout_descriptions:
-            try:
-                filename = self.generate_workout(workout_data)
+        self.errors = []
+        for index, filename, error in sorted(results, key=lambda result: result[0]):
+            if error is None:
                 generated_files.append(filename)
-                print(f"Generated: {filename}")
-            except Exception as e:
-                print(f"Error generating {workout_data.get('workout_name', 'Unknown')}: {str(e)}")
+            else:
+                self.errors.append(error)
         return generated_files
 
-def process_workout_descriptions(descriptions_file: str, output_dir: str = None) -> List[str]:
-    """Process workout descriptions from a JSON file."""
-    with open(descriptions_file, 'r') as f:
-        workout_descriptions = json.load(f)
-    
+    def _generate_parallel(self, workout_descriptions: List[Dict], workers: int) -> List[Tuple]:
+        chunks = _adaptive_chunks(list(enumerate(workout_descriptions)), workers)
+        results = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk_results in executor.map(_generate_chunk, repeat(self), chunks):
+                results.extend(chunk_results)
+        return results
+
+    def generate_stream(self, records: Iterable[Tuple[int, int, Dict]], workers: int = 1,
+                        chunk_cost: int = 64) -> Iterator[Tuple[int, int, Optional[str], Optional[Dict]]]:
+        """Generate workouts from a stream of ``(line, offset, workout_data)`` records.
+
+        Yields ``(line, offset, filename, error)`` in input order, where
+        ``offset`` is the byte offset just past the record - a safe point to
+        resume from. Only a bounded window of chunks is ever in flight, so
+        memory stays flat no matter how long the stream is.
+        """
+        if not workers or workers <= 1:
+            for line, offset, workout_data in records:
+                (_, filename, error), = _generate_chunk(self, [(line, workout_data)])
+                yield line, offset, filename, error
+            return
+
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk in _stream_chunks(records, chunk_cost):
+                offsets = [offset for _, offset, _ in chunk]
+                items = [(line, workout_data) for line, _, workout_data in chunk]
+                pending.append((offsets, executor.submit(_generate_chunk, self, items)))
+                if len(pending) >= 2 * workers:
+                    yield from _chunk_results(*pending.popleft())
+            while pending:
+                yield from _chunk_results(*pending.popleft())
+
+def _section_number(section: Dict, key: str, minimum: float, integer: bool = False):
+    value = section.get(key, 0)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or (integer and not isinstance(value, int)):
+        raise ValueError(f"{section['type']} {key} must be a number")
+    if not minimum <= value <= MAX_WORKOUT_DURATION:
+        raise ValueError(f"{section['type']} {key} out of range")
+    return value
+
+def check_sections(sections: List[Dict]):
+    """Reject sections whose durations or repeats are out of range, before anything is expanded.
+
+    The whole workout, repeats included, is held to the parser's
+    MAX_WORKOUT_DURATION.
+    """
+    if not isinstance(sections, list) or not all(isinstance(section, dict) for section in sections):
+        raise ValueError("sections must be a list of objects")
+    total = 0
+    for section in sections:
+        kind = section.get("type")
+        if kind in ("Warmup", "Cooldown"):
+            total += _section_number(section, "duration", 1)
+        elif kind == "Intervals":
+            repeats = _section_number(section, "repeats", 1, integer=True)
+            total += repeats * (_section_number(section, "on_duration", 1)
+                                + _section_number(section, "off_duration", 0))
+        elif kind == "Tempo":
+            repeats = _section_number(section, "repeats", 1, integer=True)
+            total += repeats * (_section_number(section, "duration", 1)
+                                + _section_number(section, "recovery_duration", 0))
+        if total > MAX_WORKOUT_DURATION:
+            raise ValueError("Workout is longer than 24 hours")
+
+def _stream_chunks(records: Iterable[Tuple[int, int, Dict]], chunk_cost: int) -> Iterator[List[Tuple[int, int, Dict]]]:
+    """Group streamed records into chunks of roughly ``chunk_cost`` total cost."""
+    chunk, cost = [], 0
+    for record in records:
+        chunk.append(record)
+        cost += workout_cost(record[2])
+        if cost >= chunk_cost:
+            yield chunk
+            chunk, cost = [], 0
+    if chunk:
+        yield chunk
+
+def _chunk_results(offsets: List[int], future) -> Iterator[Tuple[int, int, Optional[str], Optional[Dict]]]:
+    for offset, (line, filename, error) in zip(offsets, future.result()):
+        yield line, offset, filename, error
+
+def workout_cost(workout_data: Dict) -> int:
+    """Rough relative cost of building a workout: elements plus description size."""
+    cost = 1 + len(workout_data.get("description", "")) // 500
+    for section in workout_data.get("sections", []):
+        cost += 2 * section.get("repeats", 1) if section.get("type") in ("Intervals", "Tempo") else 1
+    return cost
+
+def _adaptive_chunks(indexed_workouts: List[Tuple[int, Dict]], workers: int) -> List[List[Tuple[int, Dict]]]:
+    """Split work into chunks of roughly equal cost.
+
+    Aiming for about four chunks per worker keeps the pool balanced while
+    still batching cheap workouts together so pickling overhead stays low.
+    """
+    costs = [workout_cost(workout_data) for _, workout_data in indexed_workouts]
+    target = max(1, sum(costs) // (workers * 4))
+    chunks, chunk, chunk_cost = [], [], 0
+    for item, cost in zip(indexed_workouts, costs):
+        chunk.append(item)
+        chunk_cost += cost
+        if chunk_cost >= target:
+            chunks.append(chunk)
+            chunk, chunk_cost = [], 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def _generate_chunk(generator: "WorkoutGenerator", indexed_workouts: List[Tuple[int, Dict]]) -> List[Tuple]:
+    """Generate a chunk of workouts, returning (index, filename, error) tuples."""
+    results = []
+    for index, workout_data in indexed_workouts:
+        try:
+            results.append((index, generator.generate_workout(workout_data, index), None))
+        except Exception as e:
+            results.append((index, None, {
+                "index": index,
+                "workout_name": workout_data.get("workout_name", "Unknown"),
+                "error": str(e),
+                "error_type": type(e).__name__,
+            }))
+    return results
+
+# Records between checkpoint writes in streaming mode; a resumed run redoes at most this many
+CHECKPOINT_INTERVAL = 100
+
+def iter_workout_descriptions(descriptions_file: str, start_offset: int = 0,
+                              start_line: int = 0) -> Iterator[Tuple[int, int, Dict]]:
+    """Stream workouts from a JSON Lines file or a JSON array, one at a time.
+
+    Yields ``(line, offset, workout_data)`` where ``line`` is the 0-based
+    record number (the line number for JSON Lines without blank lines, the
+    element index for arrays) and ``offset`` is the byte
+    offset just past the record. Pass a previously yielded ``offset`` as
+    ``start_offset`` (along with ``line + 1`` as ``start_line`` to keep the
+    numbering) to resume after a crash; or pass only ``start_line`` to skip
+    that many records from the start.
+    """
+    with open(descriptions_file, 'rb') as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        is_array = first == b'['
+        f.seek(start_offset)
+        if is_array:
+            records = _iter_json_array(f, start_offset)
+        else:
+            records = _iter_json_lines(f, start_offset)
+        line = start_line if start_offset else 0
+        for offset, workout_data in records:
+            if start_offset or line >= start_line:
+                yield line, offset, workout_data
+            line += 1
+
+def _iter_json_lines(f, offset: int) -> Iterator[Tuple[int, Dict]]:
+    for raw in f:
+        offset += len(raw)
+        if raw.strip():
+            yield offset, json.loads(raw)
+
+def _iter_json_array(f, offset: int, chunk_size: int = 64 * 1024) -> Iterator[Tuple[int, Dict]]:
+    """Incrementally decode the objects of a top-level JSON array."""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    eof = False
+    read_size = chunk_size
+    while True:
+        # Skip separators between elements (and the opening bracket)
+        index = 0
+        while index < len(buffer) and buffer[index] in ' \t\r\n,[':
+            index += 1
+        if index:
+            offset += len(buffer[:index].encode('utf-8'))
+            buffer = buffer[index:]
+        if buffer.startswith(']'):
+            return
+        if buffer:
+            if buffer[0] != '{':
+                raise ValueError(f"Expected a workout object at byte {offset}")
+            try:
+                workout_data, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Incomplete object: grow reads so huge objects stay linear
+                read_size = max(chunk_size, len(buffer))
+            else:
+                offset += len(buffer[:end].encode('utf-8'))
+                buffer = buffer[end:]
+                read_size = chunk_size
+                yield offset, workout_data
+                continue
+        if eof:
+            return
+        chunk = f.read(read_size)
+        eof = not chunk
+        buffer += text_decoder.decode(chunk, final=eof)
+
+def process_workout_descriptions(descriptions_file: str, output_dir: str = None, workers: int = 1,
+                                 stream: bool = False, checkpoint_file: str = None):
+    """Process workout descriptions from a JSON file.
+
+    Returns the generated filenames. With ``stream=True`` the file (JSON
+    Lines or a JSON array) is read one workout at a time instead of being
+    loaded whole, and the result is an iterator of ``(line, filename,
+    error)`` in input order, so nothing accumulates however long the file
+    is. If ``checkpoint_file`` is given, progress is recorded there as the
+    iterator is consumed and a rerun resumes after the last workout that
+    was written.
+    """
     generator = WorkoutGenerator(output_dir)
-    return generator.batch_generate(workout_descriptions)
+    if not stream:
+        with open(descriptions_file, 'r') as f:
+            workout_descriptions = json.load(f)
+        return generator.batch_generate(workout_descriptions, workers=workers)
+    return _process_stream(generator, descriptions_file, workers, checkpoint_file)
+
+def _process_stream(generator: WorkoutGenerator, descriptions_file: str, workers: int,
+                    checkpoint_file: Optional[str]) -> Iterator[Tuple[int, Optional[str], Optional[Dict]]]:
+    start_offset, start_line = 0, 0
+    if checkpoint_file and os.path.exists(checkpoint_file):
+        with open(checkpoint_file) as f:
+            checkpoint = json.load(f)
+        start_offset, start_line = checkpoint["offset"], checkpoint["line"]
+
+    records = iter_workout_descriptions(descriptions_file, start_offset, start_line)
+    for line, offset, filename, error in generator.generate_stream(records, workers=workers):
+        yield line, filename, error
+        if checkpoint_file and (line + 1) % CHECKPOINT_INTERVAL == 0:
+            _write_checkpoint(checkpoint_file, offset, line + 1)
+    if checkpoint_file and os.path.exists(checkpoint_file):
+        # Finished cleanly; the next run starts from the top
+        os.remove(checkpoint_file)
+
+def _write_checkpoint(checkpoint_file: str, offset: int, line: int):
+    tmp_path = f"{checkpoint_file}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"offset": offset, "line": line}, f)
+    os.replace(tmp_path, checkpoint_file)
 
 if __name__ == "__main__":
     # Example usage for the workout you described
@@ -265,4 +480,8 @@ if __name__ == "__main__":
     # Process the workouts
     generator = WorkoutGenerator()
     generated_files = generator.batch_generate(example_workouts)
+    for filename in generated_files:
+        print(f"Generated: {filename}")
+    for error in generator.errors:
+        print(f"Error generating {error['workout_name']}: {error['error']}")
     print(f"\nGenerated {len(generated_files)} workout files") 
\ No newline at end of file
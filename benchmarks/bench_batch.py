@@ -0,0 +1,68 @@
+"""Benchmark: WorkoutGenerator.batch_generate throughput vs worker count.
+
+Run from the repository root:
+
+    python benchmarks/bench_batch.py [--count 2000]
+
+Builds ``--count`` workouts cycled from the section corpus into a temporary
+directory with 1, 2, 4, ... workers up to the machine's core count, and
+reports workouts/s and speedup over the serial path.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_workout_generator import WorkoutGenerator  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus', 'sections.json')
+
+
+def load_workouts(count):
+    with open(CORPUS, encoding='utf-8') as f:
+        corpus = json.load(f)
+    workouts = []
+    for i in range(count):
+        workout = dict(corpus[i % len(corpus)])
+        # Unique names so files don't overwrite each other within a second
+        workout['workout_name'] = f"{workout['workout_name']} {i}"
+        workouts.append(workout)
+    return workouts
+
+
+def worker_counts():
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=2000)
+    args = parser.parse_args()
+
+    workouts = load_workouts(args.count)
+    print(f"{args.count} workouts, {os.cpu_count()} cores")
+    baseline = None
+    for workers in worker_counts():
+        with tempfile.TemporaryDirectory() as output_dir:
+            generator = WorkoutGenerator(output_dir)
+            start = time.perf_counter()
+            files = generator.batch_generate(workouts, workers=workers)
+            elapsed = time.perf_counter() - start
+        rate = len(files) / elapsed
+        baseline = baseline or rate
+        print(f"  workers={workers:<3} {rate:9.1f} workouts/s  speedup x{rate / baseline:.2f}"
+              f"  errors={len(generator.errors)}")
+
+
+if __name__ == '__main__':
+    main()
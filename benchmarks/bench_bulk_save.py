@@ -0,0 +1,125 @@
+"""Benchmark: saving batch-generated workouts to the library on SQLite.
+
+Run from the repository root:
+
+    python benchmarks/bench_bulk_save.py [--workouts 10000] [--upload-latency 0.02]
+
+Compares the per-row path (session.add + commit for each workout, run on
+a slice and reported per row) with workout_library.bulk_save, first
+without uploads and then with a fake storage whose uploads each sleep
+``--upload-latency`` seconds, to show the effect of running them
+concurrently. The FTS triggers from init_library are active throughout,
+as in the app. A last run makes one upload fail and checks that nothing
+was inserted.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from flask import Flask
+from sqlalchemy import func, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import workout_ir as ir  # noqa: E402
+from models import User, Workout, db  # noqa: E402
+from workout_library import BulkSaveError, bulk_save, init_library, library_entry  # noqa: E402
+
+
+class FakeStorage:
+    """Stands in for storage.Storage: each upload takes ``latency`` seconds."""
+
+    def __init__(self, latency, fail_key=None):
+        self.latency = latency
+        self.fail_key = fail_key
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def upload_data(self, data, s3_key, content_type='application/xml'):
+        time.sleep(self.latency)
+        if s3_key == self.fail_key:
+            return None
+        with self.lock:
+            self.objects[s3_key] = data
+        return s3_key
+
+    def delete_file(self, s3_key):
+        with self.lock:
+            self.objects.pop(s3_key, None)
+        return True
+
+
+def sample_workouts(count):
+    for i in range(count):
+        segments = [ir.warmup(600, 0.5, 0.75), ir.intervals(5 + i % 4, 40, 1.2, 20, 0.55),
+                    ir.steady(600, 0.88), ir.cooldown(600, 0.7, 0.5)]
+        yield ir.Workout(f"Batch workout {i}", "Generated in a batch run. " * 10, segments)
+
+
+def row_count():
+    return db.session.scalar(select(func.count()).select_from(Workout))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workouts', type=int, default=10_000)
+    parser.add_argument('--per-row', type=int, default=1000, help="rows for the per-row baseline")
+    parser.add_argument('--uploads', type=int, default=1000)
+    parser.add_argument('--upload-latency', type=float, default=0.02)
+    args = parser.parse_args()
+
+    workouts = list(sample_workouts(args.workouts))
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'library.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            init_library()
+            db.session.add(User(id=1, name='Coach', email='coach@example.com'))
+            db.session.commit()
+
+            start = time.perf_counter()
+            for workout in workouts[:args.per_row]:
+                db.session.add(library_entry(workout, 1))
+                db.session.commit()
+            per_row = (time.perf_counter() - start) / args.per_row
+            print(f"add + commit per row   {per_row * 1e6:8.0f} us/row  "
+                  f"(~{per_row * args.workouts:.1f} s for {args.workouts})")
+
+            before = row_count()
+            start = time.perf_counter()
+            ids = bulk_save([{'workout': workout} for workout in workouts], 1)
+            elapsed = time.perf_counter() - start
+            ok = len(ids) == args.workouts and row_count() == before + args.workouts
+            failures += not ok
+            print(f"bulk_save              {elapsed / args.workouts * 1e6:8.0f} us/row  "
+                  f"({elapsed:.2f} s for {args.workouts})  {'ok' if ok else 'WRONG COUNT'}")
+
+            items = [{'workout': workout, 'data': b'<workout_file />', 's3_key': f"w/{i}.zwo"}
+                     for i, workout in enumerate(workouts[:args.uploads])]
+            storage = FakeStorage(args.upload_latency)
+            start = time.perf_counter()
+            bulk_save(items, 1, storage=storage)
+            elapsed = time.perf_counter() - start
+            print(f"bulk_save + {args.uploads} uploads  {elapsed:6.2f} s  "
+                  f"(serial uploads alone: {args.uploads * args.upload_latency:.1f} s)")
+
+            before = row_count()
+            storage = FakeStorage(0, fail_key=items[len(items) // 2]['s3_key'])
+            try:
+                bulk_save(items, 1, storage=storage)
+                ok = False
+            except BulkSaveError:
+                ok = row_count() == before and not storage.objects
+            failures += not ok
+            print(f"failed upload rolls back: {'ok' if ok else 'LEFT ROWS OR OBJECTS BEHIND'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
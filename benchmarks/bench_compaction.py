@@ -0,0 +1,69 @@
+"""Check and measure segment compaction across every generator.
+
+Run from the repository root:
+
+    python benchmarks/bench_compaction.py
+
+For each generator the workout IR is built fully expanded and compacted.
+The per-second power timelines must match byte for byte (the script exits
+non-zero otherwise); element counts and serialized sizes show the gain.
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import etree as LxmlET  # noqa: E402
+
+import app  # noqa: E402
+import workout_ir as ir  # noqa: E402
+from batch_workout_generator import WorkoutGenerator  # noqa: E402
+from bookend_30s import build_bookend_30s_workout_ir  # noqa: E402
+from bookend_workout import build_bookend_workout_ir  # noqa: E402
+from segment_compactor import power_timeline  # noqa: E402
+from zwift_generator import build_zwo_ir  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+
+def load(name):
+    with open(os.path.join(CORPUS_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def cases():
+    for item in load('descriptions.json'):
+        yield (f"app: {item['name']}",
+               lambda compact, item=item: app.build_workout_ir(item['name'], item['description'], compact))
+    generator = WorkoutGenerator(output_dir=app.WORKOUT_DIR)
+    for item in load('sections.json'):
+        yield (f"WorkoutGenerator: {item['workout_name']}",
+               lambda compact, item=item: generator.build_workout_ir(item, compact))
+    yield ("zwift_generator: Gavin 4x8",
+           lambda compact: build_zwo_ir("Gavin Special", "", 1800, 1800, 4, compact))
+    yield ("bookend_workout", lambda compact: build_bookend_workout_ir("Bookend", "", compact))
+    yield ("bookend_30s", lambda compact: build_bookend_30s_workout_ir("Bookend 30s", "", compact))
+
+
+def serialized_size(workout):
+    return len(LxmlET.tostring(ir.to_element(workout, LxmlET), pretty_print=True))
+
+
+def main():
+    failures = 0
+    print(f"{'generator':<48} {'elements':>13} {'bytes':>15}  timeline")
+    for label, build in cases():
+        expanded, compacted = build(False), build(True)
+        before = sum(1 for _ in ir.iter_elements(expanded.segments))
+        after = sum(1 for _ in ir.iter_elements(compacted.segments))
+        same = power_timeline(expanded.segments) == power_timeline(compacted.segments)
+        failures += not same
+        print(f"{label:<48} {before:>5} -> {after:<5} "
+              f"{serialized_size(expanded):>6} -> {serialized_size(compacted):<6}  "
+              f"{'identical' if same else 'CHANGED'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Benchmark: bulk ZWO import into the workout IR.
+
+Run from the repository root:
+
+    python benchmarks/bench_importer.py [--files 5000] [--workers N]
+
+Writes ``--files`` .zwo files (a mix of the built-in workouts, expanded
+and compacted) to a temporary library spread over subdirectories, then
+imports the whole library with zwo_importer.import_directory on one
+process and on ``--workers`` processes (default: the CPU count). Every
+imported workout must serialize back to its original bytes.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bookend_30s import BOOKEND_30S_DESCRIPTION, build_bookend_30s_workout_ir  # noqa: E402
+from bookend_workout import BOOKEND_DESCRIPTION, build_bookend_workout_ir  # noqa: E402
+from zwift_generator import build_zwo_ir  # noqa: E402
+from zwo_importer import import_directory  # noqa: E402
+from zwo_writer import serialize  # noqa: E402
+
+
+def library():
+    return [
+        serialize(build_bookend_workout_ir("Bookend", BOOKEND_DESCRIPTION, compact=False)),
+        serialize(build_bookend_workout_ir("Bookend", BOOKEND_DESCRIPTION)),
+        serialize(build_bookend_30s_workout_ir("Bookend 30s", BOOKEND_30S_DESCRIPTION, compact=False)),
+        serialize(build_zwo_ir("Gavin 4x8", BOOKEND_DESCRIPTION, 600, 600, 4)),
+    ]
+
+
+def run(directory, workers, originals):
+    start = time.perf_counter()
+    count = mismatches = errors = 0
+    for path, workout, error in import_directory(directory, workers=workers, compact=False):
+        count += 1
+        if error is not None:
+            errors += 1
+        elif serialize(workout) != originals[path]:
+            mismatches += 1
+    return count, errors, mismatches, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    documents = library()
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        originals = {}
+        for i in range(args.files):
+            folder = os.path.join(tmp, f"coach_{i % 50:02d}")
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, f"workout_{i:06d}.zwo")
+            data = documents[i % len(documents)]
+            with open(path, 'wb') as f:
+                f.write(data)
+            originals[path] = data
+        size = sum(len(data) for data in originals.values())
+        print(f"{args.files} files, {size / 1e6:.1f} MB")
+
+        for workers in sorted({1, args.workers}):
+            count, errors, mismatches, elapsed = run(tmp, workers, originals)
+            failures += errors + mismatches + (count != args.files)
+            print(f"  {workers} worker(s)  {elapsed:6.2f} s  {count / elapsed:8.0f} files/s  "
+                  f"errors {errors}  round-trip mismatches {mismatches}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark: library search over a large SQLite workout table.
+
+Run from the repository root:
+
+    python benchmarks/bench_library.py [--workouts 100000]
+
+Fills a temporary SQLite database with synthetic workouts (names and
+descriptions drawn from a small training vocabulary, random summary
+values), then times workout_library.search_workouts for text, filter and
+combined queries, first page and a deep keyset page. Each page is checked
+against a brute-force filter over the same rows.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import insert
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import User, Workout, db  # noqa: E402
+from workout_library import init_library, search_workouts  # noqa: E402
+
+WORDS = ("sweet spot threshold vo2 anaerobic endurance tempo sprint over under cadence "
+         "climbing gravel recovery openers pyramid ladder bookend sfr torque").split()
+CATEGORIES = ['intervals', 'endurance', 'threshold', 'sprint', None]
+
+QUERIES = [
+    ("text: threshold", dict(query="threshold")),
+    ("text: two terms", dict(query="over under")),
+    ("text: prefix", dict(query="vo")),
+    ("filter: 60-90 min", dict(min_duration=3600, max_duration=5400)),
+    ("filter: Z5 >= 10 min", dict(min_z5_seconds=600)),
+    ("filter: category + power", dict(category='sprint', max_power=1.1)),
+    ("combined", dict(query="gravel", min_duration=3600, min_z5_seconds=300, category='intervals')),
+]
+
+
+def synthetic_rows(count, rng):
+    now = datetime.utcnow()
+    for i in range(count):
+        words = rng.sample(WORDS, 3)
+        yield {
+            'name': ' '.join(words).title() + f' #{i}',
+            'description': ' '.join(rng.choices(WORDS, k=30)),
+            'user_id': 1,
+            'created_at': now,
+            'is_template': i % 10 == 0,
+            'template_category': rng.choice(CATEGORIES),
+            'duration': rng.randrange(1800, 6 * 3600, 60),
+            'max_power': round(rng.uniform(0.6, 1.5), 2),
+            'z5_seconds': rng.choice([0, 0, rng.randrange(0, 1800, 30)]),
+        }
+
+
+def matches(row, query=None, category=None, min_duration=None, max_duration=None,
+            max_power=None, min_z5_seconds=None):
+    if query:
+        text = (row['name'] + ' ' + row['description']).lower()
+        words = text.replace('#', ' ').split()
+        if not all(any(word.startswith(term) for word in words) for term in query.lower().split()):
+            return False
+    return ((category is None or row['template_category'] == category)
+            and (min_duration is None or row['duration'] >= min_duration)
+            and (max_duration is None or row['duration'] <= max_duration)
+            and (max_power is None or row['max_power'] <= max_power)
+            and (min_z5_seconds is None or row['z5_seconds'] >= min_z5_seconds))
+
+
+def timed(func, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workouts', type=int, default=100_000)
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'library.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            init_library()
+            db.session.add(User(id=1, name='Coach', email='coach@example.com'))
+            db.session.commit()
+
+            rows = list(synthetic_rows(args.workouts, random.Random(0)))
+            start = time.perf_counter()
+            db.session.execute(insert(Workout), rows)
+            db.session.commit()
+            print(f"{args.workouts} workouts loaded in {time.perf_counter() - start:.1f} s")
+            # Row i has id i + 1; newest first means highest id first
+            ids = {row['name']: i + 1 for i, row in enumerate(rows)}
+
+            for label, filters in QUERIES:
+                expected = [ids[row['name']] for row in reversed(rows) if matches(row, **filters)]
+                first, (page, cursor) = timed(lambda: search_workouts(**filters))
+                deep_after = expected[len(expected) // 2] if expected else None
+                deep, (deep_page, _) = timed(lambda: search_workouts(after=deep_after, **filters))
+                ok = [w.id for w in page] == expected[:20]
+                if deep_after is not None:
+                    start_index = expected.index(deep_after) + 1
+                    ok = ok and [w.id for w in deep_page] == expected[start_index:start_index + 20]
+                failures += not ok
+                print(f"  {label:<26} {len(expected):7d} hits  first page {first * 1000:6.2f} ms  "
+                      f"deep page {deep * 1000:6.2f} ms  {'ok' if ok else 'MISMATCH'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Micro-benchmark: workout_parser vs the regex helpers app.py used to call.
+
+Run from the repository root:
+
+    python benchmarks/bench_parser.py
+
+The legacy functions below are lightly condensed copies of the helpers app.py used
+before the single-pass parser landed, kept here only as a baseline.
+"""
+import json
+import os
+import re
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workout_parser import parse_description, ParseError  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus', 'descriptions.json')
+
+
+def legacy_parse_workout_description(description):
+    sections = {'warmup': [], 'main': [], 'cooldown': []}
+    for line in description.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if 'base' in line.lower() or 'z1-z2' in line.lower():
+            sections['warmup'].append(line)
+            continue
+        sections['main'].append(line)
+    return sections
+
+
+def legacy_parse_interval_set(text):
+    sets_match = re.search(r'(\d+)x(\d+)', text)
+    if sets_match:
+        sets = int(sets_match.group(1))
+        interval_length = int(sets_match.group(2))
+    else:
+        sets = 1
+        interval_length = 0
+    recovery_match = re.search(r'(\d+)\'\s*recovery', text)
+    recovery = int(recovery_match.group(1)) * 60 if recovery_match else 0
+    sfr_match = re.search(r'SFR.*?(\d+)-(\d+)r', text)
+    sfr_cadence = None
+    if sfr_match:
+        sfr_cadence = (int(sfr_match.group(1)) + int(sfr_match.group(2))) // 2
+    return {'sets': sets, 'interval_length': interval_length * 60,
+            'recovery': recovery, 'sfr_cadence': sfr_cadence}
+
+
+def legacy_parse_power_zone(text):
+    text = text.lower()
+    if 'max' in text:
+        return 1.2
+    for zone, power in (('z1', 0.5), ('z2', 0.65), ('z3', 0.83),
+                        ('z4', 0.98), ('z5', 1.13), ('z6', 1.2)):
+        if zone in text:
+            return power
+    return 0.65
+
+
+def legacy_parse_duration(text):
+    duration = 300
+    if 'min' in text.lower():
+        try:
+            duration = int(re.search(r'(\d+)\s*min', text.lower()).group(1)) * 60
+        except (AttributeError, ValueError):
+            pass
+    elif 'sec' in text.lower():
+        try:
+            duration = int(re.search(r'(\d+)\s*sec', text.lower()).group(1))
+        except (AttributeError, ValueError):
+            pass
+    return str(duration)
+
+
+def legacy_parse(description):
+    """The per-line work create_workout_xml used to do."""
+    sections = legacy_parse_workout_description(description)
+    parsed = []
+    for line in sections['main']:
+        if 'x' in line:
+            parsed.append(legacy_parse_interval_set(line))
+        else:
+            parsed.append((legacy_parse_duration(line), legacy_parse_power_zone(line)))
+    return parsed
+
+
+def new_parse(description):
+    try:
+        return parse_description(description)
+    except ParseError:
+        return None
+
+
+def bench_corpus(descriptions, number=2000):
+    print(f"Corpus: {len(descriptions)} descriptions, {number} passes")
+    for label, func in (('legacy regex helpers', legacy_parse), ('workout_parser', new_parse)):
+        elapsed = timeit.timeit(lambda: [func(d) for d in descriptions], number=number)
+        per_item = elapsed / (number * len(descriptions)) * 1e6
+        print(f"  {label:<22} {per_item:8.1f} us/description")
+
+
+def bench_scaling(sizes=(16 * 1024, 64 * 1024, 1024 * 1024, 4 * 1024 * 1024),
+                  legacy_sizes=(16 * 1024, 64 * 1024)):
+    """Parse time per byte should stay flat as hostile inputs grow.
+
+    The legacy helpers are only timed on small inputs: the lazy
+    ``SFR.*?(\\d+)-(\\d+)r`` search is quadratic and a 16 MB body would take
+    days.
+    """
+    patterns = {
+        'nested repeats': "1x",
+        'unterminated ranges': "1-",
+        'sfr backtracking': "SFR 1-1 x",
+        'many attributes': "30\" ",
+        'done-as ladder': "-1x1' done as...\n",
+    }
+    print("Scaling (ns per input byte; flat means linear):")
+    for label, unit in patterns.items():
+        for name, func, run_sizes in (('workout_parser', new_parse, sizes),
+                                      ('legacy', legacy_parse, legacy_sizes)):
+            row = []
+            for size in run_sizes:
+                text = unit * (size // len(unit))
+                start = time.perf_counter()
+                func(text)
+                row.append((time.perf_counter() - start) / len(text) * 1e9)
+            cells = '  '.join(f"{size // 1024:>5}KB {ns:9.1f}" for size, ns in zip(run_sizes, row))
+            print(f"  {label:<20} {name:<15} {cells}")
+
+
+if __name__ == '__main__':
+    with open(CORPUS, encoding='utf-8') as f:
+        corpus = [item['description'] for item in json.load(f)]
+    bench_corpus(corpus)
+    bench_scaling()
@@ -0,0 +1,100 @@
+"""Benchmark: streaming ZWO writer vs the old tostring-plus-replace path.
+
+Run from the repository root:
+
+    python benchmarks/bench_serializer.py [--repeat 20]
+
+The workloads are large multi-hour workouts: the 6 h bookend rides with
+every block expanded, and a synthetic 8 h ride of 15 s steps with a long
+description. For each, the old path (ElementTree + indent + tostring +
+two str.replace + encode) and zwo_writer.write_workout (to a BytesIO and
+to a file) are timed, and tracemalloc reports the peak memory allocated
+while serializing one document. Outputs are checked to be identical.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import workout_ir as ir  # noqa: E402
+from bookend_30s import build_bookend_30s_workout_ir  # noqa: E402
+from bookend_workout import BOOKEND_DESCRIPTION, build_bookend_workout_ir  # noqa: E402
+from zwo_writer import write_workout  # noqa: E402
+
+
+def legacy_serialize(workout):
+    """What the generators did before zwo_writer."""
+    root = ir.to_element(workout, ET)
+    tree = ET.ElementTree(root)
+    ET.indent(tree, space="\t")
+    xml_str = ET.tostring(root, encoding='unicode')
+    xml_str = xml_str.replace('<description>', '<description><![CDATA[')
+    xml_str = xml_str.replace('</description>', ']]></description>')
+    return b'<?xml version="1.0" encoding="UTF-8"?>\n' + xml_str.encode('utf-8')
+
+
+def streaming_serialize(workout):
+    buffer = io.BytesIO()
+    write_workout(workout, buffer)
+    return buffer.getvalue()
+
+
+def workloads():
+    yield "bookend 6h, expanded", build_bookend_workout_ir("Bookend", BOOKEND_DESCRIPTION, compact=False)
+    yield "bookend 30s 6h, expanded", build_bookend_30s_workout_ir("Bookend 30s", BOOKEND_DESCRIPTION, compact=False)
+    steps = [ir.steady(15, 0.5 + (i % 60) / 100, 85 + i % 10) for i in range(8 * 3600 // 15)]
+    yield "synthetic 8h, 15 s steps", ir.Workout("Steps", BOOKEND_DESCRIPTION * 10, steps)
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def peak(func):
+    tracemalloc.start()
+    func()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'out.zwo')
+
+        def to_file(workout):
+            with open(path, 'wb') as f:
+                write_workout(workout, f)
+
+        for label, workout in workloads():
+            expected = legacy_serialize(workout)
+            size = len(expected)
+            same = streaming_serialize(workout) == expected
+            failures += not same
+            print(f"{label}: {sum(1 for _ in ir.iter_elements(workout.segments))} elements, "
+                  f"{size / 1024:.0f} KB, output {'identical' if same else 'DIFFERENT'}")
+            for name, func in (("tostring + replace", lambda: legacy_serialize(workout)),
+                               ("write_workout -> BytesIO", lambda: streaming_serialize(workout)),
+                               ("write_workout -> file", lambda: to_file(workout))):
+                seconds = timed(func, args.repeat)
+                print(f"  {name:<26} {seconds * 1000:8.2f} ms  {size / seconds / 1e6:7.1f} MB/s  "
+                      f"peak {peak(func) / 1024:8.0f} KB")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
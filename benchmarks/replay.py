@@ -0,0 +1,207 @@
+"""Replay captured traffic against a running server.
+
+Capture traffic by starting the app with ``CAPTURE_REQUESTS_FILE`` set (see
+request_capture.py), then replay it at a local gunicorn from the
+repository root:
+
+    gunicorn -w 4 app:app &
+    python benchmarks/replay.py requests.jsonl --url http://127.0.0.1:8000 \\
+        --concurrency 16 --speedup 10
+
+Requests are sent in capture order, each no earlier than its original
+offset from the first request divided by ``--speedup`` (0 sends as fast as
+possible), with at most ``--concurrency`` in flight. When every worker is
+busy requests start late; the report includes how far behind schedule the
+run fell, since a replay that can't keep up is measuring the client as
+much as the server. Throughput, latency percentiles, error rate and status
+counts are printed, or written as JSON with ``--json``.
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from request_capture import read_capture  # noqa: E402
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Replayer:
+    def __init__(self, url, concurrency=8, speedup=1.0, timeout=30.0):
+        parts = urlsplit(url)
+        self.scheme = parts.scheme or 'http'
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.concurrency = concurrency
+        self.speedup = speedup
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.netloc, timeout=self.timeout)
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def send(self, record):
+        """Send one captured request on this thread's keep-alive connection; return (status, bytes)."""
+        body = json.dumps(record.get('body') or {}).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(record.get('method', 'POST'), self.prefix + record['path'], body, headers)
+                response = conn.getresponse()
+                data = response.read()
+                if response.will_close:
+                    self._reset()
+                return response.status, len(data)
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # The server closed an idle keep-alive connection; retry once on a fresh one
+                self._reset()
+                if attempt:
+                    raise
+            except Exception:
+                self._reset()
+                raise
+
+    def run(self, records):
+        """Replay ``records`` and return the summary dict."""
+        records = sorted(records, key=lambda record: record['ts'])
+        if not records:
+            raise ValueError("nothing to replay")
+        first = records[0]['ts']
+        results = [None] * len(records)
+        start = time.perf_counter()
+
+        def replay(index):
+            record = records[index]
+            if self.speedup > 0:
+                due = start + (record['ts'] - first) / self.speedup
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                lag = max(0.0, time.perf_counter() - due)
+            else:
+                lag = 0.0
+            sent = time.perf_counter()
+            try:
+                status, size = self.send(record)
+                error = None
+            except Exception as e:
+                status, size, error = None, 0, f"{type(e).__name__}: {e}"
+            results[index] = (status, time.perf_counter() - sent, size, lag, error)
+
+        # map() hands out indexes in order, so requests start in capture order
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='replay') as executor:
+            list(executor.map(replay, range(len(records))))
+        return summarize(records, results, time.perf_counter() - start)
+
+
+def summarize(records, results, elapsed):
+    latencies = sorted(latency for _, latency, _, _, _ in results)
+    statuses = Counter('error' if status is None else str(status) for status, _, _, _, _ in results)
+    errors = sum(1 for status, _, _, _, _ in results if status is None or status >= 500)
+    captured = sorted(record['duration_ms'] for record in records if record.get('duration_ms') is not None)
+    lags = sorted(lag for _, _, _, lag, _ in results)
+    first_error = next((error for _, _, _, _, error in results if error), None)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        'requests': len(results),
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'p50': ms(percentile(latencies, 0.50)),
+            'p90': ms(percentile(latencies, 0.90)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'max': ms(latencies[-1]) if latencies else None,
+        },
+        'captured_server_ms': {
+            'p50': percentile(captured, 0.50),
+            'p99': percentile(captured, 0.99),
+        },
+        'error_rate': round(errors / len(results), 4),
+        'statuses': dict(sorted(statuses.items())),
+        'response_bytes': sum(size for _, _, size, _, _ in results),
+        'schedule_lag_ms': {'p50': ms(percentile(lags, 0.50)), 'max': ms(lags[-1]) if lags else None},
+        'first_error': first_error,
+    }
+
+
+def print_summary(summary):
+    latency, lag = summary['latency_ms'], summary['schedule_lag_ms']
+    print(f"{summary['requests']} requests in {summary['elapsed_seconds']:.2f} s "
+          f"({summary['throughput_rps']} req/s)")
+    print(f"latency   p50 {latency['p50']} ms  p90 {latency['p90']} ms  p99 {latency['p99']} ms  "
+          f"max {latency['max']} ms")
+    captured = summary['captured_server_ms']
+    if captured['p50'] is not None:
+        print(f"captured  p50 {captured['p50']} ms  p99 {captured['p99']} ms (server time when recorded)")
+    print(f"errors    {summary['error_rate'] * 100:.2f}%  statuses {summary['statuses']}")
+    print(f"behind schedule  p50 {lag['p50']} ms  max {lag['max']} ms")
+    if summary['first_error']:
+        print(f"first error: {summary['first_error']}")
+
+
+def load_records(path, paths=None, limit=None, loops=1):
+    """Captured records, optionally filtered by path, repeated ``loops`` times back to back."""
+    records = [record for record in read_capture(path) if not paths or record['path'] in paths]
+    if limit:
+        records = records[:limit]
+    if loops <= 1 or not records:
+        return records
+    span = records[-1]['ts'] - records[0]['ts'] + 1.0
+    return [dict(record, ts=record['ts'] + loop * span) for loop in range(loops) for record in records]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('capture', help="JSON Lines file written by request_capture")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--speedup', type=float, default=1.0,
+                        help="replay this many times faster than captured; 0 for as fast as possible")
+    parser.add_argument('--limit', type=int, help="replay only the first N requests")
+    parser.add_argument('--loops', type=int, default=1, help="replay the capture this many times")
+    parser.add_argument('--path', action='append', dest='paths', help="only replay requests to this path")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+    args = parser.parse_args()
+
+    records = load_records(args.capture, args.paths, args.limit, args.loops)
+    if not records:
+        print(f"No requests to replay in {args.capture}", file=sys.stderr)
+        return 1
+    summary = Replayer(args.url, args.concurrency, args.speedup, args.timeout).run(records)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
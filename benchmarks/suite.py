@@ -0,0 +1,413 @@
+"""Benchmark suite and regression gate for every generator path.
+
+Run from the repository root:
+
+    python benchmarks/suite.py                    # run, compare with baseline.json
+    python benchmarks/suite.py --save-baseline    # record a new baseline
+    python benchmarks/suite.py -k bookend --quick
+
+Cases are grouped by stage - ``parse``, ``build``, ``serialize`` and ``e2e``
+- and cover app.py (including ``/generate`` through the Flask test client),
+``WorkoutGenerator``, ``zwift_generator`` and the two bookend generators.
+Inputs come from the checked-in corpus (``corpus/descriptions.json``,
+``corpus/sections.json``, ``corpus/generators.json``) plus deterministic
+synthetic large and pathological inputs built below.
+
+For each case the suite reports ops/s, p50 and p99 per op, and the peak
+memory allocated during one op (tracemalloc). With a baseline present the
+p50 and allocation of every case are compared against it, and the run
+exits non-zero when either grew by more than ``--max-regression`` percent.
+Timings are scaled by a short calibration loop recorded with the
+baseline, so a baseline from a faster or slower machine still compares
+sensibly; re-record it when the hardware or Python version changes.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py reads these at import time; keep the benchmark off the real database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from lxml import etree as ET  # noqa: E402
+
+import app as web  # noqa: E402
+import workout_ir as ir  # noqa: E402
+from batch_workout_generator import WorkoutGenerator  # noqa: E402
+from bookend_30s import build_bookend_30s_workout_ir, generate_bookend_30s_zwo  # noqa: E402
+from bookend_workout import build_bookend_workout_ir, generate_bookend_zwo  # noqa: E402
+from render_cache import RenderCache  # noqa: E402
+from template_registry import builtin_templates  # noqa: E402
+from workout_parser import MAX_NESTING, ParseError, parse_description  # noqa: E402
+from zwift_generator import build_zwo_ir, generate_zwo  # noqa: E402
+from zwo_writer import serialize  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Allocation changes smaller than this are noise, whatever the percentage
+ALLOC_SLACK_KB = 16
+
+
+def load(name):
+    with open(os.path.join(CORPUS_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Synthetic inputs
+
+def large_description(lines=100):
+    """A long coach-style description: ~11 h of mixed repeats and "done as..." blocks."""
+    out = ["Z1-Z2 base with focus on efforts as follows:", ""]
+    for i in range(lines):
+        if i % 10 == 9:
+            out.append(f"-{4 + i % 3}' done as...")
+            out.append(f"  30\" z{5 + i % 2} / 30\" z2")
+            out.append("")
+        else:
+            out.append(f"-{1 + i % 3}x{1 + i % 3}' Z{3 + i % 3} / 1' Z2, {85 + i % 15}+ rpm")
+    return '\n'.join(out)
+
+
+def nested_description(depth=MAX_NESTING + 4):
+    """"done as..." blocks nested past the parser's nesting limit."""
+    out = []
+    for level in range(depth):
+        out.append('  ' * level + f"-2x{depth - level}' done as...")
+    out.append('  ' * depth + "30\" max / 30\" easy")
+    return '\n'.join(out)
+
+
+def noise_description(size=20000):
+    """Token soup with no recognisable efforts: every line falls back to a note."""
+    line = "1'2\"3'4\" z9 x/x~5-6-7 ... (()) w r %% 8h9m ► • "
+    return '\n'.join(line * 4 for _ in range(size // (len(line) * 4)))
+
+
+def max_repeat_description():
+    """Exactly 24 h of 30/30s: the longest single repeat the parser accepts."""
+    return "-1440x30\" Z6 / 30\" Z2"
+
+
+def over_limit_description():
+    """Two lines adding up to more than 24 h; rejected with a ParseError (a 400 from /generate)."""
+    return max_repeat_description() + "\n-1x10' Z2"
+
+
+def large_sections(count=500):
+    """Many short sections; 500 of them come to just under the 24 h a workout may last."""
+    types = [
+        {"type": "Warmup", "duration": 120, "power_low": 0.5, "power_high": 0.75},
+        {"type": "Intervals", "repeats": 6, "on_duration": 20, "on_power": 1.2, "off_duration": 10,
+         "off_power": 0.6},
+        {"type": "Tempo", "repeats": 3, "duration": 60, "power": 0.88, "recovery_duration": 30,
+         "recovery_power": 0.6},
+        {"type": "Cooldown", "duration": 120, "power_low": 0.75, "power_high": 0.5},
+    ]
+    return {"workout_name": "Synthetic Sections", "description": large_description(20),
+            "sections": [dict(types[i % len(types)]) for i in range(count)]}
+
+
+SYNTHETIC = {
+    'large': large_description(),
+    'nested': nested_description(),
+    'noise': noise_description(),
+    'max_repeat': max_repeat_description(),
+}
+
+
+# Cases
+
+def cases(tmp_dir):
+    """Yield ``(name, op)`` pairs; each op is a zero-argument callable."""
+    descriptions = [(d['name'], d['description']) for d in load('descriptions.json')]
+    sections = load('sections.json')
+    generators = load('generators.json')
+    zwift = generators['zwift_generator']
+    bookend = generators['bookend'][0]
+    bookend_30s = generators['bookend_30s'][0]
+    zwift_large = dict(zwift[-1], workout_name="Gavin Special - 40x8min", num_sets=40)
+
+    def parse_all():
+        for _, description in descriptions:
+            parse_description(description)
+
+    yield 'parse/corpus (8)', parse_all
+    for key, description in SYNTHETIC.items():
+        yield f'parse/{key}', lambda description=description: parse_description(description)
+
+    def parse_rejected():
+        try:
+            parse_description(over_limit_description())
+        except ParseError:
+            pass
+        else:
+            raise AssertionError("over-limit description was accepted")
+
+    yield 'parse/over_limit', parse_rejected
+
+    parsed = [(name, description, parse_description(description)) for name, description in descriptions]
+    parsed_large = parse_description(SYNTHETIC['large'])
+    parsed_max = parse_description(SYNTHETIC['max_repeat'])
+
+    def build_app():
+        for name, description, ast in parsed:
+            web._build_parsed_ir(name, description, ast, True)
+
+    generator = WorkoutGenerator(os.path.join(tmp_dir, 'generator'))
+    sections_large = large_sections()
+
+    def build_generator():
+        for workout in sections:
+            generator.build_workout_ir(workout)
+
+    def build_zwift():
+        for workout in zwift:
+            build_zwo_ir(workout['workout_name'], workout['description'], workout['warmup_time'],
+                         workout['cooldown_time'], workout['num_sets'])
+
+    yield 'build/app corpus (8)', build_app
+    yield 'build/app large', lambda: web._build_parsed_ir('Large', SYNTHETIC['large'], parsed_large, True)
+    yield 'build/app max_repeat', lambda: web._build_parsed_ir('Max', SYNTHETIC['max_repeat'], parsed_max, True)
+    yield 'build/WorkoutGenerator corpus (4)', build_generator
+    yield 'build/WorkoutGenerator 500 sections', lambda: generator.build_workout_ir(sections_large)
+    yield 'build/zwift_generator corpus (2)', build_zwift
+    yield 'build/zwift_generator 40 sets', lambda: build_zwo_ir(
+        zwift_large['workout_name'], zwift_large['description'], zwift_large['warmup_time'],
+        zwift_large['cooldown_time'], zwift_large['num_sets'])
+    yield 'build/bookend', lambda: build_bookend_workout_ir(bookend['workout_name'], bookend['description'])
+    yield 'build/bookend_30s', lambda: build_bookend_30s_workout_ir(bookend_30s['workout_name'],
+                                                                    bookend_30s['description'])
+    yield 'build/bookend expanded', lambda: build_bookend_workout_ir(
+        bookend['workout_name'], bookend['description'], compact=False)
+
+    app_irs = [web._build_parsed_ir(name, description, ast, True) for name, description, ast in parsed]
+    large_ir = web._build_parsed_ir('Large', SYNTHETIC['large'], parsed_large, True)
+    bookend_expanded = build_bookend_30s_workout_ir(bookend_30s['workout_name'], bookend_30s['description'],
+                                                    compact=False)
+
+    def serialize_app_lxml():
+        # The element path render_workout takes
+        for workout in app_irs:
+            ET.tostring(ir.to_element(workout, ET), pretty_print=True, xml_declaration=True, encoding='UTF-8')
+
+    def serialize_writer():
+        for workout in app_irs:
+            serialize(workout)
+
+    yield 'serialize/app lxml corpus (8)', serialize_app_lxml
+    yield 'serialize/zwo_writer corpus (8)', serialize_writer
+    yield 'serialize/zwo_writer large', lambda: serialize(large_ir)
+    yield 'serialize/zwo_writer bookend_30s expanded', lambda: serialize(bookend_expanded)
+
+    client = web.app.test_client()
+
+    def post(name, description, expect=200):
+        response = client.post('/generate', json={'name': name, 'description': description})
+        response.get_data()
+        response.close()
+        if response.status_code != expect:
+            raise AssertionError(f"/generate {name!r} returned {response.status_code}")
+
+    uncached, cached = RenderCache(max_entries=0), RenderCache(max_entries=256)
+
+    def with_cache(cache, func):
+        def op():
+            previous, web.render_cache = web.render_cache, cache
+            try:
+                func()
+            finally:
+                web.render_cache = previous
+        return op
+
+    def generate_corpus():
+        for name, description in descriptions:
+            post(name, description)
+
+    yield 'e2e/generate corpus (8)', with_cache(uncached, generate_corpus)
+    yield 'e2e/generate corpus cached (8)', with_cache(cached, generate_corpus)
+    yield 'e2e/generate large', with_cache(uncached, lambda: post('Large', SYNTHETIC['large']))
+    yield 'e2e/generate nested', with_cache(uncached, lambda: post('Nested', SYNTHETIC['nested']))
+    yield 'e2e/generate over_limit', with_cache(uncached, lambda: post('Over', over_limit_description(), 400))
+
+    def render_generator():
+        for workout in sections:
+            generator.render_workout(workout)
+
+    def generate_zwift_files():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for workout in zwift:
+                generate_zwo(workout['workout_name'], workout['description'], workout['warmup_time'], [],
+                             workout['cooldown_time'], os.path.join(tmp_dir, 'zwift', 'gavin.zwo'),
+                             workout['num_sets'])
+
+    def generate_bookends():
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_bookend_zwo(bookend['workout_name'], bookend['description'],
+                                 os.path.join(tmp_dir, 'bookend', 'bookend.zwo'))
+            generate_bookend_30s_zwo(bookend_30s['workout_name'], bookend_30s['description'],
+                                     os.path.join(tmp_dir, 'bookend', 'bookend_30s.zwo'))
+
+    yield 'e2e/WorkoutGenerator render corpus (4)', render_generator
+    yield 'e2e/WorkoutGenerator file 500 sections', lambda: generator.generate_workout(sections_large)
+    yield 'e2e/zwift_generator files (2)', generate_zwift_files
+    yield 'e2e/bookend files (2)', generate_bookends
+    yield 'e2e/builtin templates renamed (3)', lambda: [builtin_templates.render(key, name=f"{key} copy")
+                                                        for key in ('gavin', '30_30', 'high_intensity')]
+
+
+# Measurement
+
+def percentile(sorted_times, fraction):
+    index = min(len(sorted_times) - 1, int(round(fraction * (len(sorted_times) - 1))))
+    return sorted_times[index]
+
+
+def measure(op, min_time, min_rounds, warmup=3):
+    for _ in range(warmup):
+        op()
+    times = []
+    clock = time.perf_counter
+    deadline = clock() + min_time
+    while len(times) < min_rounds or clock() < deadline:
+        start = clock()
+        op()
+        times.append(clock() - start)
+    total = sum(times)
+    times.sort()
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        op()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'rounds': len(times),
+        'ops_per_sec': round(len(times) / total, 1),
+        'p50_us': round(percentile(times, 0.50) * 1e6, 1),
+        'p99_us': round(percentile(times, 0.99) * 1e6, 1),
+        'alloc_peak_kb': round((peak - before) / 1024, 1),
+    }
+
+
+def calibrate(rounds=100):
+    """Fastest run of a fixed pure-Python workload, to scale timings between machines."""
+    def work():
+        table = {}
+        for i in range(5000):
+            key = str(i * 7919 % 10007)
+            table[key] = table.get(key, 0) + len(key)
+        return sorted(table.items())
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        work()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compare(results, baseline, calibration, max_regression):
+    """Return ``(case, message)`` for every case that regressed past ``max_regression`` percent."""
+    scale = calibration / baseline['calibration']
+    limit = 1 + max_regression / 100
+    failures = []
+    for name, result in results.items():
+        base = baseline['cases'].get(name)
+        if base is None:
+            continue
+        time_ratio = result['p50_us'] / (base['p50_us'] * scale)
+        if time_ratio > limit:
+            failures.append((name, f"p50 {result['p50_us']:.1f} us vs {base['p50_us'] * scale:.1f} us "
+                                   f"expected (+{(time_ratio - 1) * 100:.0f}%)"))
+        alloc_growth = result['alloc_peak_kb'] - base['alloc_peak_kb']
+        if alloc_growth > ALLOC_SLACK_KB and result['alloc_peak_kb'] > base['alloc_peak_kb'] * limit:
+            failures.append((name, f"peak allocation {result['alloc_peak_kb']:.1f} KB vs "
+                                   f"{base['alloc_peak_kb']:.1f} KB"))
+    return failures
+
+
+def report(name, result, baseline, calibration):
+    change = ''
+    base = baseline and baseline['cases'].get(name)
+    if base:
+        expected = base['p50_us'] * calibration / baseline['calibration']
+        change = f"{(result['p50_us'] / expected - 1) * 100:+.0f}%"
+    print(f"{name:<46}{result['ops_per_sec']:>11,.1f}{result['p50_us']:>10.1f}us"
+          f"{result['p99_us']:>10.1f}us{result['alloc_peak_kb']:>9.1f}KB{change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='filter', help="only run cases whose name contains this")
+    parser.add_argument('--quick', action='store_true', help="shorter runs, for a smoke test")
+    parser.add_argument('--min-time', type=float, default=0.5, help="seconds to time each case")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--max-regression', type=float, default=25.0,
+                        help="percent slowdown or allocation growth that fails the run")
+    parser.add_argument('--retries', type=int, default=2, help="times to re-time a case before failing it")
+    args = parser.parse_args()
+    min_time, min_rounds = (0.05, 5) if args.quick else (args.min_time, 20)
+
+    calibration = calibrate()
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = {}
+    print(f"{'case':<46}{'ops/s':>11}{'p50':>12}{'p99':>12}{'alloc':>11}{'vs base':>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ops = {name: op for name, op in cases(tmp_dir) if not args.filter or args.filter in name}
+        for name, op in ops.items():
+            results[name] = measure(op, min_time, min_rounds)
+            report(name, results[name], baseline, calibration)
+
+        # A slow case is re-timed before it counts, so one noisy stretch doesn't fail the gate
+        for attempt in range(args.retries if baseline else 0):
+            slow = sorted({name for name, _ in compare(results, baseline, calibration, args.max_regression)})
+            if not slow:
+                break
+            print(f"\nRe-timing {len(slow)} case(s) over the limit (attempt {attempt + 1}/{args.retries})")
+            for name in slow:
+                result = measure(ops[name], min_time, min_rounds)
+                if result['p50_us'] < results[name]['p50_us']:
+                    results[name] = result
+                report(name, result, baseline, calibration)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'calibration': calibration, 'cases': results},
+                      f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if baseline is None:
+        print("No baseline to compare against; record one with --save-baseline")
+        return 0
+
+    failures = compare(results, baseline, calibration, args.max_regression)
+    if failures:
+        print(f"\n{len(failures)} regression(s) over {args.max_regression:g}%:")
+        for name, message in failures:
+            print(f"  {name}: {message}")
+        return 1
+    print(f"\nNo regressions over {args.max_regression:g}% (calibration x{calibration / baseline['calibration']:.2f})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,78 +1,49 @@
 import xml.etree.ElementTree as ET
 import os
 from datetime import datetime
+from segment_compactor import compact_segments
+import workout_ir as ir
+from zwo_writer import write_workout
+from zone_table import DEFAULT_ZONE_TABLE
+from template_registry import builtin_templates
+
+def build_bookend_30s_workout_ir(workout_name, description, compact=True, zone_table=None):
+    # Warm-up and cool-down span Z2; recoveries sit at the Z2 target
+    zone_table = zone_table or DEFAULT_ZONE_TABLE
+    z2_low, z2_high = zone_table.bounds("Z2")
+    z2 = zone_table.target(2)
+    segments = [
+        # Warm-up (30 min)
+        ir.warmup(1800, z2_low, z2_high),
+        # Set 1 - First 90 minutes: 10 x 30/30, 30s @ 410-460w and 30s @ 280-340w
+        ir.intervals(10, 30, 1.35, 30, 0.95),
+        # Middle section - 4 x 10-minute tempo blocks (300-330w) spread over 30 min of Z2
+        ir.Repeat(4, [ir.steady(600, 1.0), ir.steady(1800, z2)]),
+        # Set 2 - Final 60 minutes: 10 x 30/30
+        ir.intervals(10, 30, 1.35, 30, 0.95),
+        # Cool-down (30 min)
+        ir.cooldown(1800, z2_low, z2_high),
+    ]
+
+    segments = compact_segments(segments) if compact else ir.expand(segments)
+    return ir.Workout(workout_name, description, segments)
+
+def build_bookend_30s_workout(workout_name, description, compact=True):
+    return ir.to_element(build_bookend_30s_workout_ir(workout_name, description, compact), ET)
 
 def generate_bookend_30s_zwo(workout_name, description, filename):
-    # Create the root element
-    workout = ET.Element("workout_file")
-
-    # Add required elements in correct order
-    ET.SubElement(workout, "author").text = "Gravel God Cycling"
-    ET.SubElement(workout, "name").text = workout_name
-    
-    # Add description with proper CDATA formatting
-    desc = ET.SubElement(workout, "description")
-    desc.text = description
-    
-    sport_type = ET.SubElement(workout, "sportType")
-    sport_type.text = "bike"
-    
-    # Empty tags element
-    ET.SubElement(workout, "tags")
-
-    # Create workout section
-    workout_section = ET.SubElement(workout, "workout")
-
-    # Warm-up (30 min)
-    ET.SubElement(workout_section, "Warmup", 
-                  Duration="1800", 
-                  PowerLow="0.56", PowerHigh="0.75")
-
-    # Set 1 - First 90 minutes
-    # 10 x 30/30 intervals
-    for _ in range(10):
-        ET.SubElement(workout_section, "SteadyState", Duration="30", Power="1.35")  # 30s @ 410-460w
-        ET.SubElement(workout_section, "SteadyState", Duration="30", Power="0.95")  # 30s @ 280-340w
-
-    # Middle section - Accumulate vertical gain or tempo time
-    # 4 x 10-minute tempo blocks spread throughout
-    for _ in range(4):
-        ET.SubElement(workout_section, "SteadyState", Duration="600", Power="1.0")  # 10 min @ 300-330w
-        ET.SubElement(workout_section, "SteadyState", Duration="1800", Power="0.65")  # 30 min @ Z2
-
-    # Set 2 - Final 60 minutes
-    # 10 x 30/30 intervals
-    for _ in range(10):
-        ET.SubElement(workout_section, "SteadyState", Duration="30", Power="1.35")  # 30s @ 410-460w
-        ET.SubElement(workout_section, "SteadyState", Duration="30", Power="0.95")  # 30s @ 280-340w
-
-    # Cool-down (30 min)
-    ET.SubElement(workout_section, "Cooldown", 
-                  Duration="1800", 
-                  PowerLow="0.56", PowerHigh="0.75")
-
-    # Convert XML to a formatted string
-    tree = ET.ElementTree(workout)
-    ET.indent(tree, space="\t")
+    workout = build_bookend_30s_workout_ir(workout_name, description)
 
     # Ensure the directory exists
     os.makedirs(os.path.dirname(filename), exist_ok=True)
 
-    # Save to file with proper XML declaration and CDATA
+    # Stream the XML, with the description as CDATA, straight into the file
     with open(filename, "wb") as f:
-        f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
-        # Write the description with CDATA
-        xml_str = ET.tostring(workout, encoding='unicode')
-        xml_str = xml_str.replace('<description>', '<description><![CDATA[')
-        xml_str = xml_str.replace('</description>', ']]></description>')
-        f.write(xml_str.encode('utf-8'))
+        write_workout(workout, f)
 
     print(f"Workout '{workout_name}' saved as {filename}")
 
-if __name__ == "__main__":
-    workout_data = {
-        "workout_name": "Bookend Power Intervals",
-        "description": """► Pre-activity Instructions:
+BOOKEND_30S_DESCRIPTION = """► Pre-activity Instructions:
 - This is a bookend ride focused on power development and fatigue resistance
 - Pre-workout nutrition is crucial - ensure adequate carbohydrate intake (50-75g/hour)
 - Hydration: Preload with sodium and water, aim for 500-1000mg sodium/hour
@@ -119,7 +90,14 @@ if __name__ == "__main__":
 - Do 10 minutes of mobility work
 - Refuel with adequate carbohydrates and protein
 - Log your workout notes in TrainingPeaks
-- Get to bed early for optimal recovery""",
+- Get to bed early for optimal recovery"""
+
+builtin_templates.register('bookend_30s', lambda: build_bookend_30s_workout_ir("Bookend Power Intervals", BOOKEND_30S_DESCRIPTION))
+
+if __name__ == "__main__":
+    workout_data = {
+        "workout_name": "Bookend Power Intervals",
+        "description": BOOKEND_30S_DESCRIPTION,
     }
 
     # Save to desktop with timestamp
@@ -1,99 +1,54 @@
 import xml.etree.ElementTree as ET
 import os
 from datetime import datetime
+from segment_compactor import compact_segments
+import workout_ir as ir
+from zwo_writer import write_workout
+from zone_table import DEFAULT_ZONE_TABLE
+from template_registry import builtin_templates
+
+def bookend_block():
+    """One 6-min block: 1 min Z6, 1 min Z5, 2 min Z4, 1 min Z5, 1 min Z6."""
+    return [
+        ir.steady(60, 1.5),    # Z6, Max Effort
+        ir.steady(60, 1.15),   # Z5
+        ir.steady(120, 1.0),   # Z4
+        ir.steady(60, 1.15),   # Z5
+        ir.steady(60, 1.5),    # Z6, Max Effort
+    ]
+
+def build_bookend_workout_ir(workout_name, description, compact=True, zone_table=None):
+    # Warm-up and cool-down span Z2; recoveries sit at the Z2 target
+    zone_table = zone_table or DEFAULT_ZONE_TABLE
+    z2_low, z2_high = zone_table.bounds("Z2")
+    z2 = zone_table.target(2)
+    # Each set is two 6-min blocks with 8 min Z2 recovery between
+    bookend_set = bookend_block() + [ir.steady(480, z2)] + bookend_block()
+    segments = [ir.warmup(1800, z2_low, z2_high)]       # Warm-up (30 min)
+    segments += bookend_set                             # Set 1 - First 1.5 hours
+    segments.append(ir.steady(7200, z2))                # Middle section - 2 hours of Z1-3
+    segments += bookend_set                             # Set 2 - Final 90 minutes
+    segments.append(ir.cooldown(1800, z2_low, z2_high)) # Cool-down (30 min)
+
+    segments = compact_segments(segments) if compact else ir.expand(segments)
+    return ir.Workout(workout_name, description, segments)
+
+def build_bookend_workout(workout_name, description, compact=True):
+    return ir.to_element(build_bookend_workout_ir(workout_name, description, compact), ET)
 
 def generate_bookend_zwo(workout_name, description, filename):
-    # Create the root element
-    workout = ET.Element("workout_file")
-
-    # Add required elements in correct order
-    ET.SubElement(workout, "author").text = "Gravel God Cycling"
-    ET.SubElement(workout, "name").text = workout_name
-    
-    # Add description with proper CDATA formatting
-    desc = ET.SubElement(workout, "description")
-    desc.text = description
-    
-    sport_type = ET.SubElement(workout, "sportType")
-    sport_type.text = "bike"
-    
-    # Empty tags element
-    ET.SubElement(workout, "tags")
-
-    # Create workout section
-    workout_section = ET.SubElement(workout, "workout")
-
-    # Warm-up (30 min)
-    ET.SubElement(workout_section, "Warmup", 
-                  Duration="1800", 
-                  PowerLow="0.56", PowerHigh="0.75")
-
-    # Set 1 - First 1.5 hours
-    # First 6-min block
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.5")  # Z6, Max Effort
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.15")  # Z5
-    ET.SubElement(workout_section, "SteadyState", Duration="120", Power="1.0")  # Z4
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.15")  # Z5
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.5")  # Z6, Max Effort
-    
-    # 8 min Z2 recovery
-    ET.SubElement(workout_section, "SteadyState", Duration="480", Power="0.65")
-    
-    # Second 6-min block
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.5")  # Z6, Max Effort
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.15")  # Z5
-    ET.SubElement(workout_section, "SteadyState", Duration="120", Power="1.0")  # Z4
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.15")  # Z5
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.5")  # Z6, Max Effort
-
-    # Middle section - 2 hours of Z1-3
-    ET.SubElement(workout_section, "SteadyState", Duration="7200", Power="0.65")  # Z2
-
-    # Set 2 - Final 90 minutes
-    # First 6-min block
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.5")  # Z6, Max Effort
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.15")  # Z5
-    ET.SubElement(workout_section, "SteadyState", Duration="120", Power="1.0")  # Z4
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.15")  # Z5
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.5")  # Z6, Max Effort
-    
-    # 8 min Z2 recovery
-    ET.SubElement(workout_section, "SteadyState", Duration="480", Power="0.65")
-    
-    # Second 6-min block
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.5")  # Z6, Max Effort
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.15")  # Z5
-    ET.SubElement(workout_section, "SteadyState", Duration="120", Power="1.0")  # Z4
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.15")  # Z5
-    ET.SubElement(workout_section, "SteadyState", Duration="60", Power="1.5")  # Z6, Max Effort
-
-    # Cool-down (30 min)
-    ET.SubElement(workout_section, "Cooldown", 
-                  Duration="1800", 
-                  PowerLow="0.56", PowerHigh="0.75")
-
-    # Convert XML to a formatted string
-    tree = ET.ElementTree(workout)
-    ET.indent(tree, space="\t")
+    workout = build_bookend_workout_ir(workout_name, description)
 
     # Ensure the directory exists
     os.makedirs(os.path.dirname(filename), exist_ok=True)
 
-    # Save to file with proper XML declaration and CDATA
+    # Stream the XML, with the description as CDATA, straight into the file
     with open(filename, "wb") as f:
-        f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
-        # Write the description with CDATA
-        xml_str = ET.tostring(workout, encoding='unicode')
-        xml_str = xml_str.replace('<description>', '<description><![CDATA[')
-        xml_str = xml_str.replace('</description>', ']]></description>')
-        f.write(xml_str.encode('utf-8'))
+        write_workout(workout, f)
 
     print(f"Workout '{workout_name}' saved as {filename}")
 
-if __name__ == "__main__":
-    workout_data = {
-        "workout_name": "Bookend Power Intervals",
-        "description": """► Pre-activity Instructions:
+BOOKEND_DESCRIPTION = """► Pre-activity Instructions:
 - This is a bookend ride designed to build fatigue resistance and fueling ability
 - Pre-workout nutrition is crucial - ensure adequate carbohydrate intake (50-75g/hour)
 - Hydration: Preload with sodium and water, aim for 500-1000mg sodium/hour
@@ -144,7 +99,17 @@ if __name__ == "__main__":
 - Do 10 minutes of mobility work
 - Refuel with adequate carbohydrates and protein
 - Log your workout notes in TrainingPeaks
-- Get to bed early for optimal recovery""",
+- Get to bed early for optimal recovery"""
+
+builtin_templates.register('bookend', lambda: build_bookend_workout_ir("Bookend Power Intervals", BOOKEND_DESCRIPTION),
+                           card=True, title="Bookend Power",
+                           summary="Start and finish strong with steady middle",
+                           badges=["Endurance", "Z4-Z6"])
+
+if __name__ == "__main__":
+    workout_data = {
+        "workout_name": "Bookend Power Intervals",
+        "description": BOOKEND_DESCRIPTION,
     }
 
     # Save to desktop with timestamp
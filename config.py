@@ -16,6 +16,14 @@ class Config:
     AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
     AWS_BUCKET_NAME = os.getenv('AWS_BUCKET_NAME', 'gravel-god-workouts')
     AWS_REGION = os.getenv('AWS_REGION', 'us-west-2')
+    S3_TRANSFER_WORKERS = int(os.getenv('S3_TRANSFER_WORKERS', 16))  # threads for *_many transfers
+    S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', 32))
+    PRESIGNED_URL_CACHE_SIZE = int(os.getenv('PRESIGNED_URL_CACHE_SIZE', 4096))
+    DOWNLOAD_CACHE_DIR = os.getenv('DOWNLOAD_CACHE_DIR')  # unset disables the local download cache
+    DOWNLOAD_CACHE_BYTES = int(os.getenv('DOWNLOAD_CACHE_BYTES', 256 * 1024 * 1024))
+    DOWNLOAD_CACHE_TTL = int(os.getenv('DOWNLOAD_CACHE_TTL', 300))  # seconds before an ETag is rechecked
+    DOWNLOAD_CACHE_STALE_WHILE_REVALIDATE = os.getenv('DOWNLOAD_CACHE_STALE_WHILE_REVALIDATE', '') == '1'
+    PRESIGNED_URL_MIN_VALIDITY = int(os.getenv('PRESIGNED_URL_MIN_VALIDITY', 300))  # seconds a reused URL must have left
     
     # File Storage
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.expanduser('~/Desktop'))
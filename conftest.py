@@ -0,0 +1,22 @@
+import os
+import shutil
+import tempfile
+
+# Must be set before app (and config) are imported
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+# Keep the store, render cache and spool out of the checkout
+_workout_dir = tempfile.mkdtemp(prefix='zwift-batcher-tests-')
+os.environ.setdefault('WORKOUT_DIR', _workout_dir)
+
+import pytest
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_workout_dir, ignore_errors=True)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def database():
+    """The schema, which the app leaves to ``flask init-db`` rather than creating at import."""
+    import app
+    app.init_db()
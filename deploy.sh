@@ -19,14 +19,10 @@ UPLOAD_FOLDER=/path/to/uploads
 EOL
 
 # Create Procfile for Heroku
-echo "web: gunicorn app:app" > Procfile
+printf "release: flask --app app init-db\nweb: gunicorn app:app\n" > Procfile
 
 # Initialize database
-python3 << EOL
-from app import app, db
-with app.app_context():
-    db.create_all()
-EOL
+flask --app app init-db
 
 # Start the application
 python3 app.py 
\ No newline at end of file
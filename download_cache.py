@@ -0,0 +1,286 @@
+"""Local disk tier in front of S3 downloads.
+
+Objects are stored once per ETag under ``blobs/`` and each S3 key has a
+small record under ``keys/`` saying which ETag it last had and when that
+was checked. Within ``ttl`` seconds of the check a download is a local
+file copy; after that the cache revalidates with a conditional GET
+(``IfNoneMatch``), so an unchanged object costs a 304 and no body. With
+``stale_while_revalidate`` the stale copy is served immediately and the
+revalidation runs in the background instead.
+
+Every file is written to a temporary name and renamed into place, and
+fills of the same key are serialized across processes with an flock, so
+several gunicorn workers can share one directory. Blob mtimes double as
+the LRU clock: hits touch them, and once the directory grows past
+``max_bytes`` the least recently used blobs are deleted, along with the
+key records and lock files left pointing at missing blobs.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _write_atomic(path, write):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class DownloadCache:
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024, ttl=300, stale_while_revalidate=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        for sub in ('blobs', 'keys', 'locks'):
+            os.makedirs(os.path.join(cache_dir, sub), exist_ok=True)
+        self._lock = threading.Lock()
+        self._revalidating = set()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-revalidate')
+        self._bytes = self._scan_bytes()
+        self.hits = self.misses = self.revalidated = self.stale_served = self.evictions = 0
+
+    def _blob_path(self, etag):
+        return os.path.join(self.cache_dir, 'blobs', _digest(etag))
+
+    def _key_name(self, bucket, s3_key):
+        return _digest(f"{bucket}/{s3_key}")
+
+    def _record_path(self, name):
+        return os.path.join(self.cache_dir, 'keys', f"{name}.json")
+
+    def _lock_path(self, name):
+        return os.path.join(self.cache_dir, 'locks', f"{name}.lock")
+
+    def _open_lock(self, name, blocking=True):
+        """Open and flock the key's lock file; None if not ``blocking`` and it is held.
+
+        Pruning unlinks lock files, so a lock taken on a file that was
+        unlinked meanwhile is dropped and taken again on the current one.
+        """
+        path = self._lock_path(name)
+        while True:
+            lock = open(path, 'a')
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if os.stat(path).st_ino == os.fstat(lock.fileno()).st_ino:
+                    return lock
+            except BlockingIOError:
+                lock.close()
+                return None
+            except FileNotFoundError:
+                pass
+            lock.close()
+
+    def _read_record(self, name):
+        try:
+            with open(self._record_path(name), 'rb') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_record(self, name, etag):
+        record = json.dumps({'etag': etag, 'checked_at': time.time()}).encode('utf-8')
+        _write_atomic(self._record_path(name), lambda f: f.write(record))
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def fetch(self, s3, bucket, s3_key, local_path):
+        """Copy ``s3_key`` to ``local_path``, from disk when possible.
+
+        Raises the ClientError of a failed S3 request, like download_file.
+        """
+        name = self._key_name(bucket, s3_key)
+        record = self._read_record(name)
+        blob = self._blob_path(record['etag']) if record else None
+        if blob is not None:
+            if time.time() - record['checked_at'] < self.ttl:
+                if self._serve(blob, local_path, 'hits'):
+                    return True
+            elif self.stale_while_revalidate and self._serve(blob, local_path, 'stale_served'):
+                self._revalidate_in_background(s3, bucket, s3_key, name)
+                return True
+        with self._fill(s3, bucket, s3_key, name) as source, open(local_path, 'wb') as f:
+            shutil.copyfileobj(source, f)
+        return True
+
+    def _serve(self, blob, local_path, counter):
+        try:
+            os.utime(blob)
+            shutil.copyfile(blob, local_path)
+        except FileNotFoundError:
+            # Evicted (possibly by another process); fall back to a fill
+            return False
+        self._count(counter)
+        return True
+
+    def _fill(self, s3, bucket, s3_key, name):
+        """Revalidate or download under a cross-process lock; return the blob, open for reading.
+
+        The blob is opened before the lock is released, so an eviction by
+        another process can't remove it between the fill and the copy.
+        """
+        with self._open_lock(name):
+            # Another worker may have filled it while we waited
+            record = self._read_record(name)
+            source = self._open_blob(record['etag']) if record else None
+            if source is not None:
+                if time.time() - record['checked_at'] < self.ttl:
+                    self._count('hits')
+                    return source
+                try:
+                    response = s3.get_object(Bucket=bucket, Key=s3_key, IfNoneMatch=record['etag'])
+                except ClientError as e:
+                    if e.response.get('Error', {}).get('Code') not in ('304', 'NotModified'):
+                        source.close()
+                        raise
+                    self._write_record(name, record['etag'])
+                    os.utime(source.fileno())
+                    self._count('revalidated')
+                    return source
+                source.close()
+            else:
+                response = s3.get_object(Bucket=bucket, Key=s3_key)
+            self._count('misses')
+            etag = response['ETag']
+            blob = self._blob_path(etag)
+            body = response['Body']
+            _write_atomic(blob, lambda f: shutil.copyfileobj(body, f))
+            self._write_record(name, etag)
+            source = open(blob, 'rb')
+        self._added(os.fstat(source.fileno()).st_size, blob)
+        return source
+
+    def _open_blob(self, etag):
+        try:
+            return open(self._blob_path(etag), 'rb')
+        except FileNotFoundError:
+            return None
+
+    def _revalidate_in_background(self, s3, bucket, s3_key, name):
+        with self._lock:
+            if name in self._revalidating:
+                return
+            self._revalidating.add(name)
+
+        def revalidate():
+            try:
+                self._fill(s3, bucket, s3_key, name).close()
+            except Exception as e:
+                logger.warning(f"Background revalidation of {s3_key} failed: {e}")
+            finally:
+                with self._lock:
+                    self._revalidating.discard(name)
+        self._executor.submit(revalidate)
+
+    def invalidate(self, bucket, s3_keys):
+        """Forget the ETag of keys this process has just overwritten or deleted."""
+        for s3_key in s3_keys:
+            try:
+                os.unlink(self._record_path(self._key_name(bucket, s3_key)))
+            except FileNotFoundError:
+                pass
+
+    def _scan_bytes(self):
+        blobs = os.path.join(self.cache_dir, 'blobs')
+        return sum(entry.stat().st_size for entry in os.scandir(blobs) if entry.is_file())
+
+    def _added(self, size, blob):
+        with self._lock:
+            self._bytes += size
+            if self._bytes <= self.max_bytes:
+                return
+        self.evict(keep=blob)
+
+    def evict(self, keep=None):
+        """Delete least recently used blobs until the directory is under ``max_bytes``.
+
+        ``keep`` (the blob just filled) is never deleted.
+        """
+        blobs, total = [], 0
+        with os.scandir(os.path.join(self.cache_dir, 'blobs')) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith('.tmp-'):
+                    stat = entry.stat()
+                    total += stat.st_size
+                    if entry.path != keep:
+                        blobs.append((stat.st_mtime, stat.st_size, entry.path))
+        evicted = 0
+        for _, size, path in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                evicted += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self._bytes = total
+            self.evictions += evicted
+        if evicted:
+            self._prune_keys()
+
+    def _prune_keys(self):
+        """Delete key records whose blob is gone, and lock files with no live record."""
+        live, stale = set(), set()
+        with os.scandir(os.path.join(self.cache_dir, 'keys')) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    name = entry.name[:-len('.json')]
+                    (live if self._has_blob(name) else stale).add(name)
+        with os.scandir(os.path.join(self.cache_dir, 'locks')) as it:
+            for entry in it:
+                if entry.name.endswith('.lock') and entry.name[:-len('.lock')] not in live:
+                    stale.add(entry.name[:-len('.lock')])
+        for name in stale:
+            lock = self._open_lock(name, blocking=False)
+            if lock is None:
+                continue  # Being filled right now
+            with lock:
+                # Checked again under the lock, now that no fill can be rewriting it
+                if self._has_blob(name):
+                    continue
+                for path in (self._record_path(name), self._lock_path(name)):
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+
+    def _has_blob(self, name):
+        record = self._read_record(name)
+        return record is not None and os.path.exists(self._blob_path(record['etag']))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidated': self.revalidated,
+                'stale_served': self.stale_served,
+                'evictions': self.evictions,
+            }
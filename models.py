@@ -20,6 +20,13 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
 class Workout(db.Model):
+    # Listing pages are keyset-paginated on (created_at, id), per user or category
+    __table_args__ = (
+        db.Index('ix_workout_created', 'created_at', 'id'),
+        db.Index('ix_workout_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_workout_category_created', 'template_category', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -29,7 +36,12 @@ class Workout(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     is_template = db.Column(db.Boolean, default=False)
     template_category = db.Column(db.String(50))  # e.g., 'intervals', 'endurance'
-    
+
+    # Summary of the workout itself, filled in by workout_library.summarize
+    duration = db.Column(db.Integer, index=True)  # seconds
+    max_power = db.Column(db.Float, index=True)  # decimal of FTP
+    z5_seconds = db.Column(db.Integer, index=True)  # seconds at Z5 or above
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -38,5 +50,8 @@ class Workout(db.Model):
             'created_at': self.created_at.isoformat(),
             'author': self.author.name,
             'is_template': self.is_template,
-            'template_category': self.template_category
+            'template_category': self.template_category,
+            'duration': self.duration,
+            'max_power': self.max_power,
+            'z5_seconds': self.z5_seconds
         } 
\ No newline at end of file
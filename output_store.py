@@ -0,0 +1,190 @@
+"""Managed store for generated workout files.
+
+Files are named ``<name>_<digest>.zwo``, where the digest is a prefix of
+the SHA-256 of the bytes, so two different workouts can't overwrite each
+other however close together they are saved, and saving the same bytes
+twice is one file. They live in a two-level layout sharded by the digest
+(``ab/cd/<name>_abcd....zwo``), so no directory grows large, and since the
+shard can be read off the name, finding a file is a single stat rather
+than a lookup in one huge directory - no in-memory index to keep in step
+across gunicorn workers.
+
+Writes go to a temporary file in the shard and are renamed into place.
+A background sweeper deletes files older than ``ttl`` and then the oldest
+ones until the store is under ``max_bytes``; saving a file that is already
+there refreshes its age.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+DIGEST_LENGTH = 20
+# Any stem sanitize_filename can produce; only the digest suffix is structural. No path
+# separators or control characters, and no leading dot (that is how temp files are named).
+_FILENAME_RE = re.compile(r'^[^./\\\x00-\x1f][^/\\\x00-\x1f]*_([0-9a-f]{%d})\.zwo\Z' % DIGEST_LENGTH)
+
+
+class OutputStore:
+    def __init__(self, root, ttl=24 * 3600, max_bytes=512 * 1024 * 1024, sweep_interval=300):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        os.makedirs(root, exist_ok=True)
+        self._stop = threading.Event()
+        self._thread = None
+        self._fork_hook = False
+        self._lock = threading.Lock()
+        self.files = self.bytes = 0
+        self.expired = self.evicted = 0
+        self.last_sweep = None
+
+    def filename_for(self, name, data):
+        """The store filename for ``data`` saved under the (already sanitized) ``name``."""
+        digest = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+        return f"{name}_{digest}.zwo"
+
+    def path_for(self, filename):
+        """Where ``filename`` lives, or None if it isn't a store filename."""
+        match = _FILENAME_RE.match(filename)
+        if match is None:
+            return None
+        digest = match.group(1)
+        return os.path.join(self.root, digest[:2], digest[2:4], filename)
+
+    def put(self, name, data):
+        """Save ``data`` and return its filename."""
+        filename = self.filename_for(name, data)
+        path = self.path_for(filename)
+        if path is None:
+            raise ValueError(f"Invalid workout file name: {name!r}")
+        try:
+            os.utime(path)
+            return filename
+        except FileNotFoundError:
+            pass
+        shard = os.path.dirname(path)
+        os.makedirs(shard, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=shard, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return filename
+
+    def open_path(self, filename):
+        """Path of a stored file; raises FileNotFoundError if there is none."""
+        path = self.path_for(filename)
+        if path is None or not os.path.isfile(path):
+            raise FileNotFoundError(f"Workout file not found: {filename}")
+        return path
+
+    def _iter_files(self):
+        for first in os.scandir(self.root):
+            if not first.is_dir():
+                continue
+            for second in os.scandir(first.path):
+                if not second.is_dir():
+                    continue
+                for entry in os.scandir(second.path):
+                    if entry.is_file():
+                        yield entry
+
+    def sweep(self):
+        """Delete expired files, then the oldest until under ``max_bytes``."""
+        now = time.time()
+        kept, expired = [], 0
+        for entry in self._iter_files():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            # Temp files older than a sweep belong to a writer that died
+            stale_tmp = entry.name.startswith('.tmp-') and now - stat.st_mtime > self.sweep_interval
+            if stale_tmp or now - stat.st_mtime > self.ttl:
+                expired += self._remove(entry.path)
+            elif not entry.name.startswith('.tmp-'):
+                kept.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in kept)
+        evicted = 0
+        for _, size, path in sorted(kept):
+            if total <= self.max_bytes:
+                break
+            evicted += self._remove(path)
+            total -= size
+        with self._lock:
+            self.files = len(kept) - evicted
+            self.bytes = total
+            self.expired += expired
+            self.evicted += evicted
+            self.last_sweep = now
+        if expired or evicted:
+            logger.info(f"Output store sweep removed {expired} expired and {evicted} files over the size cap")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+            return 1
+        except FileNotFoundError:
+            # Another worker's sweeper got there first
+            return 0
+
+    def start_sweeper(self):
+        """Sweep now and then every ``sweep_interval`` seconds on a daemon thread."""
+        def run():
+            while True:
+                try:
+                    self.sweep()
+                except OSError as e:
+                    logger.error(f"Output store sweep failed: {e}")
+                if self._stop.wait(self.sweep_interval):
+                    return
+        self._thread = threading.Thread(target=run, name='output-sweeper', daemon=True)
+        self._thread.start()
+        if not self._fork_hook:
+            self._fork_hook = True
+            store = weakref.ref(self)
+
+            def after_fork():
+                if store() is not None:
+                    store()._after_fork()
+            os.register_at_fork(after_in_child=after_fork)
+        return self
+
+    def _after_fork(self):
+        """The sweeper thread doesn't survive fork; start one in the child too."""
+        self._lock = threading.Lock()
+        running = self._thread is not None and not self._stop.is_set()
+        self._stop = threading.Event()
+        self._thread = None
+        if running:
+            self.start_sweeper()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': self.files,
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'last_sweep': self.last_sweep,
+            }
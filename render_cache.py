@@ -0,0 +1,171 @@
+"""Two-tier, content-addressed cache for rendered ZWO bytes.
+
+Tier one is a bounded in-process LRU; tier two is a directory of
+``<key>.zwo`` files with a total size cap, evicted least recently used
+first. Keys are SHA-256 digests of everything that affects the rendered
+output, so entries never need invalidating - a change to the inputs or to
+the zone table simply produces a different key.
+
+The directory is shared by every worker, so it is the only index of the
+disk tier: lookups open ``<key>.zwo`` directly, reads bump its mtime, and
+the cap is enforced by scanning the directory and deleting the oldest
+files. A process scans once its own writes since the last scan reach
+1/16 of the cap, or the total it knows of passes the cap, so the
+directory can overshoot by at most that much per worker. File I/O happens
+outside the lock that guards the in-memory state.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def make_key(*parts):
+    """Hash JSON-serializable render inputs into a hex cache key."""
+    payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, max_entries=256, disk_dir=None, max_disk_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        # What the last scan found plus this process's writes since
+        self._disk_entries = 0
+        self._disk_bytes = 0
+        self._unscanned_bytes = 0
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self.counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+        }
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.zwo")
+
+    def get(self, key):
+        """Return cached bytes for ``key`` or None, counting the lookup."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return data
+        data = self._read_disk(key) if self.disk_dir else None
+        with self._lock:
+            if data is None:
+                self.counters['misses'] += 1
+                return None
+            self.counters['disk_hits'] += 1
+            self._remember(key, data)
+            return data
+
+    def put(self, key, data):
+        """Store rendered bytes in both tiers."""
+        with self._lock:
+            self._remember(key, data)
+        if self.disk_dir and self._write_disk(key, data):
+            with self._lock:
+                self._disk_entries += 1
+                self._disk_bytes += len(data)
+                self._unscanned_bytes += len(data)
+                scan = (self._disk_bytes > self.max_disk_bytes
+                        or self._unscanned_bytes >= self.max_disk_bytes // 16)
+            if scan:
+                self._scan_disk()
+
+    def get_or_render(self, key, render):
+        """Return cached bytes for ``key``, calling ``render()`` on a miss."""
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self._memory)
+            stats['disk_entries'] = self._disk_entries
+            stats['disk_bytes'] = self._disk_bytes
+            return stats
+
+    def _remember(self, key, data):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counters['memory_evictions'] += 1
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            # Never written, or evicted by this or another worker
+            return None
+        return data
+
+    def _write_disk(self, key, data):
+        """Write ``key`` unless it is already on disk; True if a new file was added."""
+        path = self._disk_path(key)
+        if len(data) > self.max_disk_bytes or os.path.exists(path):
+            return False
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return False
+        return True
+
+    def _scan_disk(self):
+        """Total up the directory and delete the least recently used files over the cap."""
+        if not self._scan_lock.acquire(blocking=False):
+            return  # Another thread is already scanning
+        try:
+            entries = []
+            for entry in os.scandir(self.disk_dir):
+                if not entry.name.endswith('.zwo'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            removed = evicted = 0
+            for _, size, path in entries:
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                    evicted += 1
+                except FileNotFoundError:
+                    pass  # Another worker evicted it first
+                removed += 1
+                total -= size
+            with self._lock:
+                self._disk_entries = len(entries) - removed
+                self._disk_bytes = total
+                self._unscanned_bytes = 0
+                self.counters['disk_evictions'] += evicted
+        finally:
+            self._scan_lock.release()
@@ -0,0 +1,144 @@
+"""Opt-in capture of anonymized ``/generate`` traffic as JSON Lines.
+
+Each captured request is one line::
+
+    {"ts": 1760668800.123, "method": "POST", "path": "/generate",
+     "body": {"name": "workout-3f9c0a1b2d", "description": "..."},
+     "status": 200, "duration_ms": 4.2, "response_bytes": 2731}
+
+``benchmarks/replay.py`` fires a capture back at a running server with the
+original spacing (or sped up), so load tests use real workload shapes.
+
+Only the fields the endpoint reads are kept. Workout names are replaced by
+a salted hash - the same name always maps to the same token, so the render
+cache sees the same hit pattern on replay. Without a salt the hashes of
+common names could be looked up, so unless one is given a random salt is
+generated and kept in ``<capture file>.salt``, which every worker writing
+to the same capture reads. Emails, URLs, @handles and
+phone numbers are masked in descriptions. The rest of the description is
+kept, since it is what determines the work done. Lines are appended with a
+single ``write`` on an ``O_APPEND`` descriptor, so several gunicorn workers
+can share one file.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CAPTURED_FIELDS = ('name', 'description')
+
+_SCRUB = [
+    (re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+'), '<email>'),
+    (re.compile(r'(?:https?://|www\.)\S+', re.IGNORECASE), '<url>'),
+    (re.compile(r'(?<!\w)@\w+'), '<handle>'),
+    # 10+ digits, optionally split by spaces, dots or dashes; shorter numbers are workout data
+    (re.compile(r'\+?\d(?:[\s.-]?\d){9,}'), '<phone>'),
+]
+
+
+def scrub(text):
+    """Mask contact details and links in free text."""
+    for pattern, replacement in _SCRUB:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def shared_salt(path):
+    """The salt stored in ``path``, created with a random value if it doesn't exist yet."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='ascii') as f:
+            f.write(secrets.token_hex(32))
+        # link() fails if another worker got there first, and never exposes a half-written file
+        os.link(tmp_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp_path)
+    with open(path, encoding='ascii') as f:
+        salt = f.read().strip()
+    if not salt:
+        raise ValueError(f"Capture salt file {path} is empty")
+    return salt
+
+
+class RequestCapture:
+    def __init__(self, path, sample_rate=1.0, salt=None):
+        self.path = path
+        self.sample_rate = sample_rate
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.salt = salt or shared_salt(f"{path}.salt")
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self._lock = threading.Lock()
+        self.captured = self.dropped = 0
+
+    def anonymize_name(self, name):
+        digest = hashlib.sha256(f"{self.salt}:{name}".encode('utf-8')).hexdigest()
+        return f"workout-{digest[:10]}"
+
+    def anonymize(self, body):
+        """The captured copy of a request body: known fields only, with identifying text masked."""
+        if not isinstance(body, dict):
+            return None
+        captured = {}
+        for field in CAPTURED_FIELDS:
+            value = body.get(field)
+            if not isinstance(value, str):
+                continue
+            captured[field] = self.anonymize_name(value.strip()) if field == 'name' else scrub(value)
+        return captured
+
+    def record(self, method, path, body, status, elapsed, response_bytes=None):
+        """Append one request; ``elapsed`` is the server-side handling time in seconds."""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        line = json.dumps({
+            'ts': round(time.time() - elapsed, 6),
+            'method': method,
+            'path': path,
+            'body': self.anonymize(body),
+            'status': status,
+            'duration_ms': round(elapsed * 1000, 3),
+            'response_bytes': response_bytes,
+        }, ensure_ascii=False) + '\n'
+        try:
+            os.write(self._fd, line.encode('utf-8'))
+        except OSError as e:
+            with self._lock:
+                self.dropped += 1
+            logger.warning(f"Could not capture request to {self.path}: {e}")
+            return
+        with self._lock:
+            self.captured += 1
+
+    def close(self):
+        os.close(self._fd)
+
+    def stats(self):
+        with self._lock:
+            return {'captured': self.captured, 'dropped': self.dropped, 'sample_rate': self.sample_rate}
+
+
+def read_capture(path):
+    """Yield the captured requests in a JSON Lines file, skipping lines that don't parse."""
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping malformed line {number} of {path}")
+                continue
+            if isinstance(record, dict) and 'path' in record and 'ts' in record:
+                yield record
@@ -0,0 +1,158 @@
+"""Fold expanded workout segments back into compact IR nodes.
+
+Generators describe workouts one effort at a time, so a 10 x 30/30 set can
+arrive as twenty steady segments. ``compact_segments`` rewrites a list of
+:mod:`workout_ir` nodes:
+
+1. adjacent identical steady segments (and identical repeats) are merged,
+2. alternating on/off steady pairs become one :class:`Repeat` (IntervalsT),
+3. runs of same-kind ramps with a shared slope become one ramp.
+
+``power_timeline`` expands nodes to a per-second (power, cadence) byte
+string; compaction never changes it, and ``compact_segments(...,
+verify=True)`` checks that it didn't.
+"""
+from array import array
+
+from workout_ir import (
+    Segment, Repeat, STEADY, RAMP_KINDS, FREERIDE, interval_pair, iter_segments
+)
+
+
+def normalize(segments):
+    """Compact repeat bodies and drop repeats that add nothing."""
+    normalized = []
+    for node in segments:
+        if not isinstance(node, Repeat):
+            normalized.append(Segment(node.kind, node.duration, node.power_low, node.power_high, node.cadence))
+            continue
+        body = compact_segments(node.body)
+        count = node.count
+        while len(body) == 1 and isinstance(body[0], Repeat):
+            count *= body[0].count
+            body = body[0].body
+        if len(body) == 1 and isinstance(body[0], Segment) and body[0].kind == STEADY:
+            single = body[0]
+            normalized.append(Segment(STEADY, single.duration * count, single.power_low,
+                                      single.power_high, single.cadence))
+        elif count == 1 and interval_pair(Repeat(1, body)) is None:
+            normalized.extend(body)
+        else:
+            normalized.append(Repeat(count, body))
+    return normalized
+
+
+def merge_identical(segments):
+    """Merge adjacent steady segments (or repeats) that differ only in length."""
+    merged = []
+    for node in segments:
+        if merged:
+            prev = merged[-1]
+            if isinstance(node, Segment) and isinstance(prev, Segment) and node.kind == STEADY \
+                    and node.key() == prev.key():
+                prev.duration += node.duration
+                continue
+            if isinstance(node, Repeat) and isinstance(prev, Repeat) and node.body == prev.body:
+                prev.count += node.count
+                continue
+        merged.append(node)
+    return merged
+
+
+def fold_intervals(segments):
+    """Replace runs of identical on/off steady pairs with a Repeat."""
+    folded = []
+    i = 0
+    while i < len(segments):
+        repeat = _pair_repeats(segments, i)
+        if repeat:
+            pair = [segments[i], segments[i + 1]]
+            prev = folded[-1] if folded else None
+            if isinstance(prev, Repeat) and prev.body == pair:
+                prev.count += repeat
+            elif repeat >= 2:
+                folded.append(Repeat(repeat, pair))
+            else:
+                folded.extend(pair)
+            i += 2 * repeat
+        else:
+            folded.append(segments[i])
+            i += 1
+    return folded
+
+
+def _pair_repeats(segments, start):
+    """How many times the steady pair at ``start`` repeats back to back."""
+    if start + 1 >= len(segments):
+        return 0
+    on, off = segments[start], segments[start + 1]
+    if interval_pair(Repeat(1, [on, off])) is None:
+        return 0
+    repeat = 1
+    i = start + 2
+    while i + 1 < len(segments) and segments[i] == on and segments[i + 1] == off:
+        repeat += 1
+        i += 2
+    return repeat
+
+
+def collapse_ramps(segments):
+    """Join consecutive same-kind ramps that continue the same straight line."""
+    collapsed = []
+    for node in segments:
+        prev = collapsed[-1] if collapsed else None
+        if isinstance(node, Segment) and isinstance(prev, Segment) and node.kind in RAMP_KINDS \
+                and node.kind == prev.kind and _ramp_continues(prev, node):
+            candidate = Segment(prev.kind, prev.duration + node.duration, prev.power_low,
+                                node.power_high, prev.cadence)
+            if _timeline([candidate]) == _timeline([prev, node]):
+                collapsed[-1] = candidate
+                continue
+        collapsed.append(node)
+    return collapsed
+
+
+def _ramp_continues(first, second):
+    if first.cadence != second.cadence or first.power_high != second.power_low:
+        return False
+    if not first.duration or not second.duration:
+        return False  # A zero-length ramp has no slope to continue
+    slope_first = (first.power_high - first.power_low) / first.duration
+    slope_second = (second.power_high - second.power_low) / second.duration
+    return abs(slope_first - slope_second) < 1e-9
+
+
+def compact_segments(segments, verify=False):
+    """Return a compacted copy of a list of IR nodes.
+
+    With ``verify=True`` the per-second power timeline is compared before
+    and after, and a ValueError is raised if compaction changed it.
+    """
+    compacted = merge_identical(collapse_ramps(fold_intervals(merge_identical(normalize(segments)))))
+    if verify and _timeline(segments) != _timeline(compacted):
+        raise ValueError("Segment compaction changed the power timeline")
+    return compacted
+
+
+def power_timeline(segments):
+    """Per-second (power in 1/10000 FTP, cadence) pairs as packed bytes."""
+    return _timeline(segments)
+
+
+def _timeline(segments):
+    samples = array('i')
+    for segment in iter_segments(segments):
+        duration = segment.duration
+        cadence = segment.cadence or 0
+        if segment.kind == FREERIDE or segment.power_low is None:
+            samples.extend(array('i', [-10000, cadence]) * duration)
+        elif segment.kind in RAMP_KINDS:
+            low, high = segment.power_low, segment.power_high
+            for second in range(duration):
+                samples.append(round((low + (high - low) * second / duration) * 10000))
+                samples.append(cadence)
+        else:
+            # Steady target ranges count as their midpoint
+            power = (segment.power_low + segment.power_high) / 2
+            samples.extend(array('i', [round(power * 10000), cadence]) * duration)
+    return samples.tobytes()
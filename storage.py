@@ -1,17 +1,161 @@
 import boto3
-from botocore.exceptions import ClientError
+from boto3.exceptions import Boto3Error
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import BotoCoreError, ClientError
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import os
+import threading
+import time
 from config import Config
+from download_cache import DownloadCache
+
+# S3 caps DeleteObjects at 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+# Objects are small, so each transfer is a single request on the calling
+# thread; the *_many methods parallelize across objects instead
+_TRANSFER_CONFIG = TransferConfig(use_threads=False)
+
+_client = None
+_executor = None
+_lock = threading.Lock()
+
+def shared_client():
+    """The process-wide S3 client. boto3 clients are thread-safe, and sharing
+    one keeps a single connection pool instead of one per Storage()."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = boto3.client(
+                    's3',
+                    aws_access_key_id=Config.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=Config.AWS_SECRET_ACCESS_KEY,
+                    region_name=Config.AWS_REGION,
+                    config=BotoConfig(
+                        max_pool_connections=Config.S3_MAX_POOL_CONNECTIONS,
+                        retries={'max_attempts': 5, 'mode': 'adaptive'}
+                    )
+                )
+    return _client
+
+def _transfer_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=Config.S3_TRANSFER_WORKERS,
+                                               thread_name_prefix='s3-transfer')
+    return _executor
+
+def _result(s3_key, error=None, **fields):
+    """Per-item outcome of a *_many call."""
+    result = {'s3_key': s3_key, 'success': error is None, 'error': error}
+    result.update(fields)
+    return result
+
+class PresignedUrlCache:
+    """LRU of presigned URLs keyed by (bucket, key, expiration).
+
+    A cached URL is handed out again only while it has at least
+    ``min_validity`` seconds left (capped at half the requested expiration,
+    so short-lived links are still reused); older ones count as expired and
+    are re-signed. Entries past that point are dropped on lookup, and the
+    least recently used go once ``max_entries`` is reached.
+    """
+
+    def __init__(self, max_entries=4096, min_validity=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.min_validity = min_validity
+        self.clock = clock
+        self._entries = OrderedDict()  # (bucket, key, expiration) -> (url, reusable_until)
+        self._expirations = {}  # (bucket, key) -> expirations cached for it, so invalidation is O(1)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.expired = self.evictions = 0
+
+    def get_or_sign(self, bucket, s3_key, expiration, sign):
+        cache_key = (bucket, s3_key, expiration)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                if now < entry[1]:
+                    self._entries.move_to_end(cache_key)
+                    self.hits += 1
+                    return entry[0]
+                self._forget(cache_key)
+                self.expired += 1
+            self.misses += 1
+        url = sign()
+        if url is None or self.max_entries <= 0:
+            return url
+        reusable_until = now + expiration - min(self.min_validity, expiration / 2)
+        with self._lock:
+            self._entries[cache_key] = (url, reusable_until)
+            self._entries.move_to_end(cache_key)
+            self._expirations.setdefault((bucket, s3_key), set()).add(expiration)
+            while len(self._entries) > self.max_entries:
+                self._forget(next(iter(self._entries)))
+                self.evictions += 1
+        return url
+
+    def invalidate(self, bucket, s3_keys):
+        """Forget every cached URL for the given keys."""
+        with self._lock:
+            for s3_key in s3_keys:
+                for expiration in list(self._expirations.get((bucket, s3_key), ())):
+                    self._forget((bucket, s3_key, expiration))
+
+    def _forget(self, cache_key):
+        del self._entries[cache_key]
+        bucket, s3_key, expiration = cache_key
+        expirations = self._expirations[(bucket, s3_key)]
+        expirations.discard(expiration)
+        if not expirations:
+            del self._expirations[(bucket, s3_key)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+            }
+
+# Shared by every Storage() in the process, like the client
+presigned_url_cache = PresignedUrlCache(Config.PRESIGNED_URL_CACHE_SIZE, Config.PRESIGNED_URL_MIN_VALIDITY)
+
+# Read-through disk cache for downloads, shared by every Storage(); off unless DOWNLOAD_CACHE_DIR is set
+download_cache = None
+if Config.DOWNLOAD_CACHE_DIR:
+    download_cache = DownloadCache(Config.DOWNLOAD_CACHE_DIR, Config.DOWNLOAD_CACHE_BYTES,
+                                   Config.DOWNLOAD_CACHE_TTL, Config.DOWNLOAD_CACHE_STALE_WHILE_REVALIDATE)
 
 class Storage:
-    def __init__(self):
-        self.s3 = boto3.client(
-            's3',
-            aws_access_key_id=Config.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=Config.AWS_SECRET_ACCESS_KEY,
-            region_name=Config.AWS_REGION
-        )
+    def __init__(self, s3=None, url_cache=None, download_cache=None):
+        self.s3 = s3 or shared_client()
         self.bucket = Config.AWS_BUCKET_NAME
+        self.url_cache = url_cache or presigned_url_cache
+        self.download_cache = download_cache or globals()['download_cache']
+
+    def _download(self, s3_key, local_path):
+        if self.download_cache is not None:
+            self.download_cache.fetch(self.s3, self.bucket, s3_key, local_path)
+        else:
+            self.s3.download_file(self.bucket, s3_key, local_path, Config=_TRANSFER_CONFIG)
+
+    def _forget(self, s3_keys):
+        """Drop cached URLs and ETags for keys that were just overwritten or deleted."""
+        self.url_cache.invalidate(self.bucket, s3_keys)
+        if self.download_cache is not None:
+            self.download_cache.invalidate(self.bucket, s3_keys)
+
+    def object_url(self, s3_key):
+        return f"https://{self.bucket}.s3.{Config.AWS_REGION}.amazonaws.com/{s3_key}"
 
     def upload_file(self, file_path, s3_key=None):
         """Upload a file to S3."""
@@ -19,16 +163,27 @@ class Storage:
             s3_key = os.path.basename(file_path)
         
         try:
-            self.s3.upload_file(file_path, self.bucket, s3_key)
-            return f"https://{self.bucket}.s3.{Config.AWS_REGION}.amazonaws.com/{s3_key}"
-        except ClientError as e:
+            self.s3.upload_file(file_path, self.bucket, s3_key, Config=_TRANSFER_CONFIG)
+            self._forget([s3_key])
+            return self.object_url(s3_key)
+        except (ClientError, Boto3Error) as e:
             print(f"Error uploading file to S3: {e}")
             return None
 
+    def upload_data(self, data, s3_key, content_type='application/xml'):
+        """Upload in-memory bytes to S3."""
+        try:
+            self.s3.put_object(Bucket=self.bucket, Key=s3_key, Body=data, ContentType=content_type)
+            self._forget([s3_key])
+            return self.object_url(s3_key)
+        except ClientError as e:
+            print(f"Error uploading data to S3: {e}")
+            return None
+
     def download_file(self, s3_key, local_path):
         """Download a file from S3."""
         try:
-            self.s3.download_file(self.bucket, s3_key, local_path)
+            self._download(s3_key, local_path)
             return True
         except ClientError as e:
             print(f"Error downloading file from S3: {e}")
@@ -38,13 +193,18 @@ class Storage:
         """Delete a file from S3."""
         try:
             self.s3.delete_object(Bucket=self.bucket, Key=s3_key)
+            self._forget([s3_key])
             return True
         except ClientError as e:
             print(f"Error deleting file from S3: {e}")
             return False
 
     def get_presigned_url(self, s3_key, expiration=3600):
-        """Generate a presigned URL for file download."""
+        """Presigned download URL, reused from the cache while it has enough validity left."""
+        return self.url_cache.get_or_sign(self.bucket, s3_key, expiration,
+                                          lambda: self._sign_url(s3_key, expiration))
+
+    def _sign_url(self, s3_key, expiration):
         try:
             url = self.s3.generate_presigned_url(
                 'get_object',
@@ -57,4 +217,56 @@ class Storage:
             return url
         except ClientError as e:
             print(f"Error generating presigned URL: {e}")
-            return None 
\ No newline at end of file
+            return None
+
+    def _upload_one(self, source, s3_key):
+        try:
+            if isinstance(source, (bytes, bytearray)):
+                self.s3.put_object(Bucket=self.bucket, Key=s3_key, Body=bytes(source),
+                                   ContentType='application/xml')
+            else:
+                self.s3.upload_file(source, self.bucket, s3_key, Config=_TRANSFER_CONFIG)
+            self._forget([s3_key])
+            return _result(s3_key, url=self.object_url(s3_key))
+        except (ClientError, BotoCoreError, Boto3Error, OSError) as e:
+            # upload_file wraps failures in S3UploadFailedError, a Boto3Error
+            return _result(s3_key, str(e), url=None)
+
+    def _download_one(self, s3_key, local_path):
+        try:
+            self._download(s3_key, local_path)
+            return _result(s3_key, local_path=local_path)
+        except (ClientError, BotoCoreError, OSError) as e:
+            return _result(s3_key, str(e), local_path=local_path)
+
+    def upload_many(self, items):
+        """Upload ``(source, s3_key)`` pairs concurrently; a source is a file
+        path or bytes. Returns one result dict per item, in input order."""
+        items = list(items)
+        return list(_transfer_executor().map(lambda item: self._upload_one(*item), items))
+
+    def download_many(self, items):
+        """Download ``(s3_key, local_path)`` pairs concurrently. Returns one
+        result dict per item, in input order."""
+        items = list(items)
+        return list(_transfer_executor().map(lambda item: self._download_one(*item), items))
+
+    def delete_many(self, s3_keys):
+        """Delete keys with batched DeleteObjects requests. Returns one result
+        dict per key, in input order."""
+        s3_keys = list(s3_keys)
+        errors = {}
+        for start in range(0, len(s3_keys), DELETE_BATCH_SIZE):
+            batch = s3_keys[start:start + DELETE_BATCH_SIZE]
+            try:
+                response = self.s3.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+                )
+            except (ClientError, BotoCoreError) as e:
+                errors.update((key, str(e)) for key in batch)
+                continue
+            for error in response.get('Errors', []):
+                errors[error['Key']] = f"{error.get('Code')}: {error.get('Message')}"
+        self._forget([key for key in s3_keys if key not in errors])
+        return [_result(key, errors.get(key)) for key in s3_keys]
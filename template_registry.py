@@ -0,0 +1,95 @@
+"""Registry of built-in workout templates, compiled once and served as bytes.
+
+Generator modules register their fixed workouts with :data:`builtin_templates`
+at import time, passing a function that builds the workout IR. Each entry
+is compiled with :func:`workout_template.compile_template` on first use (or
+all at once by :meth:`TemplateRegistry.warm` at worker start), after which
+serving it is a dict lookup, plus a name/description splice if asked for.
+"""
+import threading
+from typing import Callable, Dict, List, Optional
+
+import workout_ir as ir
+from workout_template import WorkoutTemplate, compile_template
+
+
+class TemplateRegistry:
+    def __init__(self):
+        self._entries = {}
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def register(self, key: str, build: Callable[[], ir.Workout], card: bool = False,
+                 title: str = None, summary: str = '', badges: List[str] = ()):
+        """Register a template. With ``card=True`` it is offered on the index
+        page, described by ``title``, ``summary`` and ``badges``."""
+        self._entries[key] = {
+            'build': build,
+            'card': card,
+            'title': title or key,
+            'summary': summary,
+            'badges': list(badges),
+        }
+        self._compiled.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self) -> List[str]:
+        return list(self._entries)
+
+    def _compile(self, key):
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            with self._lock:
+                compiled = self._compiled.get(key)
+                if compiled is None:
+                    workout = self._entries[key]['build']()
+                    template = compile_template(workout)
+                    compiled = (template, template.render(), workout)
+                    self._compiled[key] = compiled
+        return compiled
+
+    def get(self, key: str) -> WorkoutTemplate:
+        """The compiled template for ``key``; raises KeyError if unknown."""
+        return self._compile(key)[0]
+
+    def workout(self, key: str) -> ir.Workout:
+        """The workout IR a template was compiled from. Treat it as read-only."""
+        return self._compile(key)[2]
+
+    def render(self, key: str, name: Optional[str] = None, description: Optional[str] = None) -> bytes:
+        """ZWO bytes for a template, optionally with a different name or description."""
+        template, default, _ = self._compile(key)
+        if name is None and description is None:
+            return default
+        return template.render(name=name, description=description)
+
+    def warm(self):
+        """Compile every registered template now rather than on first request."""
+        for key in self.keys():
+            self.get(key)
+
+    def cards(self, order: List[str] = ()) -> List[Dict]:
+        """Card details for the index page: keys in ``order`` first, then the
+        rest in registration order."""
+        keys = [key for key in order if key in self._entries]
+        keys += [key for key in self._entries if key not in keys]
+        cards = []
+        for key in keys:
+            entry = self._entries[key]
+            if not entry['card']:
+                continue
+            template = self.get(key)
+            cards.append({
+                'key': key,
+                'title': entry['title'],
+                'summary': entry['summary'],
+                'badges': entry['badges'],
+                'name': template.name,
+                'description': template.description,
+            })
+        return cards
+
+
+builtin_templates = TemplateRegistry()
@@ -0,0 +1,33 @@
+import os
+
+# Must be set before app (and config) are imported
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import pytest
+
+import app as web
+from app_metrics import Histogram
+
+
+def test_timer_start_and_stop_observe_once():
+    histogram = Histogram('test_seconds', 'Test.', ('stage',))
+    timer = histogram.time('send').start()
+    assert timer.stop() >= 0
+    with pytest.raises(RuntimeError):
+        timer.stop()
+    with histogram.time('send'):
+        pass
+    assert 'test_seconds_count{stage="send"} 2' in histogram.render()
+
+
+def test_send_stage_is_observed_when_the_response_closes():
+    def send_count():
+        lines = web.app_metrics.STAGE_SECONDS.render()
+        return next((int(line.rsplit(' ', 1)[1]) for line in lines
+                     if line.startswith('zwo_stage_duration_seconds_count{stage="send"}')), 0)
+
+    before = send_count()
+    response = web.app.test_client().post('/generate', json={'name': 'Send', 'description': "-20' Z4"})
+    assert response.status_code == 200
+    response.close()
+    assert send_count() == before + 1
@@ -0,0 +1,54 @@
+import io
+import json
+import os
+import zipfile
+
+# Must be set before app (and config) are imported
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import app as web
+
+SECTIONS = [{"type": "Warmup", "duration": 300, "power_low": 0.5, "power_high": 0.75}]
+
+
+def post_batch(body, content_type='application/json'):
+    response = web.app.test_client().post('/generate/batch', data=body, content_type=content_type)
+    assert response.status_code == 200 and response.mimetype == 'application/zip'
+    return zipfile.ZipFile(io.BytesIO(response.data))
+
+
+def test_batch_zip_holds_each_workout_and_a_manifest():
+    items = [
+        {"name": "Threshold", "description": "-2x20' Z4 / 5' Z2"},
+        {"name": "Threshold", "description": "-3x10' Z4 / 3' Z2"},
+        {"name": "Nothing", "description": "just some notes"},
+        {"workout_name": "Sections", "sections": SECTIONS},
+        {"name": "Empty"},
+    ]
+    archive = post_batch('\n'.join(json.dumps(item) for item in items), 'application/x-ndjson')
+
+    assert archive.namelist() == ['Threshold.zwo', 'Threshold_2.zwo', 'Sections.zwo', 'manifest.json']
+    assert archive.read('Threshold.zwo') == web.render_workout('Threshold', items[0]['description'])
+    assert archive.read('Threshold_2.zwo') == web.render_workout('Threshold', items[1]['description'])
+    assert archive.read('Sections.zwo') == web.section_generator.render_workout(
+        {"workout_name": "Sections", "description": "", "sections": SECTIONS})
+
+    manifest = json.loads(archive.read('manifest.json'))
+    assert [(entry['index'], entry['name'], entry['status']) for entry in manifest] == [
+        (0, 'Threshold', 'ok'), (1, 'Threshold', 'ok'), (2, 'Nothing', 'error'),
+        (3, 'Sections', 'ok'), (4, 'Empty', 'error')]
+    assert [entry.get('file') for entry in manifest if entry['status'] == 'ok'] == \
+        ['Threshold.zwo', 'Threshold_2.zwo', 'Sections.zwo']
+    assert manifest[2]['error'] and manifest[4]['error'] == 'Missing workout description'
+
+
+def test_batch_accepts_a_json_array():
+    archive = post_batch(json.dumps([{"name": "A", "description": "-20' Z2"}]))
+    assert archive.namelist() == ['A.zwo', 'manifest.json']
+
+
+def test_batch_rejects_bad_bodies():
+    client = web.app.test_client()
+    for body in ['', '[]', '[1, 2]', '{"name": ']:
+        response = client.post('/generate/batch', data=body, content_type='application/json')
+        assert response.status_code == 400
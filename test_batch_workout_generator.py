@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+import batch_workout_generator
+from batch_workout_generator import WorkoutGenerator, iter_workout_descriptions, process_workout_descriptions
+
+SECTIONS = [{"type": "Warmup", "duration": 300, "power_low": 0.5, "power_high": 0.75},
+            {"type": "Intervals", "repeats": 3, "on_duration": 30, "on_power": 1.2,
+             "off_duration": 30, "off_power": 0.6}]
+
+
+def workouts(count):
+    return [{"workout_name": f"Workout {i}", "description": f"Number {i}", "sections": SECTIONS}
+            for i in range(count)]
+
+
+def write_json_lines(path, items):
+    path.write_text(''.join(json.dumps(item) + '\n' for item in items))
+    return str(path)
+
+
+def test_json_array_and_json_lines_stream_the_same_records(tmp_path):
+    items = workouts(5)
+    array = tmp_path / 'workouts.json'
+    # Pretty-printed, with multi-byte text, so record offsets aren't line offsets
+    items[2]["description"] = "Zone 2 → Zone 4 “surges”"
+    array.write_text(json.dumps(items, indent=2, ensure_ascii=False), encoding='utf-8')
+    lines = write_json_lines(tmp_path / 'workouts.jsonl', items)
+
+    for path in (str(array), lines):
+        records = list(iter_workout_descriptions(path))
+        assert [(line, data) for line, _, data in records] == list(enumerate(items))
+        # Every offset is a point the rest of the file can be resumed from
+        for line, offset, _ in records:
+            rest = list(iter_workout_descriptions(path, offset, line + 1))
+            assert [data for _, _, data in rest] == items[line + 1:]
+
+
+def test_json_lines_skip_blank_lines(tmp_path):
+    path = tmp_path / 'workouts.jsonl'
+    path.write_text('\n'.join(json.dumps(item) for item in workouts(2)).replace('\n', '\n\n'))
+    assert [data["workout_name"] for _, _, data in iter_workout_descriptions(str(path))] == \
+        ["Workout 0", "Workout 1"]
+
+
+def test_streaming_yields_results_instead_of_collecting_them(tmp_path):
+    items = workouts(3)
+    items[1]["sections"] = [{"type": "Tempo", "repeats": 2}]  # Missing duration
+    path = write_json_lines(tmp_path / 'workouts.jsonl', items)
+    results = process_workout_descriptions(path, str(tmp_path / 'out'), stream=True)
+    assert not isinstance(results, list)
+    results = list(results)
+    assert [line for line, _, _ in results] == [0, 1, 2]
+    assert results[0][1].endswith('.zwo') and results[0][2] is None
+    assert results[1][1] is None and results[1][2]["workout_name"] == "Workout 1"
+
+
+@pytest.mark.parametrize('suffix', ['.json', '.jsonl'])
+def test_streaming_resumes_from_the_checkpoint(tmp_path, monkeypatch, suffix):
+    monkeypatch.setattr(batch_workout_generator, 'CHECKPOINT_INTERVAL', 2)
+    items = workouts(7)
+    path = tmp_path / f'workouts{suffix}'
+    if suffix == '.json':
+        path.write_text(json.dumps(items))
+    else:
+        write_json_lines(path, items)
+    checkpoint = str(tmp_path / 'checkpoint.json')
+
+    # Crash after five workouts: the checkpoint covers the first four
+    results = process_workout_descriptions(str(path), str(tmp_path / 'out'), stream=True,
+                                           checkpoint_file=checkpoint)
+    assert [next(results)[0] for _ in range(5)] == [0, 1, 2, 3, 4]
+    results.close()
+    with open(checkpoint) as f:
+        assert json.load(f)["line"] == 4
+
+    resumed = process_workout_descriptions(str(path), str(tmp_path / 'out'), stream=True,
+                                           checkpoint_file=checkpoint)
+    assert [line for line, _, _ in resumed] == [4, 5, 6]
+    # A finished run clears its checkpoint
+    assert not (tmp_path / 'checkpoint.json').exists()
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_batch_generate_keeps_order_and_records_errors(tmp_path, workers):
+    items = workouts(12)
+    # Same name throughout, so files can only be told apart by their index
+    for item in items:
+        item["workout_name"] = "Same Name"
+    items[4]["sections"] = [{"type": "Intervals", "repeats": 2}]
+    items[9] = {"description": "No name or sections"}
+    generator = WorkoutGenerator(str(tmp_path))
+
+    filenames = generator.batch_generate(items, workers=workers)
+    assert len(filenames) == len(set(filenames)) == 10
+    assert [int(name.rsplit('_', 1)[1][:-4]) for name in filenames] == \
+        [i for i in range(12) if i not in (4, 9)]
+    assert len(list(tmp_path.glob('*.zwo'))) == 10
+    assert [(error["index"], error["workout_name"], error["error_type"]) for error in generator.errors] == \
+        [(4, "Same Name", "ValueError"), (9, "Unknown", "KeyError")]
+    # Errors are reset by the next batch
+    generator.batch_generate(workouts(2), workers=workers)
+    assert generator.errors == []
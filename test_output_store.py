@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+from output_store import OutputStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return OutputStore(str(tmp_path / 'store'))
+
+
+@pytest.mark.parametrize('name', ['Gavin_Special_(5x8)', "Sam's_VO2", 'Over+Under', '30%_FTP', 'a.b-c'])
+def test_names_with_punctuation_round_trip(store, name):
+    filename = store.put(name, b'<workout_file/>')
+    assert filename.startswith(f"{name}_") and filename.endswith('.zwo')
+    with open(store.open_path(filename), 'rb') as f:
+        assert f.read() == b'<workout_file/>'
+
+
+@pytest.mark.parametrize('filename', ['../x_' + 'a' * 20 + '.zwo', 'a/b_' + 'a' * 20 + '.zwo',
+                                      '.tmp-x_' + 'a' * 20 + '.zwo', 'x_' + 'a' * 20 + '.zwo\n',
+                                      'x_' + 'a' * 19 + '.zwo'])
+def test_paths_and_malformed_names_are_not_store_files(store, filename):
+    assert store.path_for(filename) is None
+    with pytest.raises(FileNotFoundError):
+        store.open_path(filename)
+
+
+def test_saving_the_same_bytes_twice_is_one_file(store):
+    assert store.put('a', b'x') == store.put('a', b'x')
+    store.sweep()
+    assert store.stats()['files'] == 1
+    assert os.path.isfile(store.open_path(store.filename_for('a', b'x')))
@@ -0,0 +1,59 @@
+import os
+import threading
+
+from render_cache import RenderCache, make_key
+
+
+def test_workers_share_the_disk_tier(tmp_path):
+    first = RenderCache(max_entries=0, disk_dir=str(tmp_path))
+    second = RenderCache(max_entries=0, disk_dir=str(tmp_path))
+    key = make_key('Threshold', "-2x20' Z4")
+    first.put(key, b'<workout_file/>')
+    assert second.get(key) == b'<workout_file/>'
+    assert second.stats()['disk_hits'] == 1
+    # Evicted by the other worker: a miss, not an error
+    os.unlink(tmp_path / f'{key}.zwo')
+    assert second.get(key) is None and second.stats()['misses'] == 1
+
+
+def test_disk_cap_holds_across_workers(tmp_path):
+    cap = 16 * 1000
+    workers = [RenderCache(max_entries=0, disk_dir=str(tmp_path), max_disk_bytes=cap) for _ in range(4)]
+    for i in range(200):
+        workers[i % 4].put(make_key(i), bytes(1000))
+        on_disk = sum(entry.stat().st_size for entry in os.scandir(tmp_path))
+        # Each worker can run up to 1/16 of the cap ahead of its last scan
+        assert on_disk <= cap + 4 * cap // 16
+    assert sum(cache.stats()['disk_evictions'] for cache in workers) > 0
+    # The most recently written entries survive
+    assert workers[0].get(make_key(199)) == bytes(1000)
+
+
+def test_reads_refresh_lru_order(tmp_path):
+    cache = RenderCache(max_entries=0, disk_dir=str(tmp_path), max_disk_bytes=3000)
+    for i in range(3):
+        cache.put(make_key(i), bytes(1000))
+        os.utime(tmp_path / f'{make_key(i)}.zwo', (i, i))
+    cache.get(make_key(0))
+    cache.put(make_key(3), bytes(1000))
+    assert cache.get(make_key(0)) is not None
+    assert cache.get(make_key(1)) is None
+
+
+def test_disk_io_does_not_hold_the_lock(tmp_path, monkeypatch):
+    cache = RenderCache(disk_dir=str(tmp_path))
+    cache.put('warm', b'memory')
+    locked = []
+    write_disk = cache._write_disk
+
+    def checking_write(key, data):
+        # A memory hit from another thread must not wait on this write
+        thread = threading.Thread(target=lambda: locked.append(cache.get('warm') is None))
+        thread.start()
+        thread.join(timeout=1)
+        locked.append(thread.is_alive())
+        return write_disk(key, data)
+
+    monkeypatch.setattr(cache, '_write_disk', checking_write)
+    cache.put('cold', b'disk')
+    assert locked == [False, False]
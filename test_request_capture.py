@@ -0,0 +1,91 @@
+import importlib.util
+import json
+import os
+import threading
+
+# Must be set before app (and config) are imported
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import pytest
+from werkzeug.serving import make_server
+
+import app as web
+from request_capture import RequestCapture, read_capture, scrub
+
+DESCRIPTION = """Z1-Z2 base with focus on efforts as follows:
+
+-3x5' Z4 / 3' Z2
+Questions to coach@example.com or @coachsam, 0412 345 678 90"""
+
+
+def load_replay():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'replay.py')
+    spec = importlib.util.spec_from_file_location('replay', path)
+    replay = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(replay)
+    return replay
+
+
+@pytest.fixture
+def capture(tmp_path, monkeypatch):
+    capture = RequestCapture(str(tmp_path / 'requests.jsonl'), salt='test')
+    monkeypatch.setattr(web, 'request_capture', capture)
+    yield capture
+    capture.close()
+
+
+def test_scrub_masks_contact_details_but_not_workout_numbers():
+    assert scrub("mail a.b@c.com, @sam, +44 7700 900 123, http://x.io/y") == "mail <email>, <handle>, <phone>, <url>"
+    assert scrub("-2x10' 300-330w (150-160bpm), 1440x30\"") == "-2x10' 300-330w (150-160bpm), 1440x30\""
+
+
+def test_generate_requests_are_captured_anonymized(capture):
+    client = web.app.test_client()
+    for name in ('Sam Smith VO2', 'Sam Smith VO2', 'Other'):
+        client.post('/generate', json={'name': name, 'description': DESCRIPTION, 'athlete': 'Sam'}).close()
+    client.get('/templates')
+    records = list(read_capture(capture.path))
+    assert [record['path'] for record in records] == ['/generate'] * 3
+    names = [record['body']['name'] for record in records]
+    assert names[0] == names[1] != names[2] and 'Sam' not in names[0]
+    assert set(records[0]['body']) == {'name', 'description'}
+    assert records[0]['body']['description'].endswith("Questions to <email> or <handle>, <phone>")
+    assert records[0]['status'] == 200 and records[0]['duration_ms'] > 0 and records[0]['response_bytes'] > 0
+
+
+def test_replay_reports_throughput_latency_and_errors(capture):
+    client = web.app.test_client()
+    for i in range(6):
+        client.post('/generate', json={'name': f'Workout {i}', 'description': DESCRIPTION}).close()
+    client.post('/generate', json={'name': 'Empty', 'description': ''}).close()
+    replay = load_replay()
+    records = replay.load_records(capture.path, loops=2)
+    assert len(records) == 14
+
+    server = make_server('127.0.0.1', 0, web.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        summary = replay.Replayer(f'http://127.0.0.1:{server.server_port}', concurrency=3, speedup=0).run(records)
+    finally:
+        server.shutdown()
+    assert summary['requests'] == 14
+    assert summary['statuses'] == {'200': 12, '400': 2}
+    assert summary['error_rate'] == 0 and summary['first_error'] is None
+    assert summary['throughput_rps'] > 0 and summary['latency_ms']['p50'] <= summary['latency_ms']['max']
+    json.dumps(summary)
+
+
+def test_capture_without_a_salt_shares_a_random_one(tmp_path):
+    path = str(tmp_path / 'requests.jsonl')
+    captures = [RequestCapture(path), RequestCapture(path), RequestCapture(str(tmp_path / 'other.jsonl'))]
+    try:
+        first, second, other = captures
+        assert first.salt == second.salt != other.salt and len(first.salt) == 64
+        assert os.stat(path + '.salt').st_mode & 0o077 == 0
+        assert first.anonymize_name('Sweet Spot') == second.anonymize_name('Sweet Spot')
+        assert first.anonymize_name('Sweet Spot') != other.anonymize_name('Sweet Spot')
+        assert [name for name in os.listdir(tmp_path) if name.endswith('.tmp')] == []
+    finally:
+        for capture in captures:
+            capture.close()
@@ -0,0 +1,96 @@
+import json
+import os
+
+# Must be set before app (and config) are imported
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import pytest
+
+import app as web
+import workout_ir as ir
+from batch_workout_generator import WorkoutGenerator
+from bookend_30s import build_bookend_30s_workout_ir
+from bookend_workout import build_bookend_workout_ir
+from segment_compactor import _timeline, compact_segments
+from workout_generator import high_intensity_segments
+from zwift_generator import build_zwo_ir
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'corpus')
+
+
+def load_corpus(name):
+    with open(os.path.join(CORPUS_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+DESCRIPTIONS = load_corpus('descriptions.json')
+SECTIONS = load_corpus('sections.json')
+GENERATORS = load_corpus('generators.json')
+
+HAND_BUILT = {
+    'nested repeats': [
+        ir.Repeat(3, [ir.intervals(4, 30, 1.2, 30, 0.5, 95), ir.steady(120, 0.55)]),
+        ir.Repeat(2, [ir.Repeat(2, [ir.steady(60, 0.9)])]),
+        ir.Repeat(1, [ir.steady(30, 1.1), ir.steady(30, 0.6)]),
+    ],
+    'split 30/30s': [segment for _ in range(10) for segment in (ir.steady(30, 1.2, 100), ir.steady(30, 0.6, 85))],
+    'ramps': [
+        ir.warmup(300, 0.4, 0.5), ir.warmup(300, 0.5, 0.6), ir.warmup(120, 0.6, 0.9),
+        ir.ramp(7, 0.5, 0.53), ir.ramp(7, 0.53, 0.56), ir.ramp(60, 0.7, 0.7, 90),
+        ir.cooldown(600, 0.75, 0.5, 85), ir.cooldown(600, 0.5, 0.25, 85),
+    ],
+    'ranges and free ride': [
+        ir.steady_range(300, 0.85, 0.9), ir.steady_range(300, 0.85, 0.9),
+        ir.Segment(ir.FREERIDE, 600), ir.Segment(ir.FREERIDE, 600, cadence=85),
+    ],
+}
+
+
+def assert_same_timeline(segments):
+    compacted = compact_segments(segments)
+    assert _timeline(segments) == _timeline(compacted)
+    assert compact_segments(segments, verify=True) == compacted
+
+
+@pytest.mark.parametrize('workout', DESCRIPTIONS, ids=[workout['name'] for workout in DESCRIPTIONS])
+def test_app_workouts(workout):
+    assert_same_timeline(web.build_workout_ir(workout['name'], workout['description'], compact=False).segments)
+
+
+def test_bookend_workouts():
+    for workout in GENERATORS['bookend']:
+        assert_same_timeline(build_bookend_workout_ir(workout['workout_name'], workout['description'],
+                                                      compact=False).segments)
+    for workout in GENERATORS['bookend_30s']:
+        assert_same_timeline(build_bookend_30s_workout_ir(workout['workout_name'], workout['description'],
+                                                          compact=False).segments)
+
+
+def test_zwift_generator_workouts():
+    for workout in GENERATORS['zwift_generator']:
+        assert_same_timeline(build_zwo_ir(workout['workout_name'], workout['description'], workout['warmup_time'],
+                                          workout['cooldown_time'], workout['num_sets'], compact=False).segments)
+
+
+def test_workout_generator_workouts(tmp_path):
+    generator = WorkoutGenerator(str(tmp_path))
+    for workout in SECTIONS:
+        assert_same_timeline(generator.build_workout_ir(workout, compact=False).segments)
+    assert_same_timeline(ir.expand(high_intensity_segments()))
+
+
+@pytest.mark.parametrize('name', sorted(HAND_BUILT))
+def test_hand_built_segments(name):
+    segments = HAND_BUILT[name]
+    assert_same_timeline(segments)
+    assert_same_timeline(ir.expand(segments))
+
+
+def test_folds_alternating_pairs_and_ramps():
+    assert compact_segments(HAND_BUILT['split 30/30s']) == [ir.intervals(10, 30, 1.2, 30, 0.6, 100, 85)]
+    assert compact_segments(HAND_BUILT['ramps'])[:2] == [ir.warmup(600, 0.4, 0.6), ir.warmup(120, 0.6, 0.9)]
+
+
+def test_zero_length_ramps_are_left_alone():
+    segments = [ir.warmup(60, 0.4, 0.5), ir.warmup(0, 0.5, 0.6), ir.warmup(60, 0.6, 0.7)]
+    assert_same_timeline(segments)
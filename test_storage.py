@@ -0,0 +1,220 @@
+import os
+from collections import OrderedDict
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from config import Config
+from download_cache import DownloadCache
+from storage import DELETE_BATCH_SIZE, PresignedUrlCache, Storage
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    # moto intercepts every request in-process; fake credentials keep boto3 off the network
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        s3 = boto3.client('s3', region_name=Config.AWS_REGION)
+        s3.create_bucket(Bucket=Config.AWS_BUCKET_NAME,
+                         CreateBucketConfiguration={'LocationConstraint': Config.AWS_REGION})
+        yield Storage(s3)
+
+
+def object_keys(storage):
+    paginator = storage.s3.get_paginator('list_objects_v2')
+    return {obj['Key'] for page in paginator.paginate(Bucket=storage.bucket) for obj in page.get('Contents', [])}
+
+
+def test_upload_many_accepts_paths_and_bytes_in_order(storage, tmp_path):
+    path = tmp_path / 'a.zwo'
+    path.write_bytes(b'<workout_file>a</workout_file>')
+    results = storage.upload_many([(str(path), 'a.zwo'), (b'<workout_file>b</workout_file>', 'b.zwo'),
+                                   (str(tmp_path / 'missing.zwo'), 'missing.zwo')])
+    assert [r['s3_key'] for r in results] == ['a.zwo', 'b.zwo', 'missing.zwo']
+    assert [r['success'] for r in results] == [True, True, False]
+    assert results[0]['url'].endswith('/a.zwo') and results[2]['error']
+    assert object_keys(storage) == {'a.zwo', 'b.zwo'}
+
+
+def test_download_many_reports_missing_keys(storage, tmp_path):
+    storage.upload_many([(f'<w>{i}</w>'.encode(), f'w{i}.zwo') for i in range(20)])
+    items = [(f'w{i}.zwo', str(tmp_path / f'w{i}.zwo')) for i in range(20)] + [('nope.zwo', str(tmp_path / 'nope'))]
+    results = storage.download_many(items)
+    assert all(r['success'] for r in results[:20])
+    assert not results[20]['success']
+    assert (tmp_path / 'w7.zwo').read_bytes() == b'<w>7</w>'
+
+
+def test_delete_many_batches_requests(storage):
+    keys = [f'k/{i}.zwo' for i in range(DELETE_BATCH_SIZE + 50)]
+    assert all(r['success'] for r in storage.upload_many([(b'x', key) for key in keys]))
+    calls = []
+    storage.s3.meta.events.register('before-call.s3.DeleteObjects', lambda **kwargs: calls.append(1))
+    results = storage.delete_many(keys)
+    assert len(calls) == 2
+    assert [r['s3_key'] for r in results] == keys and all(r['success'] for r in results)
+    assert object_keys(storage) == set()
+
+
+def test_storages_share_one_client(monkeypatch):
+    monkeypatch.setattr('storage._client', None)
+    assert Storage().s3 is Storage().s3
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_presigned_urls_are_reused_until_the_safety_margin(storage):
+    clock = FakeClock()
+    storage.url_cache = PresignedUrlCache(max_entries=10, min_validity=300, clock=clock)
+    signed = []
+    storage.s3.meta.events.register('before-sign.s3.GetObject', lambda **kwargs: signed.append(1))
+    first = storage.get_presigned_url('a.zwo')
+    clock.now += 3600 - 301
+    assert storage.get_presigned_url('a.zwo') == first
+    assert len(signed) == 1
+    storage.get_presigned_url('a.zwo', expiration=60)
+    assert len(signed) == 2
+    clock.now += 2
+    storage.get_presigned_url('a.zwo')
+    assert len(signed) == 3
+    assert storage.url_cache.stats() == {'entries': 2, 'hits': 1, 'misses': 3, 'expired': 1, 'evictions': 0}
+
+
+def test_presigned_url_cache_evicts_least_recently_used(storage):
+    storage.url_cache = PresignedUrlCache(max_entries=2)
+    a = storage.get_presigned_url('a.zwo')
+    storage.get_presigned_url('b.zwo')
+    storage.get_presigned_url('a.zwo')
+    storage.get_presigned_url('c.zwo')
+    assert storage.url_cache.stats()['evictions'] == 1
+    assert storage.get_presigned_url('a.zwo') == a
+    assert storage.url_cache.stats()['hits'] == 2
+
+
+def test_deleting_an_object_drops_its_cached_url(storage):
+    storage.url_cache = PresignedUrlCache()
+    storage.upload_many([(b'x', 'a.zwo'), (b'y', 'b.zwo')])
+    storage.get_presigned_url('a.zwo')
+    storage.get_presigned_url('b.zwo')
+    storage.delete_many(['a.zwo'])
+    assert storage.url_cache.stats()['entries'] == 1
+
+
+def test_invalidation_looks_up_only_the_given_keys():
+    now = [0.0]
+    cache = PresignedUrlCache(max_entries=3, min_validity=0, clock=lambda: now[0])
+    for expiration in (60, 3600):
+        cache.get_or_sign('bucket', 'a.zwo', expiration, lambda: f'a-{expiration}')
+    cache.get_or_sign('other', 'a.zwo', 60, lambda: 'other-a')
+    cache.get_or_sign('bucket', 'b.zwo', 60, lambda: 'b')  # Evicts (bucket, a.zwo, 60)
+    now[0] = 100  # b.zwo's URL has expired
+    assert cache.get_or_sign('bucket', 'b.zwo', 60, lambda: 'b2') == 'b2'
+
+    # Iterating the entries would mean scanning the whole cache under the lock
+    cache._entries = IterationForbidden(cache._entries)
+    cache.invalidate('bucket', ['a.zwo', 'b.zwo', 'missing.zwo'])
+    assert dict(cache._entries) == {('other', 'a.zwo', 60): ('other-a', 60.0)}
+    assert cache._expirations == {('other', 'a.zwo'): {60}}
+
+
+class IterationForbidden(OrderedDict):
+    def __iter__(self):
+        raise AssertionError('invalidate scanned the cache')
+
+
+def test_download_cache_serves_revalidates_and_evicts(storage, tmp_path):
+    storage.download_cache = DownloadCache(str(tmp_path / 'cache'), max_bytes=2500, ttl=60)
+    storage.upload_many([(b'a' * 1000, 'a.zwo'), (b'b' * 1000, 'b.zwo'), (b'c' * 1000, 'c.zwo')])
+    gets = []
+    storage.s3.meta.events.register('before-call.s3.GetObject', lambda **kwargs: gets.append(1))
+    out = tmp_path / 'out.zwo'
+
+    assert storage.download_file('a.zwo', str(out)) and out.read_bytes() == b'a' * 1000
+    assert storage.download_file('a.zwo', str(out))
+    assert len(gets) == 1 and storage.download_cache.stats()['hits'] == 1
+
+    # Past the TTL an unchanged object is revalidated with a 304, not downloaded
+    storage.download_cache.ttl = 0
+    assert storage.download_file('a.zwo', str(out)) and out.read_bytes() == b'a' * 1000
+    assert len(gets) == 2 and storage.download_cache.stats()['revalidated'] == 1
+
+    # A changed object is fetched again
+    storage.s3.put_object(Bucket=storage.bucket, Key='a.zwo', Body=b'A' * 1000)
+    assert storage.download_file('a.zwo', str(out)) and out.read_bytes() == b'A' * 1000
+
+    storage.download_cache.ttl = 60
+    storage.download_file('b.zwo', str(out))
+    storage.download_file('c.zwo', str(out))
+    stats = storage.download_cache.stats()
+    assert stats['evictions'] >= 1 and stats['bytes'] <= 2500
+
+
+def test_download_cache_eviction_bounds_the_file_count(storage, tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache'), max_bytes=2500, ttl=60)
+    storage.download_cache = cache
+    storage.upload_many([(bytes([i]) * 1000, f'{i}.zwo') for i in range(20)])
+    out = tmp_path / 'out.zwo'
+    for i in range(20):
+        assert storage.download_file(f'{i}.zwo', str(out)) and out.read_bytes() == bytes([i]) * 1000
+    storage.download_cache.invalidate(storage.bucket, ['19.zwo'])
+    storage.download_file('0.zwo', str(out))
+
+    counts = {sub: len(os.listdir(tmp_path / 'cache' / sub)) for sub in ('blobs', 'keys', 'locks')}
+    assert counts['blobs'] <= 2
+    assert counts['keys'] <= counts['blobs'] and counts['locks'] <= counts['blobs']
+    # What survived still serves from disk
+    storage.download_file('0.zwo', str(out))
+    assert out.read_bytes() == bytes([0]) * 1000 and cache.stats()['hits'] >= 1
+
+
+def test_download_cache_serves_stale_while_revalidating(storage, tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache'), ttl=0, stale_while_revalidate=True)
+    storage.download_cache = cache
+    storage.upload_data(b'old', 'a.zwo')
+    out = tmp_path / 'out.zwo'
+    storage.download_file('a.zwo', str(out))
+    storage.s3.put_object(Bucket=storage.bucket, Key='a.zwo', Body=b'new')
+    assert storage.download_file('a.zwo', str(out)) and out.read_bytes() == b'old'
+    cache._executor.shutdown(wait=True)
+    assert cache.stats()['stale_served'] == 1
+    cache.stale_while_revalidate = False
+    cache.ttl = 60
+    assert storage.download_file('a.zwo', str(out)) and out.read_bytes() == b'new'
+
+
+def test_upload_many_reports_a_missing_bucket_per_item(storage, tmp_path):
+    path = tmp_path / 'a.zwo'
+    path.write_bytes(b'<workout_file>a</workout_file>')
+    storage.bucket = 'no-such-bucket'
+    results = storage.upload_many([(str(path), 'a.zwo'), (b'<w/>', 'b.zwo')])
+    assert [r['success'] for r in results] == [False, False]
+    assert all(r['error'] for r in results)
+    assert storage.upload_file(str(path), 'a.zwo') is None
+
+
+def test_download_cache_copies_a_blob_evicted_right_after_its_fill(storage, tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache'), ttl=60)
+    storage.download_cache = cache
+    storage.upload_data(b'x' * 1000, 'a.zwo')
+    fill = cache._fill
+
+    def fill_then_evict(*args):
+        # Another worker evicting every blob the moment the flock is released
+        source = fill(*args)
+        for entry in os.scandir(tmp_path / 'cache' / 'blobs'):
+            os.unlink(entry.path)
+        return source
+
+    cache._fill = fill_then_evict
+    out = tmp_path / 'out.zwo'
+    assert storage.download_file('a.zwo', str(out)) and out.read_bytes() == b'x' * 1000
+    assert storage.download_file('a.zwo', str(out)) and out.read_bytes() == b'x' * 1000
+    assert cache.stats()['misses'] == 2
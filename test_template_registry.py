@@ -0,0 +1,50 @@
+import os
+
+# Must be set before app (and config) are imported
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import app as web
+import workout_ir as ir
+from template_registry import TemplateRegistry, builtin_templates
+
+
+def workout(name):
+    return ir.Workout(name, f"{name} description", [ir.steady(600, 0.7)])
+
+
+def test_cards_follow_the_given_order_and_skip_non_cards():
+    registry = TemplateRegistry()
+    registry.register('a', lambda: workout('A'), card=True, title='Card A', summary='First', badges=['Z2'])
+    registry.register('hidden', lambda: workout('Hidden'))
+    registry.register('b', lambda: workout('B'), card=True)
+    assert registry.cards(['b', 'missing']) == [
+        {'key': 'b', 'title': 'b', 'summary': '', 'badges': [], 'name': 'B', 'description': 'B description'},
+        {'key': 'a', 'title': 'Card A', 'summary': 'First', 'badges': ['Z2'], 'name': 'A',
+         'description': 'A description'},
+    ]
+
+
+def test_index_renders_a_card_per_registered_card_template():
+    response = web.app.test_client().get('/')
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    cards = builtin_templates.cards(web.TEMPLATE_CARD_ORDER)
+    assert [card['key'] for card in cards] == ['gavin', 'bookend']
+    positions = []
+    for card in cards:
+        assert f"loadTemplate('{card['key']}')" in page
+        assert card['summary'] in page
+        assert all(f'>{badge}</span>' in page for badge in card['badges'])
+        positions.append(page.index(f">{card['title']}</h5>"))
+    assert positions == sorted(positions)
+    # Registered without card=True, so only reachable through /templates
+    assert "loadTemplate('30_30')" not in page
+
+
+def test_template_endpoint_serves_the_registry_bytes():
+    client = web.app.test_client()
+    keys = [entry['key'] for entry in client.get('/templates').get_json()]
+    assert keys == builtin_templates.keys()
+    for key in keys:
+        assert client.get(f'/templates/{key}').data == builtin_templates.render(key)
+    assert client.get('/templates/nope').status_code == 404
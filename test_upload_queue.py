@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+
+# Must be set before app (and config) are imported
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import app as web
+from config import Config
+from models import User, Workout, db
+from storage import Storage
+from upload_queue import UploadQueue
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        client = boto3.client('s3', region_name=Config.AWS_REGION)
+        client.create_bucket(Bucket=Config.AWS_BUCKET_NAME,
+                             CreateBucketConfiguration={'LocationConstraint': Config.AWS_REGION})
+        yield client
+
+
+@pytest.fixture
+def workout_id():
+    with web.app.app_context():
+        user = User(name='Coach', email='queue@example.com')
+        db.session.add(user)
+        db.session.flush()
+        workout = Workout(name='Threshold', description="-2x20' Z4", user_id=user.id)
+        db.session.add(workout)
+        db.session.commit()
+        yield workout.id
+        db.session.delete(workout)
+        db.session.delete(user)
+        db.session.commit()
+
+
+def test_generate_with_a_workout_id_records_the_s3_key(s3, workout_id, tmp_path, monkeypatch):
+    queue = UploadQueue(str(tmp_path / 'spool'), lambda: Storage(s3), workers=1,
+                        on_uploaded=web.record_s3_key).start()
+    monkeypatch.setattr(web, 'upload_queue', queue)
+    monkeypatch.setattr(web, 'PERSIST_TARGETS', {'disk', 's3'})
+    try:
+        client = web.app.test_client()
+        response = client.post('/generate', json={'name': 'Threshold', 'description': "-2x20' Z4",
+                                                  'workout_id': workout_id})
+        assert response.status_code == 200
+        assert client.post('/generate', json={'name': 'x', 'description': "-20' Z4",
+                                              'workout_id': 10 ** 6}).status_code == 404
+        deadline = time.monotonic() + 5
+        while queue.stats()['uploaded'] < 1 and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        queue.stop()
+    with web.app.app_context():
+        s3_key = db.session.get(Workout, workout_id).s3_key
+    assert s3_key and s3_key.startswith('Threshold_') and s3_key.endswith('.zwo')
+    assert s3.get_object(Bucket=Config.AWS_BUCKET_NAME, Key=s3_key)['Body'].read().startswith(b'<?xml')
+
+
+class FolderStorage:
+    """Stands in for Storage: "uploads" by copying into a directory."""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def upload_file(self, path, s3_key):
+        with open(path, 'rb') as src, open(os.path.join(self.bucket, s3_key), 'wb') as dst:
+            dst.write(src.read())
+        return s3_key
+
+
+def wait_for_uploads(queue, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while queue.stats()['uploaded'] < count and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return queue.stats()['uploaded']
+
+
+def test_entries_are_adopted_only_once_their_owner_is_gone(tmp_path):
+    spool, bucket = str(tmp_path / 'spool'), tmp_path / 'bucket'
+    bucket.mkdir()
+    owner = UploadQueue(spool, lambda: FolderStorage(str(bucket)))  # never started
+    owner.enqueue('a.zwo', b'<a/>')
+    alive = UploadQueue(spool, lambda: FolderStorage(str(bucket)), workers=1).start()
+    try:
+        assert alive.stats()['depth'] == 0 and not (bucket / 'a.zwo').exists()
+    finally:
+        alive.stop()
+    # The owner dies: its flock goes with it, whatever pid comes back after a restart
+    os.close(owner._owner_fd)
+    heir = UploadQueue(spool, lambda: FolderStorage(str(bucket)), workers=1).start()
+    try:
+        assert wait_for_uploads(heir, 1) == 1
+    finally:
+        heir.stop()
+    assert (bucket / 'a.zwo').read_bytes() == b'<a/>'
+    assert sorted(os.listdir(os.path.join(spool, 'owners'))) == sorted([alive.owner + '.lock', heir.owner + '.lock'])
+
+
+def test_forked_worker_uploads_what_it_enqueues(tmp_path):
+    # gunicorn --preload imports the app, and starts these threads, before forking its workers
+    bucket = tmp_path / 'bucket'
+    bucket.mkdir()
+    queue = UploadQueue(str(tmp_path / 'spool'), lambda: FolderStorage(str(bucket)), workers=1).start()
+    try:
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                names = {thread.name for thread in threading.enumerate()}
+                queue.enqueue('child.zwo', b'<child/>')
+                if {'upload-0', 'output-sweeper'} <= names and wait_for_uploads(queue, 1) == 1:
+                    status = 0
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+        assert (bucket / 'child.zwo').read_bytes() == b'<child/>'
+        # The parent's queue is untouched and still running
+        queue.enqueue('parent.zwo', b'<parent/>')
+        assert wait_for_uploads(queue, 1) == 1
+    finally:
+        queue.stop()
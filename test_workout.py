@@ -1,11 +1,37 @@
+import importlib.util
+import os
+
+from lxml import etree as ET
+
 from workout_generator import save_workout
 
-workout_description = """Z1-Z2 base with focus on efforts as follows:
+WORKOUT_DESCRIPTION = """Z1-Z2 base with focus on efforts as follows:
 
 -12' Z3 with 15" surge every 3'
 -4' Z6 (near max)
 -2x10' done as...
 30" max / 30" Z2-Z3"""
 
-filepath = save_workout("Mixed_Intervals", workout_description)
-print(f"Workout saved to: {filepath}") 
\ No newline at end of file
+
+def load_suite():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'suite.py')
+    spec = importlib.util.spec_from_file_location('benchmark_suite', path)
+    suite = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(suite)
+    return suite
+
+
+def test_save_workout_writes_to_the_given_directory(tmp_path):
+    filepath = save_workout("Mixed Intervals", WORKOUT_DESCRIPTION, output_dir=str(tmp_path / 'out'))
+    assert os.path.dirname(filepath) == str(tmp_path / 'out')
+    assert os.path.basename(filepath).startswith('Mixed_Intervals_')
+    root = ET.parse(filepath).getroot()
+    assert "-12' Z3 with 15\" surge every 3'" in root.findtext('description')
+    assert len(root.findall('workout/IntervalsT')) == 3
+
+
+def test_every_benchmark_case_runs(tmp_path):
+    # Keeps the corpus and the suite in step with the generators
+    suite = load_suite()
+    for name, op in suite.cases(str(tmp_path)):
+        op()
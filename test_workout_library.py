@@ -0,0 +1,169 @@
+import os
+from datetime import datetime, timedelta
+
+# Must be set before app (and config) are imported
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+import pytest
+from sqlalchemy import event
+
+import workout_ir as ir
+from app import app
+from models import User, Workout, db
+
+USERS = 3
+WORKOUTS_PER_USER = 12
+
+
+@pytest.fixture(scope='module')
+def client():
+    with app.app_context():
+        start = datetime(2025, 1, 1)
+        for user_id in range(1, USERS + 1):
+            db.session.add(User(id=user_id, name=f'Coach {user_id}', email=f'coach{user_id}@example.com'))
+        for i in range(USERS * WORKOUTS_PER_USER):
+            # Pairs share a timestamp so the id tiebreak is exercised
+            db.session.add(Workout(name=f'Workout {i}', description='Intervals', user_id=i % USERS + 1,
+                                   created_at=start + timedelta(minutes=i // 2),
+                                   template_category='intervals' if i % 2 else 'endurance'))
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def queries():
+    """Count SQL statements issued while the test runs."""
+    statements = []
+    with app.app_context():
+        engine = db.engine
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', count)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', count)
+
+
+def test_listing_query_count_does_not_grow_with_page_size(client, queries):
+    client.get('/library/workouts?limit=2')
+    small = len(queries)
+    queries.clear()
+    response = client.get('/library/workouts?limit=30')
+    assert len(response.json['workouts']) == 30
+    assert {workout['author'] for workout in response.json['workouts']} == {'Coach 1', 'Coach 2', 'Coach 3'}
+    assert len(queries) == small == 1
+
+
+def test_search_query_count_does_not_grow_with_page_size(client, queries):
+    response = client.get('/library/search?q=intervals&limit=30')
+    assert len(response.json['workouts']) == 30
+    assert len(queries) == 1
+
+
+def test_keyset_pages_cover_every_workout_once_newest_first(client):
+    seen, after = [], ''
+    while True:
+        page = client.get(f'/library/workouts?user_id=2&limit=5&after={after}').json
+        seen.extend(page['workouts'])
+        after = page['next_cursor']
+        if after is None:
+            break
+    assert len(seen) == WORKOUTS_PER_USER
+    assert {workout['author'] for workout in seen} == {'Coach 2'}
+    keys = [(workout['created_at'], workout['id']) for workout in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_unchanged_page_returns_304(client):
+    first = client.get('/library/workouts?category=intervals')
+    assert first.status_code == 200 and first.headers['ETag']
+    again = client.get('/library/workouts?category=intervals',
+                       headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+
+
+def test_invalid_cursor_is_rejected(client):
+    assert client.get('/library/workouts?after=nonsense').status_code == 400
+
+
+def test_like_fallback_matches_wildcards_literally(client, monkeypatch):
+    from workout_library import escape_like, search_workouts
+    assert escape_like('50%_a\\b') == '50\\%\\_a\\\\b'
+    with app.app_context():
+        # Other databases have no FTS index and search with ILIKE
+        monkeypatch.setattr(db.engine.dialect, 'name', 'postgresql')
+        assert len(search_workouts('workout 1', limit=100)[0]) == 13
+        assert search_workouts('Workout_1', limit=100)[0] == []
+
+
+class RecordingStorage:
+    def __init__(self, fail_keys=()):
+        self.fail_keys = set(fail_keys)
+        self.objects = {}
+
+    def upload_data(self, data, s3_key):
+        if s3_key in self.fail_keys:
+            return None
+        self.objects[s3_key] = data
+        return f'https://example.com/{s3_key}'
+
+    def delete_file(self, s3_key):
+        return self.objects.pop(s3_key, None) is not None
+
+
+def bulk_items(count):
+    return [{'workout': ir.Workout(f'Bulk {i}', 'Bulk', [ir.steady(600, 0.7)]),
+             'data': f'<w>{i}</w>'.encode(), 's3_key': f'bulk/{i}.zwo'} for i in range(count)]
+
+
+def test_bulk_save_returns_ids_in_input_order(client):
+    from workout_library import bulk_save
+    storage = RecordingStorage()
+    with app.app_context():
+        ids = bulk_save(bulk_items(5), user_id=1, storage=storage, batch_size=2)
+        names = {workout.id: workout.name for workout in Workout.query.filter(Workout.id.in_(ids))}
+        assert [names[workout_id] for workout_id in ids] == [f'Bulk {i}' for i in range(5)]
+        Workout.query.filter(Workout.id.in_(ids)).delete()
+        db.session.commit()
+    assert sorted(storage.objects) == [f'bulk/{i}.zwo' for i in range(5)]
+
+
+def test_bulk_save_failed_upload_saves_nothing(client):
+    from workout_library import BulkSaveError, bulk_save
+    storage = RecordingStorage(fail_keys=['bulk/3.zwo'])
+    with app.app_context():
+        before = Workout.query.count()
+        with pytest.raises(BulkSaveError) as error:
+            bulk_save(bulk_items(5), user_id=1, storage=storage)
+        assert error.value.failures == [{'index': 3, 's3_key': 'bulk/3.zwo', 'error': 'Upload failed'}]
+        assert Workout.query.count() == before
+    assert storage.objects == {}
+
+
+def test_bulk_save_failed_insert_rolls_back_earlier_batches(client, monkeypatch):
+    from workout_library import BulkSaveError, bulk_save
+    storage = RecordingStorage()
+    with app.app_context():
+        before = Workout.query.count()
+        scalars = db.session.scalars
+        calls = []
+
+        def fail_second_batch(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('disk full')
+            return scalars(*args, **kwargs)
+
+        monkeypatch.setattr(db.session, 'scalars', fail_second_batch)
+        with pytest.raises(BulkSaveError) as error:
+            bulk_save(bulk_items(5), user_id=1, storage=storage, batch_size=2)
+        monkeypatch.undo()
+        assert error.value.failures[0]['error_type'] == 'RuntimeError'
+        # The first batch was inserted before the failure and is gone too
+        assert len(calls) == 2 and Workout.query.count() == before
+        assert Workout.query.filter(Workout.name.like('Bulk %')).count() == 0
+    assert storage.objects == {}
@@ -0,0 +1,53 @@
+import os
+
+# Must be set before app (and config) are imported
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import pytest
+
+import app as web
+import workout_ir as ir
+import workout_metrics
+from bookend_workout import BOOKEND_DESCRIPTION, build_bookend_workout_ir
+from workout_metrics import batch_metrics, workout_metrics as single_metrics
+
+
+def test_chunked_batches_match_per_workout_metrics(monkeypatch):
+    workouts = [
+        build_bookend_workout_ir("Bookend", BOOKEND_DESCRIPTION),
+        [ir.warmup(600, 0.5, 0.75), ir.Repeat(5, [ir.steady(30, 1.2), ir.steady(30, 0.6)])],
+        [ir.steady(20, 0.9)],  # shorter than the NP window
+    ] * 3
+    expected = [single_metrics(workout, 250) for workout in workouts]
+    # Force a new chunk every workout or two
+    monkeypatch.setattr(workout_metrics, 'CHUNK_SECONDS', 4000)
+    assert batch_metrics(workouts, 250) == expected
+
+
+@pytest.mark.parametrize('ftp', ['NaN', 'Infinity', '"inf"', '0'])
+def test_metrics_endpoint_rejects_non_finite_ftp(ftp):
+    body = '{"ftp": %s, "workouts": [{"name": "T", "description": "-20\' Z4"}]}' % ftp
+    response = web.app.test_client().post('/workouts/metrics', data=body, content_type='application/json')
+    assert response.status_code == 400
+
+
+HUGE_SECTIONS = [
+    [{"type": "Warmup", "duration": 100000000, "power_low": 0.5, "power_high": 0.75}],
+    [{"type": "Intervals", "repeats": 10 ** 9, "on_duration": 30, "on_power": 1.2,
+      "off_duration": 30, "off_power": 0.5}],
+    [{"type": "Tempo", "repeats": 2, "duration": -60, "power": 0.85}],
+    # Each section is in range, the workout as a whole is not
+    [{"type": "Tempo", "repeats": 100, "duration": 3600, "power": 0.85}],
+]
+
+
+@pytest.mark.parametrize('sections', HUGE_SECTIONS)
+def test_out_of_range_sections_are_refused_before_expanding(sections):
+    item = {"name": "Huge", "sections": sections}
+    client = web.app.test_client()
+    response = client.post('/workouts/metrics', json={"ftp": 250, "workouts": [item]})
+    assert response.status_code == 400
+    response = client.post('/generate/batch', json=[item])
+    assert response.status_code == 400
+    response = client.post('/generate/roster', json=dict(item, athletes=[{"name": "A", "ftp": 250}]))
+    assert response.status_code == 400
@@ -0,0 +1,93 @@
+import os
+import time
+
+# Must be set before app (and config) are imported
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import pytest
+
+import app as web
+import workout_ir as ir
+from segment_compactor import power_timeline
+from workout_parser import MAX_DESCRIPTION_LENGTH, ParseError, parse_description
+
+COOLDOWN = ir.cooldown(600, 0.75, 0.50, 85)
+
+# What the regex parser this replaced produced for these lines (before the cooldown)
+BASELINE_FORMS = [
+    ("Z3 for 20 minutes", [ir.steady(1200, 0.83, 90)]),
+    ("tempo 45 min z3", [ir.steady(2700, 0.83, 90)]),
+    ("2x20", [ir.intervals(2, 1200, 1.0, 0, 0.65, 90)]),
+]
+
+
+@pytest.mark.parametrize('description, expected', BASELINE_FORMS)
+def test_leading_zone_and_word_forms_match_the_old_parser(description, expected):
+    workout = web.build_workout_ir('Test', description)
+    assert power_timeline(workout.segments) == power_timeline(expected + [COOLDOWN])
+
+
+def test_unitless_repeat_length_is_minutes_and_keeps_its_target():
+    # The old parser ignored the "@ 95%" and rode these at 100% FTP
+    workout = web.build_workout_ir('Test', "2x20 @ 95%")
+    assert power_timeline(workout.segments) == power_timeline([ir.steady(2400, 0.95, 90), COOLDOWN])
+
+
+# Efforts joined by filler words on one line, as coaches write them
+JOINED_FORMS = [
+    ("Warm up 10 min then 3x8 min at threshold with 4 min rest",
+     [ir.steady(600, 0.65, 90), ir.intervals(3, 480, 1.0, 240, 0.65, 90)]),
+    ("3 x 10 min z4 followed by 5 min easy", [ir.steady(1800, 0.98, 90), ir.steady(300, 0.65, 90)]),
+    # "with" only pairs a recovery; a surge is part of the effort it rides in
+    ('12 min Z3 with 15" surge every 3 min', [ir.steady(720, 0.83, 90)]),
+]
+
+
+@pytest.mark.parametrize('description, expected', JOINED_FORMS)
+def test_filler_words_between_efforts_are_accepted(description, expected):
+    workout = web.build_workout_ir('Test', description)
+    assert power_timeline(workout.segments) == power_timeline(expected + [COOLDOWN])
+
+
+@pytest.mark.parametrize('description', ["hello world", "Z1-Z2 base with focus on efforts as follows:", ""])
+def test_descriptions_without_efforts_are_rejected(description):
+    with pytest.raises(ParseError):
+        parse_description(description)
+    response = web.app.test_client().post('/generate', json={'name': 'Test', 'description': description or ' x'})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('description', ['9' * 400 + 'x 30"', '1' * 5000 + ' min z2', "10' @ " + '9' * 400 + 'w'])
+def test_huge_numbers_are_parse_errors_not_overflows(description):
+    with pytest.raises(ParseError):
+        parse_description(description)
+    response = web.app.test_client().post('/generate', json={'name': 'Test', 'description': description})
+    assert response.status_code == 400
+
+
+def parse_seconds(description):
+    start = time.perf_counter()
+    parse_description(description)
+    return time.perf_counter() - start
+
+
+def test_parsing_is_linear_in_repeated_words():
+    # Each "as" used to copy the rest of the line to look for a "done as..." trailer
+    small = min(parse_seconds("5 min " + "as " * 1000) for _ in range(3))
+    large = min(parse_seconds("5 min " + "as " * 16000) for _ in range(3))
+    assert large < small * 16 * 4
+
+
+def test_oversized_descriptions_are_rejected_before_tokenizing(monkeypatch):
+    description = "5 min z2\n" * (MAX_DESCRIPTION_LENGTH // 9 + 1)
+    monkeypatch.setattr('workout_parser.tokenize', lambda text: pytest.fail("tokenized"))
+    with pytest.raises(ParseError):
+        parse_description(description)
+    response = web.app.test_client().post('/generate', json={'name': 'Test', 'description': description})
+    assert response.status_code == 400
+
+
+def test_oversized_request_bodies_are_refused(monkeypatch):
+    monkeypatch.setitem(web.app.config, 'MAX_CONTENT_LENGTH', 1024)
+    response = web.app.test_client().post('/generate', json={'name': 'Test', 'description': "5 min z2 " * 200})
+    assert response.status_code == 413
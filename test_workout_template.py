@@ -0,0 +1,31 @@
+import math
+
+import pytest
+
+import workout_ir as ir
+from workout_template import compile_template, iter_roster, render_roster
+
+TEMPLATE = compile_template(ir.Workout('Threshold', '2 x 20 min', [ir.intervals(2, 1200, 0.95, 300, 0.55)]))
+
+
+@pytest.mark.parametrize('ftp', [math.inf, -math.inf, math.nan, 0, -250, True, '250'])
+def test_roster_rejects_bad_ftp_per_athlete(ftp):
+    results = list(iter_roster(TEMPLATE, [{'name': 'Bad', 'ftp': ftp, 'watts': True}, {'name': 'Good', 'ftp': 250}]))
+    assert results[0][2] is None and isinstance(results[0][3], ValueError)
+    assert results[1][2] is not None and results[1][3] is None
+    with pytest.raises(ValueError):
+        render_roster(TEMPLATE, [{'ftp': ftp}])
+
+
+@pytest.mark.parametrize('ftp', [math.inf, math.nan, 0])
+def test_render_rejects_non_finite_ftp(ftp):
+    with pytest.raises(ValueError):
+        TEMPLATE.render(ftp=ftp, watts=True)
+    with pytest.raises(ValueError):
+        TEMPLATE.targets_text(ftp)
+
+
+def test_render_in_watts():
+    data = TEMPLATE.render(ftp=249.6, watts=True)
+    assert b'<ftpOverride>250</ftpOverride>' in data
+    assert '2 x 20 min @ 237 W / 5 min @ 137 W'.encode('utf-8') in data
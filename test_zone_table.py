@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from zone_table import DEFAULT_ZONE_TABLE, ZoneTable
+
+BOUNDARY_CASES = [
+    (0.0, "Z1"), (0.55, "Z1"),
+    # The old per-zone range check fell back to Z1 for powers between two
+    # zones; gaps now round up to the next zone
+    (0.555, "Z2"), (0.56, "Z2"), (0.75, "Z2"),
+    (0.755, "Z3"), (0.90, "Z3"),
+    (0.905, "Z4"), (1.05, "Z4"),
+    (1.055, "Z5"), (1.20, "Z5"),
+    (1.2001, "Z6"), (3.0, "Z6"),
+]
+
+
+@pytest.mark.parametrize('power, zone', BOUNDARY_CASES)
+def test_classify_at_zone_boundaries(power, zone):
+    assert DEFAULT_ZONE_TABLE.classify(power) == zone
+
+
+def test_classify_array_matches_classify():
+    powers = np.array([power for power, _ in BOUNDARY_CASES] + list(np.linspace(0, 1.5, 1501)))
+    buckets = DEFAULT_ZONE_TABLE.classify_array(powers)
+    assert [DEFAULT_ZONE_TABLE.buckets[i] for i in buckets] == [DEFAULT_ZONE_TABLE.classify(p) for p in powers]
+
+
+def test_time_in_zone_counts_every_zone():
+    counts = DEFAULT_ZONE_TABLE.time_in_zone(np.array([0.5, 0.555, 0.8, 1.5, 1.5]))
+    assert counts == {"Z1": 1, "Z2": 1, "Z3": 1, "Z4": 0, "Z5": 0, "Z6": 2, "Z7": 0}
+
+
+def test_labels():
+    assert DEFAULT_ZONE_TABLE.label(0.555) == "Z2, RPE 2-3"
+    assert DEFAULT_ZONE_TABLE.label(1.5) == "Max Effort, RPE 9-10"
+
+
+def test_custom_tables_round_trip():
+    table = ZoneTable.from_dict({"zones": {"Easy": [0, 0.7], "Hard": [0.7, 1.0], "Sprint": "Max Effort"}})
+    assert [table.classify(p) for p in (0.7, 0.71, 1.0, 1.01)] == ["Easy", "Hard", "Hard", "Sprint"]
+    assert ZoneTable.from_dict(table.to_dict()).to_dict() == table.to_dict()
+
+
+@pytest.mark.parametrize('zones', [{"A": [0, 0.8], "B": [0.8, 0.7]}, {"Max": "Max Effort"}])
+def test_invalid_tables_are_rejected(zones):
+    with pytest.raises(ValueError):
+        ZoneTable.from_dict({"zones": zones})
@@ -0,0 +1,72 @@
+import pytest
+
+import workout_ir as ir
+import zwo_importer
+from segment_compactor import power_timeline
+from zwo_importer import import_many, import_zwo
+from zwo_writer import serialize
+
+SEGMENTS = [ir.warmup(600, 0.5, 0.75), ir.intervals(4, 30, 1.2, 30, 0.6, 95), ir.cooldown(300, 0.7, 0.5)]
+
+
+def write_zwo(path, workout_xml):
+    path.write_bytes(b'<workout_file><name>T</name><workout>' + workout_xml + b'</workout></workout_file>')
+    return str(path)
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / 'good.zwo'
+    path.write_bytes(serialize(ir.Workout('Good', 'desc', SEGMENTS, tags=['one'])))
+    workout = import_zwo(str(path))
+    assert workout.name == 'Good' and workout.tags == ['one']
+    assert power_timeline(workout.segments) == power_timeline(SEGMENTS)
+
+
+def test_tag_name_attribute_is_read(tmp_path):
+    path = tmp_path / 'tags.zwo'
+    path.write_bytes(b'<workout_file><tags><tag name="INTERVALS"/><tag>old style</tag></tags>'
+                     b'<workout><SteadyState Duration="60" Power="0.8"/></workout></workout_file>')
+    assert import_zwo(str(path)).tags == ['INTERVALS', 'old style']
+
+
+@pytest.mark.parametrize('block', [
+    b'<Ramp Duration="0" PowerLow="0.5" PowerHigh="0.8"/>',
+    b'<SteadyState Duration="-60" Power="0.8"/>',
+    b'<IntervalsT Repeat="3" OnDuration="0" OffDuration="30" OnPower="1.2" OffPower="0.5"/>',
+    b'<IntervalsT Repeat="-1" OnDuration="30" OffDuration="30" OnPower="1.2" OffPower="0.5"/>',
+])
+def test_non_positive_durations_are_value_errors(tmp_path, block):
+    path = write_zwo(tmp_path / 'bad.zwo', b'<Ramp Duration="60" PowerLow="0.5" PowerHigh="0.8"/>' + block)
+    with pytest.raises(ValueError):
+        import_zwo(path)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_bad_file_inside_a_good_batch(tmp_path, workers):
+    good = tmp_path / 'good.zwo'
+    good.write_bytes(serialize(ir.Workout('Good', 'desc', SEGMENTS)))
+    zero = write_zwo(tmp_path / 'zero.zwo', b'<Ramp Duration="0" PowerLow="0.5" PowerHigh="0.8"/>')
+    broken = tmp_path / 'broken.zwo'
+    broken.write_bytes(b'<workout_file><workout>')
+    paths = [str(good), zero, str(broken), str(good)]
+
+    results = list(import_many(paths, workers=workers, chunk_size=2))
+    assert [path for path, _, _ in results] == paths
+    assert [error is None for _, _, error in results] == [True, False, False, True]
+    assert results[1][2]['error_type'] == 'ValueError'
+
+
+def test_unexpected_exceptions_are_recorded_per_file(tmp_path, monkeypatch):
+    real_import = zwo_importer.import_zwo
+
+    def flaky_import(path, compact=True):
+        if path.endswith('flaky.zwo'):
+            raise RuntimeError('boom')
+        return real_import(path, compact)
+
+    monkeypatch.setattr(zwo_importer, 'import_zwo', flaky_import)
+    good = tmp_path / 'good.zwo'
+    good.write_bytes(serialize(ir.Workout('Good', 'desc', SEGMENTS)))
+    results = list(import_many([str(tmp_path / 'flaky.zwo'), str(good)]))
+    assert results[0][2] == {'path': str(tmp_path / 'flaky.zwo'), 'error': 'boom', 'error_type': 'RuntimeError'}
+    assert results[1][2] is None
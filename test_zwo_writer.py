@@ -0,0 +1,56 @@
+import pytest
+from lxml import etree as ET
+
+import workout_ir as ir
+import zwo_writer
+from zwo_writer import cdata, serialize
+
+SEGMENTS = [ir.warmup(600, 0.5, 0.75), ir.intervals(3, 30, 1.2, 30, 0.6, 95)]
+
+
+def parse(data):
+    return ET.fromstring(data)
+
+
+def test_text_fields_are_escaped():
+    workout = ir.Workout('Over & <Under>', 'd', SEGMENTS, author='A "B" & C', tags=['<z4>', 'a&b'])
+    root = parse(serialize(workout))
+    assert root.findtext('name') == 'Over & <Under>'
+    assert root.findtext('author') == 'A "B" & C'
+    assert [tag.text for tag in root.iter('tag')] == ['<z4>', 'a&b']
+
+
+@pytest.mark.parametrize('description', [
+    ']]>', 'a ]]> b', ']]>]]>', 'ends with ]]', '<![CDATA[nested]]>', '& < > "plain"'])
+@pytest.mark.parametrize('use_cdata', [True, False])
+def test_any_description_round_trips(description, use_cdata):
+    data = serialize(ir.Workout('T', description, SEGMENTS), use_cdata=use_cdata)
+    assert parse(data).findtext('description') == description
+
+
+def test_cdata_splits_the_terminator_across_sections():
+    assert cdata('a]]>b') == '<![CDATA[a]]]]><![CDATA[>b]]>'
+    assert cdata('plain') == '<![CDATA[plain]]>'
+
+
+@pytest.mark.parametrize('text', ['bell\x07', 'nul\x00', 'bad\ufffe'])
+def test_characters_xml_cannot_hold_are_rejected(text):
+    with pytest.raises(ValueError):
+        serialize(ir.Workout('T', text, SEGMENTS))
+    with pytest.raises(ValueError):
+        serialize(ir.Workout(text, 'd', SEGMENTS))
+
+
+def test_attributes_are_escaped_only_when_needed():
+    assert zwo_writer._attributes({'Duration': '60', 'Power': '0.75'}) == ' Duration="60" Power="0.75"'
+    special = zwo_writer._attributes({'A': 'x"y', 'B': 'a&b\n<c>'})
+    assert special == ' A="x&quot;y" B="a&amp;b&#10;&lt;c&gt;"'
+    assert dict(parse(f'<e{special} />'.encode()).attrib) == {'A': 'x"y', 'B': 'a&b\n<c>'}
+
+
+def test_output_matches_the_element_tree():
+    workout = ir.Workout('Name & more', 'desc ]]> end', SEGMENTS, tags=['t'])
+    element = ir.to_element(workout, ET)
+    written = parse(serialize(workout))
+    assert [(e.tag, dict(e.attrib), (e.text or '').strip()) for e in written.iter()] == \
+        [(e.tag, dict(e.attrib), (e.text or '').strip()) for e in element.iter()]
@@ -0,0 +1,279 @@
+"""Write-behind queue that uploads generated workouts to S3 off the request path.
+
+``enqueue`` writes the workout bytes into a spool directory and returns
+straight away; a small pool of worker threads uploads each spooled file
+with ``Storage.upload_file``, retrying with capped exponential backoff and
+jitter, and deletes it once S3 has it. An entry is a ``<id>.zwo`` data file
+plus a ``<id>.<owner>.json`` record naming the queue that owns it; both are
+written atomically, so a crash leaves either a complete entry or nothing.
+
+Each queue picks a random owner token and holds an flock on
+``owners/<owner>.lock`` for as long as its process lives. Pids are not
+used, since a restarted container hands the same small pids out again.
+On start the queue adopts any entry whose owner's lock is free - the
+leftovers of a restart - so pending uploads survive as long as the spool
+directory does. That is only a restart of the process on the same disk:
+an ephemeral filesystem such as a Heroku dyno's /tmp loses the spool, and
+its pending uploads, with the dyno. Entries that run out of attempts move
+to ``failed/``.
+"""
+import fcntl
+import heapq
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+
+logger = logging.getLogger(__name__)
+
+
+class UploadEntry:
+    __slots__ = ('id', 'filename', 's3_key', 'workout_id', 'attempts', 'enqueued_at')
+
+    def __init__(self, id, filename, s3_key, workout_id=None, attempts=0, enqueued_at=None):
+        self.id = id
+        self.filename = filename
+        self.s3_key = s3_key
+        self.workout_id = workout_id
+        self.attempts = attempts
+        self.enqueued_at = time.time() if enqueued_at is None else enqueued_at
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _lock_owner(path, blocking=True):
+    """Open and flock ``path``; the fd, or None if another process holds it or it is gone."""
+    try:
+        fd = os.open(path, os.O_RDWR | (os.O_CREAT if blocking else 0), 0o600)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class UploadQueue:
+    def __init__(self, spool_dir, storage_factory, workers=2, max_attempts=8,
+                 base_delay=1.0, max_delay=300.0, on_uploaded=None):
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, 'failed')
+        self.storage_factory = storage_factory
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_uploaded = on_uploaded
+        self.owners_dir = os.path.join(spool_dir, 'owners')
+        os.makedirs(self.failed_dir, exist_ok=True)
+        os.makedirs(self.owners_dir, exist_ok=True)
+        self._claim_owner()
+
+        self._heap = []  # (due, sequence, entry)
+        self._sequence = 0
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._fork_hook = False
+        self.uploaded = self.failed = self.retries = 0
+        self.last_lag = None
+
+    def _data_path(self, entry):
+        return os.path.join(self.spool_dir, f"{entry.id}.zwo")
+
+    def _record_path(self, entry_id, owner=None):
+        return os.path.join(self.spool_dir, f"{entry_id}.{owner or self.owner}.json")
+
+    def _owner_path(self, owner):
+        return os.path.join(self.owners_dir, f"{owner}.lock")
+
+    def _claim_owner(self):
+        self.owner = uuid.uuid4().hex
+        self._owner_fd = _lock_owner(self._owner_path(self.owner))
+
+    def start(self):
+        """Adopt orphaned entries from earlier processes and start the workers."""
+        for entry in self._recover():
+            self._push(entry, time.monotonic())
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'upload-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if not self._fork_hook:
+            self._fork_hook = True
+            queue = weakref.ref(self)
+
+            def after_fork():
+                if queue() is not None:
+                    queue()._after_fork()
+            os.register_at_fork(after_in_child=after_fork)
+        return self
+
+    def _after_fork(self):
+        """Threads don't survive fork: give the child its own owner token, queue and workers.
+
+        Entries queued before the fork stay with the parent, which still
+        holds their owner lock and keeps uploading them.
+        """
+        os.close(self._owner_fd)
+        self._claim_owner()
+        self._heap = []
+        self._sequence = self._in_flight = 0
+        self._cond = threading.Condition()
+        self.uploaded = self.failed = self.retries = 0
+        self.last_lag = None
+        running = bool(self._threads) and not self._stopping
+        self._threads = []
+        if running:
+            self.start()
+
+    def stop(self, timeout=None):
+        """Stop the workers; anything not yet uploaded stays in the spool."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, filename, data, s3_key=None, workout_id=None):
+        """Spool ``data`` for upload as ``s3_key`` (default ``filename``) and return its entry."""
+        entry = UploadEntry(uuid.uuid4().hex, filename, s3_key or filename, workout_id)
+        _write_atomic(self._data_path(entry), data)
+        # The record goes last: it is what makes the entry exist
+        _write_atomic(self._record_path(entry.id), json.dumps(entry.to_dict()).encode('utf-8'))
+        self._push(entry, time.monotonic())
+        return entry
+
+    def _recover(self):
+        records = {}
+        for name in sorted(os.listdir(self.spool_dir)):
+            parts = name.split('.')
+            if len(parts) == 3 and parts[2] == 'json' and parts[1] != self.owner:
+                records.setdefault(parts[1], []).append(parts[0])
+        entries = []
+        for owner, entry_ids in records.items():
+            # Held for as long as the owner lives; missing once a previous recovery cleaned up
+            fd = _lock_owner(self._owner_path(owner), blocking=False)
+            if fd is None and os.path.exists(self._owner_path(owner)):
+                continue
+            try:
+                for entry_id in entry_ids:
+                    try:
+                        # Claim it; if another process got there first the rename fails
+                        os.rename(self._record_path(entry_id, owner), self._record_path(entry_id))
+                        with open(self._record_path(entry_id), 'rb') as f:
+                            entries.append(UploadEntry(**json.load(f)))
+                    except FileNotFoundError:
+                        continue  # Another process adopted it first
+                    except (OSError, ValueError, TypeError) as e:
+                        logger.warning(f"Skipping spool entry {entry_id}.{owner}: {e}")
+            finally:
+                if fd is not None:
+                    os.unlink(self._owner_path(owner))
+                    os.close(fd)
+        if entries:
+            logger.info(f"Recovered {len(entries)} pending uploads from {self.spool_dir}")
+        return entries
+
+    def _push(self, entry, due):
+        with self._cond:
+            self._sequence += 1
+            heapq.heappush(self._heap, (due, self._sequence, entry))
+            self._cond.notify()
+
+    def _next(self):
+        with self._cond:
+            while not self._stopping:
+                if self._heap:
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        self._in_flight += 1
+                        return heapq.heappop(self._heap)[2]
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            return None
+
+    def _run(self):
+        storage = self.storage_factory()
+        while True:
+            entry = self._next()
+            if entry is None:
+                return
+            try:
+                self._process(storage, entry)
+            except Exception:
+                logger.exception(f"Upload worker error for {entry.filename}")
+                self._retry(entry)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+
+    def _process(self, storage, entry):
+        if storage.upload_file(self._data_path(entry), entry.s3_key) is None:
+            self._retry(entry)
+            return
+        if self.on_uploaded is not None:
+            self.on_uploaded(entry)
+        for path in (self._record_path(entry.id), self._data_path(entry)):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        with self._cond:
+            self.uploaded += 1
+            self.last_lag = time.time() - entry.enqueued_at
+
+    def _retry(self, entry):
+        entry.attempts += 1
+        if entry.attempts >= self.max_attempts:
+            logger.error(f"Giving up on uploading {entry.filename} after {entry.attempts} attempts")
+            for source, suffix in ((self._data_path(entry), 'zwo'), (self._record_path(entry.id), 'json')):
+                try:
+                    os.replace(source, os.path.join(self.failed_dir, f"{entry.id}.{suffix}"))
+                except OSError as e:
+                    logger.error(f"Could not move {source} to {self.failed_dir}: {e}")
+            with self._cond:
+                self.failed += 1
+            return
+        _write_atomic(self._record_path(entry.id), json.dumps(entry.to_dict()).encode('utf-8'))
+        delay = min(self.max_delay, self.base_delay * 2 ** (entry.attempts - 1))
+        delay *= random.uniform(0.5, 1.0)
+        with self._cond:
+            self.retries += 1
+        self._push(entry, time.monotonic() + delay)
+
+    def stats(self):
+        """Queue depth, in-flight uploads and lag (seconds the oldest pending entry has waited)."""
+        with self._cond:
+            oldest = min((entry.enqueued_at for _, _, entry in self._heap), default=None)
+            return {
+                'depth': len(self._heap),
+                'in_flight': self._in_flight,
+                'lag_seconds': round(time.time() - oldest, 3) if oldest is not None else 0.0,
+                'last_upload_lag_seconds': round(self.last_lag, 3) if self.last_lag is not None else None,
+                'uploaded': self.uploaded,
+                'retries': self.retries,
+                'failed': self.failed,
+            }
@@ -2,6 +2,9 @@ import os
 from datetime import datetime
 import re
 from lxml import etree as ET
+import workout_ir as ir
+from zone_table import DEFAULT_ZONE_TABLE
+from template_registry import builtin_templates
 
 def format_workout_description(workout_name, description):
     """Format the workout description with pre-activity instructions and structure."""
@@ -22,36 +25,43 @@ def format_workout_description(workout_name, description):
 - Focus on smooth transitions between power targets
 - Use recovery periods effectively to prepare for next effort"""
 
-def save_workout(workout_name, description):
-    """Save the workout to a file."""
-    xml_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<workout_file>
-    <author>Gravel God Cycling</author>
-    <description><![CDATA[{format_workout_description(workout_name, description)}]]></description>
-    <sportType>bike</sportType>
-    <tags/>
-    <workout>
-        <Warmup Duration="600" PowerLow="0.5" PowerHigh="0.65" Cadence="85"/>
-        <SteadyState Duration="600" Power="0.80" Cadence="95"/>
-        <SteadyState Duration="180" Power="0.65" Cadence="85"/>
-        <IntervalsT Repeat="10" OnDuration="30" OffDuration="30" OnPower="1.2" OffPower="0.75" Cadence="90"/>
-        <SteadyState Duration="300" Power="0.65" Cadence="85"/>
-        <IntervalsT Repeat="10" OnDuration="30" OffDuration="30" OnPower="1.2" OffPower="0.75" Cadence="90"/>
-        <SteadyState Duration="300" Power="0.65" Cadence="85"/>
-        <IntervalsT Repeat="10" OnDuration="30" OffDuration="30" OnPower="1.2" OffPower="0.75" Cadence="90"/>
-        <Cooldown Duration="600" PowerLow="0.65" PowerHigh="0.5" Cadence="85"/>
-    </workout>
-</workout_file>'''
+def high_intensity_segments(zone_table=None):
+    """Segments for the high intensity 30/30 workout."""
+    zone_table = zone_table or DEFAULT_ZONE_TABLE
+    z1, z2, max_power = zone_table.target(1), zone_table.target(2), zone_table.max_power
+    return [
+        ir.warmup(600, z1, z2, 85),
+        ir.steady(600, 0.80, 95),
+        ir.steady(180, z2, 85),
+        ir.intervals(10, 30, max_power, 30, 0.75, 90),
+        ir.steady(300, z2, 85),
+        ir.intervals(10, 30, max_power, 30, 0.75, 90),
+        ir.steady(300, z2, 85),
+        ir.intervals(10, 30, max_power, 30, 0.75, 90),
+        ir.cooldown(600, z2, z1, 85),
+    ]
+
+def high_intensity_workout():
+    return ir.Workout(None, format_workout_description("High Intensity Intervals", ""),
+                      high_intensity_segments())
+
+builtin_templates.register('high_intensity', high_intensity_workout)
+
+def save_workout(workout_name, description, output_dir=None):
+    """Save the workout to a file in ``output_dir`` (default ~/Downloads) and return its path."""
+    xml_content = builtin_templates.render(
+        'high_intensity', description=format_workout_description(workout_name, description))
     
     # Generate filename with timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"{workout_name.replace(' ', '_')}_{timestamp}.zwo"
     
-    # Save to Downloads folder
-    downloads_dir = os.path.expanduser("~/Downloads")
-    filepath = os.path.join(downloads_dir, filename)
+    # Save to the Downloads folder unless told otherwise
+    output_dir = output_dir or os.path.expanduser("~/Downloads")
+    os.makedirs(output_dir, exist_ok=True)
+    filepath = os.path.join(output_dir, filename)
     
-    with open(filepath, 'w') as f:
+    with open(filepath, 'wb') as f:
         f.write(xml_content)
     
     return filepath
@@ -2,25 +2,17 @@ import os
 from datetime import datetime
 import re
 from lxml import etree as ET
+from zone_table import DEFAULT_ZONE_TABLE
 
-def parse_power_zone(text):
+def parse_power_zone(text, zone_table=DEFAULT_ZONE_TABLE):
     """Convert zone notation to FTP percentages."""
     text = text.lower()
     if 'max' in text:
-        return 1.2  # 120% FTP
-    if 'z1' in text:
-        return 0.5  # 50% FTP
-    elif 'z2' in text:
-        return 0.65  # 65% FTP
-    elif 'z3' in text:
-        return 0.83  # 83% FTP
-    elif 'z4' in text:
-        return 0.98  # 98% FTP
-    elif 'z5' in text:
-        return 1.13  # 113% FTP
-    elif 'z6' in text:
-        return 1.2  # 120% FTP
-    return 0.65  # Default to Z2
+        return zone_table.max_power
+    for zone in range(1, 7):
+        if f'z{zone}' in text:
+            return zone_table.target(zone)
+    return zone_table.target(2)  # Default to Z2
 
 def parse_duration(text):
     """Convert duration notation (e.g., '30"' or '5'') to seconds."""
@@ -0,0 +1,231 @@
+"""Compact intermediate representation shared by every workout generator.
+
+Generators build a :class:`Workout` holding a flat list of nodes:
+
+* :class:`Segment` - one SteadyState, Warmup, Cooldown, Ramp or FreeRide
+  block, with numeric fields instead of string attributes;
+* :class:`Repeat` - ``count`` repetitions of a list of nodes. A repeat of
+  two steady segments serializes as a single IntervalsT; anything else is
+  expanded on output.
+
+Both classes use ``__slots__``, so a multi-hour workout costs a handful of
+small objects rather than a dict and an Element per block. Serializers
+(``to_element`` here, the streaming writer, metrics and importers) all
+consume this one structure.
+"""
+import xml.etree.ElementTree as StdET
+
+STEADY = 'SteadyState'
+WARMUP = 'Warmup'
+COOLDOWN = 'Cooldown'
+RAMP = 'Ramp'
+FREERIDE = 'FreeRide'
+RAMP_KINDS = (WARMUP, COOLDOWN, RAMP)
+
+DEFAULT_AUTHOR = "Gravel God Cycling"
+
+
+class Segment:
+    """A single block. Ramps go from ``power_low`` to ``power_high``;
+    steady segments with different low/high powers are target ranges."""
+    __slots__ = ('kind', 'duration', 'power_low', 'power_high', 'cadence')
+
+    def __init__(self, kind, duration, power_low=None, power_high=None, cadence=None):
+        self.kind = kind
+        self.duration = int(duration)
+        self.power_low = power_low
+        self.power_high = power_low if power_high is None else power_high
+        self.cadence = cadence
+
+    def key(self):
+        """Everything but the duration."""
+        return (self.kind, self.power_low, self.power_high, self.cadence)
+
+    def __eq__(self, other):
+        return isinstance(other, Segment) and self.duration == other.duration and self.key() == other.key()
+
+    def __repr__(self):
+        return (f"Segment({self.kind!r}, {self.duration}, {self.power_low!r}, "
+                f"{self.power_high!r}, {self.cadence!r})")
+
+
+class Repeat:
+    """``count`` back-to-back repetitions of ``body``."""
+    __slots__ = ('count', 'body')
+
+    def __init__(self, count, body):
+        self.count = int(count)
+        self.body = list(body)
+
+    def __eq__(self, other):
+        return isinstance(other, Repeat) and self.count == other.count and self.body == other.body
+
+    def __repr__(self):
+        return f"Repeat({self.count}, {self.body!r})"
+
+
+class Workout:
+    __slots__ = ('name', 'description', 'author', 'sport_type', 'tags', 'segments')
+
+    def __init__(self, name=None, description='', segments=None, author=DEFAULT_AUTHOR,
+                 sport_type='bike', tags=None):
+        self.name = name
+        self.description = description
+        self.author = author
+        self.sport_type = sport_type
+        self.tags = list(tags or [])
+        self.segments = segments if segments is not None else []
+
+
+def steady(duration, power, cadence=None):
+    return Segment(STEADY, duration, power, power, cadence)
+
+
+def steady_range(duration, power_low, power_high, cadence=None):
+    return Segment(STEADY, duration, power_low, power_high, cadence)
+
+
+def warmup(duration, power_low, power_high, cadence=None):
+    return Segment(WARMUP, duration, power_low, power_high, cadence)
+
+
+def cooldown(duration, power_low, power_high, cadence=None):
+    return Segment(COOLDOWN, duration, power_low, power_high, cadence)
+
+
+def ramp(duration, power_low, power_high, cadence=None):
+    return Segment(RAMP, duration, power_low, power_high, cadence)
+
+
+def intervals(repeat, on_duration, on_power, off_duration, off_power, cadence=None, cadence_resting=None):
+    """On/off repetition, i.e. what ZWO calls IntervalsT."""
+    if cadence_resting is None:
+        cadence_resting = cadence
+    return Repeat(repeat, [steady(on_duration, on_power, cadence),
+                           steady(off_duration, off_power, cadence_resting)])
+
+
+def node_duration(node):
+    if isinstance(node, Repeat):
+        return node.count * sum(node_duration(child) for child in node.body)
+    return node.duration
+
+
+def total_duration(segments):
+    return sum(node_duration(node) for node in segments)
+
+
+def iter_segments(segments):
+    """Yield the flat sequence of segments, expanding repeats lazily."""
+    for node in segments:
+        if isinstance(node, Repeat):
+            for _ in range(node.count):
+                yield from iter_segments(node.body)
+        else:
+            yield node
+
+
+def expand(segments):
+    """Fully expanded copy: one segment per block, no repeats."""
+    return [Segment(s.kind, s.duration, s.power_low, s.power_high, s.cadence)
+            for s in iter_segments(segments)]
+
+
+def format_power(power):
+    """Shortest stable text for a power fraction: 0.5, 0.65, 1.0."""
+    text = f"{power:.4f}".rstrip('0')
+    return text + '0' if text.endswith('.') else text
+
+
+def interval_pair(node):
+    """Return (on, off) if a repeat can be written as one IntervalsT, else None."""
+    if not isinstance(node, Repeat) or len(node.body) != 2:
+        return None
+    on, off = node.body
+    if not isinstance(on, Segment) or not isinstance(off, Segment):
+        return None
+    if on.kind != STEADY or off.kind != STEADY:
+        return None
+    # IntervalsT applies Cadence to both halves unless CadenceResting is set,
+    # so a cadence on only one half can't be expressed
+    if (on.cadence is None) != (off.cadence is None):
+        return None
+    return on, off
+
+
+def segment_attributes(segment):
+    """Ordered ZWO attributes for a single segment."""
+    attrib = {'Duration': str(segment.duration)}
+    if segment.kind == FREERIDE or segment.power_low is None:
+        pass
+    elif segment.kind == STEADY and segment.power_low == segment.power_high:
+        attrib['Power'] = format_power(segment.power_low)
+    else:
+        attrib['PowerLow'] = format_power(segment.power_low)
+        attrib['PowerHigh'] = format_power(segment.power_high)
+    if segment.cadence is not None:
+        attrib['Cadence'] = str(segment.cadence)
+    return attrib
+
+
+def interval_attributes(count, on, off):
+    """Ordered ZWO attributes for an IntervalsT element."""
+    attrib = {
+        'Repeat': str(count),
+        'OnDuration': str(on.duration),
+        'OffDuration': str(off.duration),
+    }
+    for prefix, segment in (('On', on), ('Off', off)):
+        if segment.power_low == segment.power_high:
+            attrib[f'{prefix}Power'] = format_power(segment.power_low)
+        else:
+            attrib[f'{prefix}PowerLow'] = format_power(segment.power_low)
+            attrib[f'{prefix}PowerHigh'] = format_power(segment.power_high)
+    if on.cadence is not None:
+        attrib['Cadence'] = str(on.cadence)
+        if off.cadence is not None and off.cadence != on.cadence:
+            attrib['CadenceResting'] = str(off.cadence)
+    return attrib
+
+
+def iter_elements(segments):
+    """Yield ``(tag, attributes)`` for each element of the <workout> block."""
+    for node in segments:
+        if isinstance(node, Repeat):
+            pair = interval_pair(node)
+            if pair is not None:
+                yield 'IntervalsT', interval_attributes(node.count, *pair)
+            else:
+                for _ in range(node.count):
+                    yield from iter_elements(node.body)
+        else:
+            yield node.kind, segment_attributes(node)
+
+
+def append_segments(workout_section, segments):
+    """Append elements for IR segments to an existing <workout> element."""
+    for tag, attrib in iter_elements(segments):
+        workout_section.append(workout_section.makeelement(tag, attrib))
+    return workout_section
+
+
+def to_element(workout, etree=StdET, cdata=False):
+    """Build a workout_file element with ``etree`` (xml.etree or lxml.etree).
+
+    ``cdata=True`` wraps the description in CDATA, which only lxml supports;
+    a description containing ``]]>`` can't be a single CDATA section and is
+    escaped as plain text instead.
+    """
+    root = etree.Element("workout_file")
+    etree.SubElement(root, "author").text = workout.author
+    if workout.name is not None:
+        etree.SubElement(root, "name").text = workout.name
+    description = etree.SubElement(root, "description")
+    use_cdata = cdata and ']]>' not in workout.description
+    description.text = etree.CDATA(workout.description) if use_cdata else workout.description
+    etree.SubElement(root, "sportType").text = workout.sport_type
+    tags = etree.SubElement(root, "tags")
+    for text in workout.tags:
+        etree.SubElement(tags, "tag").text = text
+    append_segments(etree.SubElement(root, "workout"), workout.segments)
+    return root
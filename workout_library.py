@@ -0,0 +1,278 @@
+"""Searchable workout library on top of ``models.Workout``.
+
+Each saved workout carries summary columns computed once from its IR by
+:func:`summarize` - total duration, peak target power and time at Z5 or
+above - so the structured filters are plain indexed comparisons. Text
+search over name and description uses an SQLite FTS5 index kept in sync
+with the workout table by triggers (other databases fall back to LIKE).
+Results are newest first and paginated by keyset on the id: a page ends
+with a cursor, and the next page is everything older than it, so deep
+pages cost the same as the first.
+
+:func:`list_workouts` is the plain listing (by user, category or
+template flag), keyset-paginated on ``(created_at, id)`` to match the
+composite indexes on the model. Both load each workout's author in the
+same query, so serializing a page never goes back to the database.
+
+:func:`bulk_save` persists a whole batch at once: S3 uploads run on a
+thread pool, then every row is inserted in one transaction with batched
+executemany INSERTs. Either the whole batch lands or none of it does.
+"""
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import column, insert, inspect, or_, select, table, text, tuple_
+from sqlalchemy.orm import joinedload
+
+import workout_ir as ir
+from models import Workout, db
+from workout_metrics import power_series
+from zone_table import DEFAULT_ZONE_TABLE, ZoneTable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Rows per executemany INSERT and concurrent S3 uploads in bulk_save
+BULK_BATCH_SIZE = 500
+UPLOAD_WORKERS = 8
+
+SUMMARY_COLUMNS = {'duration': 'INTEGER', 'max_power': 'FLOAT', 'z5_seconds': 'INTEGER'}
+
+_FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS workout_fts USING fts5("
+    "name, description, content='workout', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS workout_fts_insert AFTER INSERT ON workout BEGIN "
+    "INSERT INTO workout_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS workout_fts_delete AFTER DELETE ON workout BEGIN "
+    "INSERT INTO workout_fts(workout_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS workout_fts_update AFTER UPDATE OF name, description ON workout BEGIN "
+    "INSERT INTO workout_fts(workout_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO workout_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+]
+_fts = table('workout_fts', column('rowid'))
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def summarize(workout: ir.Workout, zone_table: Optional[ZoneTable] = None) -> Dict:
+    """Summary column values for a workout IR."""
+    zone_table = zone_table or DEFAULT_ZONE_TABLE
+    series = power_series(workout.segments)
+    z5 = zone_table.buckets.index('Z5')
+    return {
+        'duration': int(len(series)),
+        'max_power': round(_max_power(workout.segments), 3),
+        'z5_seconds': int(np.count_nonzero(zone_table.classify_array(series) >= z5)),
+    }
+
+
+def _max_power(segments) -> float:
+    peak = 0.0
+    for node in segments:
+        if isinstance(node, ir.Repeat):
+            peak = max(peak, _max_power(node.body))
+        elif node.kind != ir.FREERIDE and node.power_low is not None:
+            peak = max(peak, node.power_low, node.power_high)
+    return peak
+
+
+def library_entry(workout: ir.Workout, user_id: int, category: Optional[str] = None,
+                  is_template: bool = False, zone_table: Optional[ZoneTable] = None, **fields) -> Workout:
+    """A ``models.Workout`` row for a workout IR, with its summary filled in."""
+    return Workout(name=workout.name or '', description=workout.description, user_id=user_id,
+                   template_category=category, is_template=is_template,
+                   **summarize(workout, zone_table), **fields)
+
+
+def _entry_row(item: Dict, user_id: int, zone_table: Optional[ZoneTable]) -> Dict:
+    workout = item['workout']
+    return {
+        'name': workout.name or '',
+        'description': workout.description,
+        'user_id': user_id,
+        'created_at': item.get('created_at') or datetime.utcnow(),
+        'file_path': item.get('file_path'),
+        's3_key': item.get('s3_key'),
+        'template_category': item.get('category'),
+        'is_template': bool(item.get('is_template', False)),
+        **summarize(workout, zone_table),
+    }
+
+
+class BulkSaveError(Exception):
+    """A bulk save failed and was undone; ``failures`` lists what went wrong per item."""
+
+    def __init__(self, message, failures):
+        super().__init__(message)
+        self.failures = failures
+
+
+def bulk_save(items: List[Dict], user_id: int, storage=None, zone_table: Optional[ZoneTable] = None,
+              batch_size: int = BULK_BATCH_SIZE, upload_workers: int = UPLOAD_WORKERS) -> List[int]:
+    """Persist a batch of workouts as a unit, returning the new ids in input order.
+
+    Each item is a dict with the ``workout`` IR and optionally ``data`` (ZWO
+    bytes) plus ``s3_key`` to upload, ``file_path``, ``category``,
+    ``is_template`` and ``created_at``. Uploads go first, concurrently;
+    if any fails, or the insert does, the uploaded objects are deleted,
+    the transaction is rolled back and BulkSaveError is raised.
+    """
+    rows = [_entry_row(item, user_id, zone_table) for item in items]
+    uploads = [(index, item['s3_key'], item['data']) for index, item in enumerate(items)
+               if item.get('s3_key') and item.get('data') is not None]
+    if uploads and storage is None:
+        raise ValueError("Items with data and s3_key need a storage")
+
+    uploaded, failures = [], []
+    if uploads:
+        with ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix='bulk-upload') as executor:
+            results = executor.map(lambda upload: storage.upload_data(upload[2], upload[1]), uploads)
+            for (index, s3_key, _), url in zip(uploads, results):
+                if url is None:
+                    failures.append({"index": index, "s3_key": s3_key, "error": "Upload failed"})
+                else:
+                    uploaded.append(s3_key)
+        if failures:
+            _remove_uploads(storage, uploaded)
+            raise BulkSaveError(f"{len(failures)} of {len(uploads)} uploads failed", failures)
+
+    ids = []
+    stmt = insert(Workout).returning(Workout.id, sort_by_parameter_order=True)
+    try:
+        for start in range(0, len(rows), batch_size):
+            ids.extend(db.session.scalars(stmt, rows[start:start + batch_size]).all())
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        _remove_uploads(storage, uploaded)
+        raise BulkSaveError(f"Insert failed: {e}", [{"index": None, "error": str(e),
+                                                      "error_type": type(e).__name__}]) from e
+    return ids
+
+
+def _remove_uploads(storage, s3_keys):
+    for s3_key in s3_keys:
+        if not storage.delete_file(s3_key):
+            logger.error("Could not remove %s after a failed bulk save", s3_key)
+
+
+def init_library():
+    """Bring an existing database up to date: summary columns, indexes and, on SQLite, the FTS index.
+
+    Call inside an app context after ``db.create_all()``; safe to repeat.
+    """
+    engine = db.engine
+    columns = {c['name'] for c in inspect(engine).get_columns('workout')}
+    with engine.begin() as conn:
+        for name, sql_type in SUMMARY_COLUMNS.items():
+            if name not in columns:
+                conn.execute(text(f"ALTER TABLE workout ADD COLUMN {name} {sql_type}"))
+        # create_all skips tables that already exist, and with them any new index
+        for index in Workout.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        if engine.dialect.name != 'sqlite':
+            return
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'workout_fts'")).first()
+        for statement in _FTS_SCHEMA:
+            conn.execute(text(statement))
+        if not exists:
+            # Index whatever was saved before the index existed
+            conn.execute(text("INSERT INTO workout_fts(workout_fts) VALUES ('rebuild')"))
+
+
+def escape_like(term: str) -> str:
+    """Escape LIKE wildcards so a term matches literally (with ``escape='\\'``)."""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def fts_query(query: str) -> Optional[str]:
+    """FTS5 MATCH expression for user text: every word, as a prefix, must appear."""
+    terms = _TERM_RE.findall(query)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_workouts(query: Optional[str] = None, category: Optional[str] = None,
+                    min_duration: Optional[int] = None, max_duration: Optional[int] = None,
+                    max_power: Optional[float] = None, min_z5_seconds: Optional[int] = None,
+                    templates_only: bool = False, after: Optional[int] = None,
+                    limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[Workout], Optional[int]]:
+    """One page of matching workouts, newest first, and the cursor for the next page.
+
+    ``max_power`` is a decimal of FTP. Pass the returned cursor as ``after``
+    to continue; it is None on the last page.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    stmt = select(Workout).options(joinedload(Workout.author))
+    # Keyset column: the FTS rowid when searching text, so SQLite walks the
+    # index newest first and stops at the page instead of sorting every hit
+    key = Workout.id
+    match = fts_query(query) if query else None
+    if match is not None:
+        if db.engine.dialect.name == 'sqlite':
+            stmt = stmt.join(_fts, _fts.c.rowid == Workout.id).where(
+                text("workout_fts MATCH :match").bindparams(match=match))
+            key = _fts.c.rowid
+        else:
+            for term in _TERM_RE.findall(query):
+                pattern = f"%{escape_like(term)}%"
+                stmt = stmt.where(or_(Workout.name.ilike(pattern, escape='\\'),
+                                      Workout.description.ilike(pattern, escape='\\')))
+    if category:
+        stmt = stmt.where(Workout.template_category == category)
+    if templates_only:
+        stmt = stmt.where(Workout.is_template.is_(True))
+    if min_duration is not None:
+        stmt = stmt.where(Workout.duration >= min_duration)
+    if max_duration is not None:
+        stmt = stmt.where(Workout.duration <= max_duration)
+    if max_power is not None:
+        stmt = stmt.where(Workout.max_power <= max_power)
+    if min_z5_seconds is not None:
+        stmt = stmt.where(Workout.z5_seconds >= min_z5_seconds)
+    if after is not None:
+        stmt = stmt.where(key < after)
+    rows = db.session.scalars(stmt.order_by(key.desc()).limit(limit + 1)).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def encode_cursor(workout: Workout) -> str:
+    """Listing cursor for the page after ``workout``."""
+    return f"{workout.created_at.isoformat()}_{workout.id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    created_at, _, workout_id = cursor.rpartition('_')
+    try:
+        return datetime.fromisoformat(created_at), int(workout_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+def list_workouts(user_id: Optional[int] = None, category: Optional[str] = None,
+                  templates_only: bool = False, after: Optional[str] = None,
+                  limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[Workout], Optional[str]]:
+    """One page of workouts, newest first, and the cursor for the next page (None on the last)."""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    stmt = select(Workout).options(joinedload(Workout.author))
+    if user_id is not None:
+        stmt = stmt.where(Workout.user_id == user_id)
+    if category:
+        stmt = stmt.where(Workout.template_category == category)
+    if templates_only:
+        stmt = stmt.where(Workout.is_template.is_(True))
+    if after:
+        stmt = stmt.where(tuple_(Workout.created_at, Workout.id) < decode_cursor(after))
+    stmt = stmt.order_by(Workout.created_at.desc(), Workout.id.desc()).limit(limit + 1)
+    rows = db.session.scalars(stmt).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
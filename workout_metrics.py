@@ -0,0 +1,112 @@
+"""Training-load metrics for workout IR: NP, IF, TSS, kJ and time in zone.
+
+Everything is computed with NumPy. Each workout is expanded to a
+per-second power array (as a fraction of FTP) one node at a time - a
+repeat's body is expanded once and tiled - and a batch of workouts is
+concatenated so the rolling average, the fourth-power mean and the zone
+histogram are each a single vectorized pass over the batch. Batches are
+processed in chunks of about CHUNK_SECONDS samples, so memory stays
+bounded however many long workouts one request sends.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from workout_ir import Repeat, Workout, FREERIDE, RAMP_KINDS
+from zone_table import DEFAULT_ZONE_TABLE, ZoneTable
+
+# Window of the rolling average used for normalized power
+NP_WINDOW = 30
+
+# Samples (seconds of workout) concatenated per vectorized pass: ~8 MB per float array
+CHUNK_SECONDS = 1 << 20
+
+
+def segment_power(segment) -> np.ndarray:
+    """Per-second power for one segment, as a fraction of FTP."""
+    if segment.kind == FREERIDE or segment.power_low is None:
+        # No prescribed target; counts as no load
+        return np.zeros(segment.duration)
+    if segment.kind in RAMP_KINDS:
+        low, high = segment.power_low, segment.power_high
+        return low + (high - low) * np.arange(segment.duration) / segment.duration
+    # Steady target ranges count as their midpoint
+    return np.full(segment.duration, (segment.power_low + segment.power_high) / 2)
+
+
+def power_series(segments) -> np.ndarray:
+    """Per-second power for a list of IR nodes, as a fraction of FTP."""
+    parts = []
+    for node in segments:
+        if isinstance(node, Repeat):
+            parts.append(np.tile(power_series(node.body), node.count))
+        else:
+            parts.append(segment_power(node))
+    return np.concatenate(parts) if parts else np.zeros(0)
+
+
+def batch_metrics(workouts, ftp: float, zone_table: Optional[ZoneTable] = None) -> List[Dict]:
+    """Compute metrics for many workouts (Workout IR or node lists) at once."""
+    zone_table = zone_table or DEFAULT_ZONE_TABLE
+    if ftp <= 0:
+        raise ValueError("FTP must be positive")
+    results, chunk, size = [], [], 0
+    for workout in workouts:
+        series = power_series(workout.segments if isinstance(workout, Workout) else workout)
+        if chunk and size + len(series) > CHUNK_SECONDS:
+            results.extend(_chunk_metrics(chunk, ftp, zone_table))
+            chunk, size = [], 0
+        chunk.append(series)
+        size += len(series)
+    if chunk:
+        results.extend(_chunk_metrics(chunk, ftp, zone_table))
+    return results
+
+
+def _chunk_metrics(series, ftp, zone_table):
+    lengths = np.array([len(s) for s in series])
+    power = np.concatenate(series)
+    ids = np.repeat(np.arange(len(series)), lengths)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    # 30 s rolling average, only where the whole window lies in one workout
+    cumulative = np.concatenate(([0.0], np.cumsum(power)))
+    positions = np.arange(len(power))
+    valid = positions - starts[ids] >= NP_WINDOW - 1
+    window_start = np.maximum(positions - NP_WINDOW + 1, 0)
+    rolling = (cumulative[positions + 1] - cumulative[window_start]) / NP_WINDOW
+    fourth = np.bincount(ids[valid], weights=rolling[valid] ** 4, minlength=len(series))
+    windows = np.bincount(ids[valid], minlength=len(series))
+
+    totals = np.bincount(ids, weights=power, minlength=len(series))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average = np.where(lengths > 0, totals / lengths, 0.0)
+        # Workouts shorter than the window fall back to average power
+        normalized = np.where(windows > 0, (fourth / np.maximum(windows, 1)) ** 0.25, average)
+
+    buckets = len(zone_table.buckets)
+    histogram = np.bincount(ids * buckets + zone_table.classify_array(power),
+                            minlength=len(series) * buckets).reshape(len(series), buckets)
+
+    results = []
+    for i in range(len(series)):
+        hours = int(lengths[i]) / 3600
+        intensity = float(normalized[i])
+        time_in_zone = {name: 0 for name in zone_table.zones}
+        for name, seconds in zip(zone_table.buckets, histogram[i]):
+            time_in_zone[name] += int(seconds)
+        results.append({
+            'duration': int(lengths[i]),
+            'average_power': round(float(average[i]) * ftp, 1),
+            'normalized_power': round(intensity * ftp, 1),
+            'intensity_factor': round(intensity, 3),
+            'tss': round(hours * intensity ** 2 * 100, 1),
+            'kj': round(float(totals[i]) * ftp / 1000, 1),
+            'time_in_zone': time_in_zone,
+        })
+    return results
+
+
+def workout_metrics(workout, ftp: float, zone_table: Optional[ZoneTable] = None) -> Dict:
+    """Compute metrics for a single workout."""
+    return batch_metrics([workout], ftp, zone_table)[0]
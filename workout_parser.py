@@ -0,0 +1,537 @@
+"""Single-pass lexer and recursive-descent parser for workout descriptions.
+
+The description DSL is the free-text notation coaches type into the web form:
+
+    Z1-Z2 base with focus on efforts as follows:
+
+    -6x5' / 3' recovery done as...
+    30" max / 30" easy
+    4' SFR (50-60r, 300-330w)
+
+    -1 x 20' Z3 HR (150-160bpm), mostly 85+ rpm
+
+The whole description is lowercased once and tokenized by one compiled
+regex whose alternatives are simple character-class runs, so tokenizing is
+linear in the input size. The parser then walks the token stream line by
+line without backtracking across lines, producing a small typed AST.
+"""
+import math
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+
+from zone_table import DEFAULT_ZONE_TABLE, ZONE_POWER, MAX_POWER, EASY_POWER  # noqa: F401
+
+SFR_CADENCE = 55
+
+# Limits that keep hostile input from expanding into an unbounded workout
+MAX_NESTING = 8
+MAX_WORKOUT_DURATION = 24 * 3600
+MAX_NUMBER = 10 ** 6
+# Checked before tokenizing, so an oversized body costs nothing to reject
+MAX_DESCRIPTION_LENGTH = 64 * 1024
+
+# Every alternative is a single run of one character class (or one character),
+# so the regex engine never has anything to backtrack into.
+_TOKEN_RE = re.compile(r"""
+    (\d+(?:\.\d+)?)       # NUMBER
+  | (z[1-7](?![0-9]))     # ZONE
+  | ([a-z]+)              # WORD
+  | (\.\.\.|…)            # ELLIPSIS
+  | (\S)                  # PUNCT
+""", re.VERBOSE)
+_TOKEN_KINDS = (None, 'NUMBER', 'ZONE', 'WORD', 'ELLIPSIS', 'PUNCT')
+_END = (None, None)
+
+MINUTE_MARKS = frozenset("'’′")
+SECOND_MARKS = frozenset('"”″')
+BULLETS = frozenset('-*•►')
+
+MINUTE_WORDS = frozenset(['m', 'min', 'mins', 'minute', 'minutes'])
+SECOND_WORDS = frozenset(['s', 'sec', 'secs', 'second', 'seconds'])
+HOUR_WORDS = frozenset(['h', 'hr', 'hrs', 'hour', 'hours'])
+WATT_WORDS = frozenset(['w', 'watt', 'watts'])
+CADENCE_WORDS = frozenset(['r', 'rpm'])
+REPEAT_WORDS = frozenset(['sets', 'set', 'rounds', 'round', 'reps', 'rep', 'times'])
+RECOVERY_WORDS = frozenset(['easy', 'recovery', 'rest', 'recover'])
+EASY_WORDS = RECOVERY_WORDS | frozenset(['warm', 'warmup', 'cool', 'cooldown'])
+# Words that join efforts written on one line ("warm up 10 min then 3x8 min"); "with"
+# joins a recovery instead ("3x8 min with 4 min rest" is an on/off pair)
+CONNECTOR_WORDS = frozenset(['then', 'and', 'plus', 'followed', 'by'])
+# Words that may come before the duration of an effort ("Z3 for 20 min", "tempo 45 min z3")
+LEADING_WORDS = EASY_WORDS | CONNECTOR_WORDS | frozenset([
+    'max', 'sfr', 'tempo', 'threshold', 'endurance', 'sweet', 'spot', 'steady', 'hard', 'up', 'down',
+    'for', 'at', 'in', 'of', 'z'])
+LEADING_PUNCT = frozenset('@:,(')
+# How far past a connector to look for the next effort (bounded, so parsing stays linear)
+MAX_LEADING_TOKENS = 8
+
+
+@dataclass
+class ZoneRange:
+    low: int
+    high: int
+
+
+@dataclass
+class WattRange:
+    low: int
+    high: int
+
+
+@dataclass
+class PercentRange:
+    low: float
+    high: float
+
+
+@dataclass
+class CadenceRange:
+    low: int
+    high: Optional[int] = None  # None for open-ended targets such as "85+ rpm"
+
+
+@dataclass
+class Effort:
+    """A single block of work, e.g. ``4' SFR (50-60r, 300-330w)``."""
+    duration: int
+    zone: Optional[ZoneRange] = None
+    watts: Optional[WattRange] = None
+    percent: Optional[PercentRange] = None
+    cadence: Optional[CadenceRange] = None
+    max_effort: bool = False
+    easy: bool = False
+    sfr: bool = False
+    body: List['Node'] = field(default_factory=list)  # "done as..." sub-block
+
+
+@dataclass
+class OnOff:
+    """Work/recovery pair, e.g. ``30" max / 30" easy``."""
+    on: Effort
+    off: Effort
+
+
+@dataclass
+class Repeat:
+    """``N x <item>`` or ``N sets of <item>``."""
+    count: int
+    child: 'Node'
+
+
+@dataclass
+class Base:
+    """Header line describing the aerobic base around the efforts."""
+    zone: Optional[ZoneRange] = None
+
+
+@dataclass
+class Note:
+    """Free text that does not describe a segment."""
+    text: str
+
+
+Node = Union[Effort, OnOff, Repeat, Base, Note]
+
+
+@dataclass
+class WorkoutAST:
+    base: Optional[Base] = None
+    items: List[Node] = field(default_factory=list)
+
+
+class ParseError(ValueError):
+    """Raised when a description does not describe a usable workout."""
+
+
+def _number(text):
+    """Numeric value of a NUMBER token; absurdly long digit runs are a ParseError, not an overflow."""
+    value = float(text)
+    if not math.isfinite(value) or value > MAX_NUMBER:
+        raise ParseError("number out of range")
+    return value
+
+
+class _Line:
+    __slots__ = ('indent', 'bullet', 'tokens', 'text')
+
+    def __init__(self, indent, bullet, tokens, text):
+        self.indent = indent
+        self.bullet = bullet
+        self.tokens = tokens
+        self.text = text
+
+
+def tokenize(text):
+    """Split a description into lines of ``(kind, value)`` tokens.
+
+    Leading whitespace and a bullet character are folded into each line's
+    ``indent`` and ``bullet`` attributes; other whitespace is dropped.
+    """
+    lines = []
+    kinds = _TOKEN_KINDS
+    for raw, line in zip(text.split('\n'), text.lower().split('\n')):
+        content = line.lstrip()
+        indent = len(line) - len(content)
+        bullet = content[:1] in BULLETS
+        if bullet:
+            content = content[1:]
+        tokens = [(kinds[m.lastindex], m.group()) for m in _TOKEN_RE.finditer(content)]
+        lines.append(_Line(indent, bullet, tokens, raw.strip()))
+    return lines
+
+
+class _LineParser:
+    """Recursive-descent parser over the tokens of one line."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+        self.done_as = False
+
+    def peek(self, offset=0):
+        try:
+            return self.tokens[self.pos + offset]
+        except IndexError:
+            return _END
+
+    def advance(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def at_end(self):
+        return self.pos >= len(self.tokens)
+
+    def is_punct(self, chars, offset=0):
+        kind, value = self.peek(offset)
+        return kind == 'PUNCT' and value in chars
+
+    def is_word(self, words, offset=0):
+        kind, value = self.peek(offset)
+        return kind == 'WORD' and value in words
+
+    # item := repeat | interval
+    def parse_item(self, depth=0, bare_minutes=False):
+        if self.peek()[0] == 'NUMBER':
+            if self.is_word(('x',), 1):
+                return self.parse_repeat(2, depth)
+            if self.is_word(REPEAT_WORDS, 1):
+                skip = 3 if self.is_word(('of',), 2) else 2
+                return self.parse_repeat(skip, depth)
+        return self.parse_interval(bare_minutes)
+
+    # repeat := NUMBER ('x' | 'sets' ['of']) item
+    def parse_repeat(self, skip, depth):
+        if depth >= MAX_NESTING:
+            raise ParseError("repeats nested too deeply")
+        count = int(_number(self.advance()[1]))
+        if count < 1:
+            raise ParseError("repeat count must be positive")
+        self.pos += skip - 1
+        return Repeat(count, self.parse_item(depth + 1, bare_minutes=True))
+
+    # items := item (connector+ item)*
+    def parse_items(self):
+        items = [self.parse_item()]
+        # Anything else left on the line is trailing text, as it always was
+        while self.is_connector() and self.effort_follows(1):
+            while self.is_connector():
+                self.advance()
+            items.append(self.parse_item())
+        return items
+
+    # interval := effort [('/' | 'with') effort]
+    def parse_interval(self, bare_minutes=False):
+        on = self.parse_effort(bare_minutes)
+        if (self.is_punct('/') and self.starts_duration(1)) or self.starts_with_recovery():
+            self.advance()
+            off = self.parse_effort()
+            return OnOff(on, off)
+        return on
+
+    def is_connector(self, offset=0):
+        return self.is_word(CONNECTOR_WORDS, offset)
+
+    def starts_with_recovery(self):
+        """``with`` and then an easy effort: "with 4 min rest", but not "with 15" surge"."""
+        if not (self.is_word(('with',)) and self.effort_follows(1)):
+            return False
+        for offset in range(1, 1 + 2 * MAX_LEADING_TOKENS):
+            kind, value = self.peek(offset)
+            if kind is None or self.is_connector(offset) or (kind == 'PUNCT' and value in '/(;'):
+                return False
+            if kind == 'WORD' and value in RECOVERY_WORDS:
+                return True
+        return False
+
+    def starts_repeat(self, offset=0):
+        return self.peek(offset)[0] == 'NUMBER' and (
+            self.is_word(('x',), offset + 1) or self.is_word(REPEAT_WORDS, offset + 1))
+
+    def effort_follows(self, offset):
+        """True if a duration or repeat comes within a few leading words of ``offset``."""
+        for index in range(offset, offset + MAX_LEADING_TOKENS):
+            if self.starts_duration(index) or self.starts_repeat(index):
+                return True
+            kind, value = self.peek(index)
+            if not (kind == 'ZONE' or (kind == 'WORD' and value in LEADING_WORDS)
+                    or (kind == 'PUNCT' and value in LEADING_PUNCT)):
+                return False
+        return False
+
+    def starts_duration(self, offset=0):
+        if self.peek(offset)[0] != 'NUMBER':
+            return False
+        return self.duration_unit(offset + 1) is not None
+
+    def duration_unit(self, offset):
+        kind, value = self.peek(offset)
+        if kind == 'PUNCT' and value in MINUTE_MARKS:
+            return 60
+        if kind == 'PUNCT' and value in SECOND_MARKS:
+            return 1
+        if kind == 'WORD':
+            if value in MINUTE_WORDS:
+                return 60
+            if value in SECOND_WORDS:
+                return 1
+            if value in HOUR_WORDS:
+                return 3600
+        return None
+
+    def starts_bare_minutes(self):
+        """A unitless number right after ``N x``: "2x20" means 20 minutes."""
+        return self.peek()[0] == 'NUMBER' and not self.is_punct('-+%', 1) and not (
+            self.peek(1)[0] == 'WORD' and self.peek(1)[1] in WATT_WORDS | CADENCE_WORDS)
+
+    # duration := NUMBER ("'" | '"' | min | sec | hours)
+    def parse_duration(self, bare_minutes=False):
+        if self.starts_duration():
+            number = _number(self.advance()[1])
+            unit = self.duration_unit(0)
+            self.advance()
+        elif bare_minutes and self.starts_bare_minutes():
+            number, unit = _number(self.advance()[1]), 60
+        else:
+            raise ParseError("expected a duration")
+        seconds = int(number * unit)
+        if not 0 < seconds <= MAX_WORKOUT_DURATION:
+            raise ParseError("duration out of range")
+        return seconds
+
+    # effort := leading_attribute* duration attribute*
+    def parse_effort(self, bare_minutes=False):
+        effort = Effort(0)
+        while not (self.starts_duration() or (bare_minutes and self.starts_bare_minutes())):
+            if not self.starts_leading_attribute():
+                raise ParseError("expected a duration")
+            self.parse_attribute(effort)
+        effort.duration = self.parse_duration(bare_minutes)
+        while not self.at_end():
+            if self.is_punct('/') and self.starts_duration(1):
+                break
+            if (self.is_connector() and self.effort_follows(1)) or self.starts_with_recovery():
+                break
+            self.parse_attribute(effort)
+        return effort
+
+    def starts_leading_attribute(self):
+        kind, value = self.peek()
+        if kind in ('ZONE', 'NUMBER'):
+            return True
+        if kind == 'WORD':
+            return value in LEADING_WORDS
+        return kind == 'PUNCT' and value in LEADING_PUNCT
+
+    def parse_attribute(self, effort):
+        kind, value = self.peek()
+        if kind == 'ZONE':
+            effort.zone = self.parse_zone_range()
+        elif kind == 'NUMBER':
+            self.parse_numeric_attribute(effort)
+        elif kind == 'WORD':
+            self.advance()
+            if value == 'max':
+                effort.max_effort = True
+            elif value in EASY_WORDS:
+                effort.easy = True
+            elif value == 'sfr':
+                effort.sfr = True
+            elif value == 'as' and self.rest_is_trailer():
+                self.done_as = True
+        else:
+            self.advance()
+
+    def rest_is_trailer(self):
+        """True when only ``...`` / ``:`` / ``.`` punctuation remains on the line."""
+        tokens = self.tokens
+        for index in range(self.pos, len(tokens)):
+            kind, value = tokens[index]
+            if not (kind == 'ELLIPSIS' or (kind == 'PUNCT' and value in ':.')):
+                return False
+        return True
+
+    # zone_range := ZONE [('-' | '/' | 'to') ZONE]
+    def parse_zone_range(self):
+        low = int(self.advance()[1][1])
+        high = low
+        if (self.is_punct('-/') or self.is_word(('to',))) and self.peek(1)[0] == 'ZONE':
+            self.advance()
+            high = int(self.advance()[1][1])
+        return ZoneRange(low, high)
+
+    # NUMBER ['-' NUMBER] ['+'] (w | r | rpm | % | bpm | duration unit)
+    def parse_numeric_attribute(self, effort):
+        low = _number(self.advance()[1])
+        high = None
+        if self.is_punct('-') and self.peek(1)[0] == 'NUMBER':
+            self.advance()
+            high = _number(self.advance()[1])
+        open_ended = False
+        if self.is_punct('+'):
+            self.advance()
+            open_ended = True
+        kind, value = self.peek()
+        if kind == 'WORD' and value in WATT_WORDS:
+            self.advance()
+            effort.watts = WattRange(int(low), int(high if high is not None else low))
+        elif kind == 'WORD' and value in CADENCE_WORDS:
+            self.advance()
+            if open_ended or high is None:
+                effort.cadence = CadenceRange(int(low), None if open_ended else int(low))
+            else:
+                effort.cadence = CadenceRange(int(low), int(high))
+        elif kind == 'PUNCT' and value == '%':
+            self.advance()
+            effort.percent = PercentRange(low, high if high is not None else low)
+        elif self.duration_unit(0) is not None or kind == 'WORD':
+            # Secondary durations ("every 3'") and heart rate ("150-160bpm")
+            # don't change the segment itself.
+            self.advance()
+
+
+class DescriptionParser:
+    """Parse a full description into a :class:`WorkoutAST`."""
+
+    def __init__(self, text):
+        if len(text) > MAX_DESCRIPTION_LENGTH:
+            raise ParseError(f"description is longer than {MAX_DESCRIPTION_LENGTH} characters")
+        self.lines = tokenize(text)
+        self.pos = 0
+
+    def parse(self):
+        workout = WorkoutAST()
+        total = 0
+        while self.pos < len(self.lines):
+            line = self.lines[self.pos]
+            self.pos += 1
+            if not line.tokens:
+                continue
+            for node in self.parse_line(line):
+                if isinstance(node, Base):
+                    if workout.base is None:
+                        workout.base = node
+                    continue
+                total += node_duration(node)
+                if total > MAX_WORKOUT_DURATION:
+                    raise ParseError("workout is longer than 24 hours")
+                workout.items.append(node)
+        if not total:
+            raise ParseError("no efforts found in the description")
+        return workout
+
+    def parse_line(self, line, depth=0):
+        """The nodes on one line: its efforts, or a single header or note."""
+        parser = _LineParser(line.tokens)
+        try:
+            nodes = parser.parse_items()
+            if sum(node_duration(node) for node in nodes) > MAX_WORKOUT_DURATION:
+                raise ParseError("segment is longer than 24 hours")
+        except ParseError:
+            return [self.parse_header(line)]
+        if parser.done_as and depth < MAX_NESTING:
+            target = nodes[-1]
+            while isinstance(target, Repeat):
+                target = target.child
+            if isinstance(target, OnOff):
+                target = target.on
+            target.body = self.parse_body(line, depth + 1)
+        return nodes
+
+    def parse_header(self, line):
+        zone = None
+        tokens = line.tokens
+        for index, (kind, value) in enumerate(tokens):
+            if kind == 'ZONE' and zone is None:
+                zone = _LineParser(tokens[index:]).parse_zone_range()
+        is_base = any(kind == 'WORD' and value == 'base' for kind, value in tokens)
+        if is_base or (zone is not None and zone.low == 1 and zone.high == 2):
+            return Base(zone)
+        return Note(line.text)
+
+    def parse_body(self, owner, depth):
+        """Parse the lines that make up a "done as..." sub-block.
+
+        The block starts at the next non-blank line and runs until a blank
+        line, or a line that is not indented deeper than the owner. Un-bulleted lines under a bulleted owner also
+        belong to it, which is how coaches usually write these.
+        """
+        body = []
+        while self.pos < len(self.lines) and not self.lines[self.pos].tokens:
+            self.pos += 1
+        while self.pos < len(self.lines):
+            line = self.lines[self.pos]
+            if not line.tokens:
+                break
+            if line.indent <= owner.indent and not (owner.bullet and not line.bullet):
+                break
+            self.pos += 1
+            body.extend(self.parse_line(line, depth))
+        return body
+
+
+def parse_description(text):
+    """Parse a workout description into a :class:`WorkoutAST`."""
+    return DescriptionParser(text).parse()
+
+
+def node_duration(node):
+    """Total duration in seconds of an AST node, ignoring notes."""
+    if isinstance(node, Effort):
+        return node.duration
+    if isinstance(node, OnOff):
+        return node.on.duration + node.off.duration
+    if isinstance(node, Repeat):
+        return node.count * node_duration(node.child)
+    return 0
+
+
+def effort_power(effort, default=None, zone_table=None):
+    """Resolve an effort's target to a decimal of FTP.
+
+    Zone targets come from ``zone_table`` (the default table if omitted);
+    ``default`` is used when the effort has no target and defaults to the
+    table's easy power.
+    """
+    zone_table = zone_table or DEFAULT_ZONE_TABLE
+    if effort.percent is not None:
+        return round((effort.percent.low + effort.percent.high) / 200, 2)
+    if effort.max_effort:
+        return zone_table.max_power
+    if effort.zone is not None:
+        return round((zone_table.target(effort.zone.low) + zone_table.target(effort.zone.high)) / 2, 2)
+    if effort.easy:
+        return zone_table.easy_power
+    return zone_table.easy_power if default is None else default
+
+
+def effort_cadence(effort, default=90):
+    """Resolve an effort's cadence target to a single rpm value."""
+    if effort.cadence is not None:
+        if effort.cadence.high is None:
+            return effort.cadence.low
+        return (effort.cadence.low + effort.cadence.high) // 2
+    if effort.sfr:
+        return SFR_CADENCE
+    return default
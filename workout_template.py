@@ -0,0 +1,187 @@
+"""Compile a workout once, render it for many athletes.
+
+``compile_template`` serializes a workout IR a single time and splits the
+bytes around a few typed slots:
+
+* ``name`` and ``description`` - escaped text, defaulting to the workout's;
+* ``targets`` - an optional block appended to the description that lists
+  each target in absolute watts at the athlete's FTP;
+* ``ftp_override`` - an optional ``<ftpOverride>`` element, which makes
+  Zwift resolve the FTP-relative targets against that fixed FTP, i.e. in
+  absolute watts.
+
+Everything else (the header and the whole <workout> block) is invariant,
+so rendering a roster is byte concatenation plus a little text per athlete.
+"""
+import math
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from lxml import etree as ET
+
+import workout_ir as ir
+
+# Markers can't collide with workout text: compile_template rejects input containing them
+_MARK = '\ue000'
+_SLOT_RE = re.compile(f'{_MARK}(\\w+){_MARK}'.encode('utf-8'))
+_FTP_LINE_RE = re.compile(f'[ \\t]*<ftpOverride>{_MARK}ftp_override{_MARK}</ftpOverride>\\n?'.encode('utf-8'))
+_INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def _marker(slot):
+    return f'{_MARK}{slot}{_MARK}'
+
+
+def _text(value: str) -> bytes:
+    """Escape slot text the way lxml escapes element text."""
+    if _INVALID_XML_RE.search(value):
+        raise ValueError("Text contains characters that are not allowed in XML")
+    return escape(value).encode('utf-8')
+
+
+def check_ftp(ftp) -> float:
+    """Return ``ftp`` if it is a finite, positive number of watts, else raise ValueError."""
+    if isinstance(ftp, bool) or not isinstance(ftp, (int, float)) or not math.isfinite(ftp) or ftp <= 0:
+        raise ValueError("ftp must be a positive number of watts")
+    return ftp
+
+
+def format_duration(seconds: int) -> str:
+    """Short human duration: 30s, 5 min, 1 min 30s."""
+    minutes, seconds = divmod(int(seconds), 60)
+    if not minutes:
+        return f"{seconds}s"
+    return f"{minutes} min {seconds}s" if seconds else f"{minutes} min"
+
+
+def target_lines(segments) -> List[Tuple[str, Tuple[float, ...]]]:
+    """``(format, powers)`` for each distinct target, filled in with watts per athlete."""
+    lines, seen = [], set()
+    for node in segments:
+        pair = ir.interval_pair(node) if isinstance(node, ir.Repeat) else None
+        if pair is not None:
+            on, off = pair
+            line = (f"{node.count} x {format_duration(on.duration)} @ {{}} W / "
+                    f"{format_duration(off.duration)} @ {{}} W",
+                    (_mid(on), _mid(off)))
+        elif isinstance(node, ir.Repeat):
+            for body_line in target_lines(node.body):
+                if body_line not in seen:
+                    seen.add(body_line)
+                    lines.append(body_line)
+            continue
+        elif node.power_low is None:
+            continue
+        elif node.kind in ir.RAMP_KINDS:
+            line = (f"{format_duration(node.duration)} {{}}-{{}} W", (node.power_low, node.power_high))
+        else:
+            line = (f"{format_duration(node.duration)} @ {{}} W", (_mid(node),))
+        if line not in seen:
+            seen.add(line)
+            lines.append(line)
+    return lines
+
+
+def _mid(segment):
+    return (segment.power_low + segment.power_high) / 2
+
+
+class WorkoutTemplate:
+    """Pre-serialized ZWO bytes with typed slots; see the module docstring."""
+
+    def __init__(self, chunks, name, description, targets):
+        self.chunks = chunks
+        self.name = name
+        self.description = description
+        self.targets = targets
+
+    def render(self, name: Optional[str] = None, description: Optional[str] = None,
+               ftp: Optional[float] = None, watts: bool = False) -> bytes:
+        """Render with optional name/description overrides.
+
+        With ``watts=True`` and an ``ftp``, the description gains the
+        targets in watts and the file pins Zwift to that FTP.
+        """
+        values = {
+            'name': _text(self.name if name is None else name),
+            'description': _text(self.description if description is None else description),
+            'targets': b'',
+            'ftp_override': b'',
+        }
+        if watts and ftp is not None:
+            values['targets'] = _text(self.targets_text(ftp))
+            values['ftp_override'] = f"  <ftpOverride>{int(round(ftp))}</ftpOverride>\n".encode('utf-8')
+        return b''.join(chunk if isinstance(chunk, bytes) else values[chunk] for chunk in self.chunks)
+
+    def targets_text(self, ftp: float) -> str:
+        check_ftp(ftp)
+        lines = [f"\n\n► Targets at {int(round(ftp))} W FTP:"]
+        for fmt, powers in self.targets:
+            lines.append("- " + fmt.format(*(int(round(power * ftp)) for power in powers)))
+        return "\n".join(lines)
+
+    def render_athlete(self, athlete: Dict) -> bytes:
+        """Render for one roster entry: ``{"name", "ftp", "watts"}``."""
+        return self.render(name=athlete_workout_name(self.name, athlete),
+                           ftp=athlete.get('ftp'), watts=bool(athlete.get('watts')))
+
+
+def athlete_workout_name(workout_name: str, athlete: Dict) -> str:
+    if not isinstance(athlete, dict):
+        return workout_name
+    athlete_name = str(athlete.get('name') or '').strip()
+    return f"{workout_name} - {athlete_name}" if athlete_name else workout_name
+
+
+def compile_template(workout: ir.Workout) -> WorkoutTemplate:
+    """Serialize a workout IR once, leaving slots for per-athlete values."""
+    for text in (workout.name or '', workout.description, workout.author):
+        if _MARK in text:
+            raise ValueError("Workout text contains a reserved character")
+    # A workout without a name (workout_generator.save_workout) gets no name slot
+    name = None if workout.name is None else _marker('name')
+    shell = ir.Workout(name, _marker('description') + _marker('targets'), workout.segments,
+                       author=workout.author, sport_type=workout.sport_type, tags=workout.tags)
+    root = ir.to_element(shell, ET)
+    override = ET.Element("ftpOverride")
+    override.text = _marker('ftp_override')
+    root.insert(list(root).index(root.find('sportType')) + 1, override)
+    data = ET.tostring(root, pretty_print=True, xml_declaration=True, encoding='UTF-8')
+    # The whole <ftpOverride> line is the slot, so it disappears when unused
+    data = _FTP_LINE_RE.sub(_marker('ftp_override').encode('utf-8'), data)
+
+    chunks, position = [], 0
+    for match in _SLOT_RE.finditer(data):
+        if match.start() > position:
+            chunks.append(data[position:match.start()])
+        chunks.append(match.group(1).decode('ascii'))
+        position = match.end()
+    chunks.append(data[position:])
+    return WorkoutTemplate(chunks, workout.name or '', workout.description, target_lines(workout.segments))
+
+
+def validate_athlete(athlete) -> Dict:
+    """Check one roster entry, returning it unchanged or raising ValueError."""
+    if not isinstance(athlete, dict):
+        raise ValueError("Each athlete must be a JSON object")
+    ftp = athlete.get('ftp')
+    if ftp is not None:
+        check_ftp(ftp)
+    if athlete.get('watts') and ftp is None:
+        raise ValueError("watts needs an ftp")
+    return athlete
+
+
+def iter_roster(template: WorkoutTemplate, athletes: Iterable[Dict]) -> Iterator[Tuple[int, Dict, bytes, Optional[Exception]]]:
+    """Yield ``(index, athlete, data, error)`` in roster order, like render_in_order."""
+    for index, athlete in enumerate(athletes):
+        try:
+            yield index, athlete, template.render_athlete(validate_athlete(athlete)), None
+        except ValueError as e:
+            yield index, athlete, None, e
+
+
+def render_roster(template: WorkoutTemplate, athletes: Iterable[Dict]) -> List[bytes]:
+    """Render a template for every athlete, in roster order."""
+    return [template.render_athlete(validate_athlete(athlete)) for athlete in athletes]
@@ -0,0 +1,144 @@
+"""Power zone table shared by the parser, every generator and the metrics code.
+
+A :class:`ZoneTable` holds the zone boundaries (as decimal of FTP), the RPE
+scale and the target power used for each zone number. The upper bounds are
+precomputed into a sorted boundary array, so classifying a single power is
+a ``bisect`` and classifying a whole per-second array is one
+``numpy.searchsorted`` call.
+
+Tables are plain data and can be built per athlete or coach from a dict or
+a JSON file with :func:`ZoneTable.from_dict` / :func:`load_zone_table`.
+"""
+import json
+from bisect import bisect_left
+from typing import Dict, Optional
+
+import numpy as np
+
+# Define zone boundaries based on FTP percentages
+ZONES = {
+    "Z1": (0, 0.55),
+    "Z2": (0.56, 0.75),
+    "Z3": (0.76, 0.90),
+    "Z4": (0.91, 1.05),
+    "Z5": (1.06, 1.20),
+    "Z6": "Max Effort",
+    "Z7": "Max Effort"
+}
+
+# Define RPE scale
+RPE_SCALE = {
+    "Z1": "1-2",
+    "Z2": "2-3",
+    "Z3": "4-5",
+    "Z4": "6-7",
+    "Z5": "8-9",
+    "Z6": "9-10",
+    "Z7": "10"
+}
+
+# Power (as decimal of FTP) prescribed for each zone number
+ZONE_POWER = {
+    1: 0.5,
+    2: 0.65,
+    3: 0.83,
+    4: 0.98,
+    5: 1.13,
+    6: 1.2,
+    7: 1.2,
+}
+MAX_POWER = 1.2
+EASY_POWER = 0.65
+
+
+class ZoneTable:
+    """Zone boundaries, RPE scale and per-zone targets.
+
+    Numeric zones are ``(lower, upper)`` tuples; a power belongs to the first
+    zone whose upper bound it doesn't exceed, so gaps between one zone's
+    upper bound and the next one's lower bound round up. Anything above the
+    last numeric zone falls in the first non-numeric ("Max Effort") zone.
+    """
+
+    def __init__(self, zones: Dict = None, rpe_scale: Dict = None, targets: Dict = None,
+                 max_power: float = MAX_POWER, easy_power: float = EASY_POWER):
+        self.zones = dict(ZONES if zones is None else zones)
+        self.rpe_scale = dict(RPE_SCALE if rpe_scale is None else rpe_scale)
+        self.targets = {int(zone): float(power)
+                        for zone, power in (ZONE_POWER if targets is None else targets).items()}
+        self.max_power = float(max_power)
+        self.easy_power = float(easy_power)
+
+        numeric = [(name, bounds) for name, bounds in self.zones.items() if isinstance(bounds, tuple)]
+        if not numeric:
+            raise ValueError("Zone table needs at least one numeric zone")
+        self.boundaries = [float(upper) for _, (_, upper) in numeric]
+        if any(low >= high for low, high in zip(self.boundaries, self.boundaries[1:])):
+            raise ValueError("Zone upper bounds must be strictly increasing")
+        self.overflow = next((name for name, bounds in self.zones.items()
+                              if not isinstance(bounds, tuple)), numeric[-1][0])
+        # Zone name for each index classify_array can return
+        self.buckets = [name for name, _ in numeric] + [self.overflow]
+        self._boundary_array = np.array(self.boundaries)
+
+    def classify(self, power: float) -> str:
+        """Zone name for a single power (decimal of FTP)."""
+        return self.buckets[bisect_left(self.boundaries, power)]
+
+    def classify_array(self, powers) -> np.ndarray:
+        """Bucket index (into ``self.buckets``) for every power in an array."""
+        return np.searchsorted(self._boundary_array, powers, side='left')
+
+    def time_in_zone(self, powers) -> Dict[str, int]:
+        """Samples of a per-second power array spent in each zone."""
+        counts = np.bincount(self.classify_array(powers), minlength=len(self.buckets))
+        result = {name: 0 for name in self.zones}
+        for name, count in zip(self.buckets, counts):
+            result[name] += int(count)
+        return result
+
+    def label(self, power: float) -> str:
+        """Zone and RPE text, e.g. "Z3, RPE 4-5" or "Max Effort, RPE 9-10"."""
+        zone = self.classify(power)
+        bounds = self.zones[zone]
+        name = zone if isinstance(bounds, tuple) else bounds
+        return f"{name}, RPE {self.rpe_scale.get(zone, '')}"
+
+    def bounds(self, zone: str):
+        """``(lower, upper)`` of a numeric zone."""
+        return self.zones[zone]
+
+    def target(self, zone: int) -> float:
+        """Prescribed power for a zone number."""
+        return self.targets[zone]
+
+    def to_dict(self) -> Dict:
+        return {
+            'zones': {name: list(bounds) if isinstance(bounds, tuple) else bounds
+                      for name, bounds in self.zones.items()},
+            'rpe_scale': self.rpe_scale,
+            'targets': {str(zone): power for zone, power in self.targets.items()},
+            'max_power': self.max_power,
+            'easy_power': self.easy_power,
+        }
+
+    @classmethod
+    def from_dict(cls, config: Dict) -> 'ZoneTable':
+        """Build a table from ``to_dict`` output; missing keys use the defaults."""
+        zones = config.get('zones')
+        if zones is not None:
+            zones = {name: tuple(bounds) if isinstance(bounds, (list, tuple)) else bounds
+                     for name, bounds in zones.items()}
+        return cls(zones, config.get('rpe_scale'), config.get('targets'),
+                   config.get('max_power', MAX_POWER), config.get('easy_power', EASY_POWER))
+
+
+def load_zone_table(path: Optional[str] = None) -> ZoneTable:
+    """Load a zone table from a JSON file, or the default table if no path."""
+    if not path:
+        return DEFAULT_ZONE_TABLE
+    with open(path, encoding='utf-8') as f:
+        return ZoneTable.from_dict(json.load(f))
+
+
+DEFAULT_ZONE_TABLE = ZoneTable()
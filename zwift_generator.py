@@ -1,82 +1,52 @@
 import xml.etree.ElementTree as ET
 import os
 from datetime import datetime
-
-# Function to generate a Zwift workout .zwo file
-def generate_zwo(workout_name, description, warmup_time, intervals, cooldown_time, filename, num_sets):
-    # Create the root element
-    workout = ET.Element("workout_file")
-
-    # Add required elements in correct order
-    ET.SubElement(workout, "author").text = "Gravel God Cycling"
-    ET.SubElement(workout, "name").text = workout_name
-    
-    # Add description with proper CDATA formatting
-    desc = ET.SubElement(workout, "description")
-    desc.text = description  # The CDATA will be handled in the XML output
-    
-    sport_type = ET.SubElement(workout, "sportType")
-    sport_type.text = "bike"
-    
-    # Empty tags element
-    ET.SubElement(workout, "tags")
-
-    # Create workout section
-    workout_section = ET.SubElement(workout, "workout")
-
+from segment_compactor import compact_segments
+import workout_ir as ir
+from zwo_writer import write_workout
+from zone_table import DEFAULT_ZONE_TABLE
+
+# Function to build the workout IR for a Gavin Special workout
+def build_zwo_ir(workout_name, description, warmup_time, cooldown_time, num_sets, compact=True, zone_table=None):
+    # Warm-up and cool-down span Z2; recoveries sit at the Z2 target
+    zone_table = zone_table or DEFAULT_ZONE_TABLE
+    z2_low, z2_high = zone_table.bounds("Z2")
+    z2 = zone_table.target(2)
     # Warm-up (Using range-based power)
-    ET.SubElement(workout_section, "Warmup", 
-                  Duration=str(warmup_time), 
-                  PowerLow="0.56", PowerHigh="0.75")
-
-    # Main Set - Repeat 5 times
-    for _ in range(num_sets):  # Repeat the entire sequence 5 times
-        # First 40/20 block (2 minutes = 3 repeats)
-        ET.SubElement(workout_section, "IntervalsT",
-                     Repeat="3",  # 3 repeats = 2 minutes (3 x (40s + 20s))
-                     OnDuration="40",
-                     OnPower="1.2",  # Max Effort
-                     OffDuration="20",
-                     OffPower="0.65")  # Z2
-        
+    segments = [ir.warmup(warmup_time, z2_low, z2_high)]
+
+    # Main Set - Repeat the entire sequence num_sets times
+    segments.append(ir.Repeat(num_sets, [
+        # First 40/20 block (2 minutes = 3 repeats of 40s Max Effort, 20s Z2)
+        ir.intervals(3, 40, zone_table.max_power, 20, z2),
         # 4 min Z3/Z4 block
-        ET.SubElement(workout_section, "SteadyState",
-                     Duration="240",
-                     Power="0.85")  # Z3/Z4
-        
+        ir.steady(240, 0.85),
         # Second 40/20 block (2 minutes = 3 repeats)
-        ET.SubElement(workout_section, "IntervalsT",
-                     Repeat="3",  # 3 repeats = 2 minutes (3 x (40s + 20s))
-                     OnDuration="40",
-                     OnPower="1.2",  # Max Effort
-                     OffDuration="20",
-                     OffPower="0.65")  # Z2
-        
+        ir.intervals(3, 40, zone_table.max_power, 20, z2),
         # 4 min recovery (1:1 ratio with the 4 min Z3/Z4 block)
-        ET.SubElement(workout_section, "SteadyState",
-                     Duration="240",
-                     Power="0.65")  # Z2
+        ir.steady(240, z2),  # Z2
+    ]))
 
     # Cool-down (Using range-based power)
-    ET.SubElement(workout_section, "Cooldown", 
-                  Duration=str(cooldown_time), 
-                  PowerLow="0.56", PowerHigh="0.75")
+    segments.append(ir.cooldown(cooldown_time, z2_low, z2_high))
 
-    # Convert XML to a formatted string
-    tree = ET.ElementTree(workout)
-    ET.indent(tree, space="\t")
+    segments = compact_segments(segments) if compact else ir.expand(segments)
+    return ir.Workout(workout_name, description, segments)
+
+# Function to build the workout_file element for a Gavin Special workout
+def build_zwo(workout_name, description, warmup_time, cooldown_time, num_sets, compact=True):
+    return ir.to_element(build_zwo_ir(workout_name, description, warmup_time, cooldown_time, num_sets, compact), ET)
+
+# Function to generate a Zwift workout .zwo file
+def generate_zwo(workout_name, description, warmup_time, intervals, cooldown_time, filename, num_sets):
+    workout = build_zwo_ir(workout_name, description, warmup_time, cooldown_time, num_sets)
 
     # Ensure the directory exists
     os.makedirs(os.path.dirname(filename), exist_ok=True)
 
-    # Save to file with proper XML declaration and CDATA
+    # Stream the XML, with the description as CDATA, straight into the file
     with open(filename, "wb") as f:
-        f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
-        # Write the description with CDATA
-        xml_str = ET.tostring(workout, encoding='unicode')
-        xml_str = xml_str.replace('<description>', '<description><![CDATA[')
-        xml_str = xml_str.replace('</description>', ']]></description>')
-        f.write(xml_str.encode('utf-8'))
+        write_workout(workout, f)
 
     print(f"Workout '{workout_name}' saved as {filename}")
 
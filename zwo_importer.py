@@ -0,0 +1,220 @@
+"""Read existing .zwo files back into the workout IR.
+
+``import_zwo`` streams a file through lxml ``iterparse``: each block under
+<workout> becomes a Segment (or, for IntervalsT, a Repeat of an on/off
+pair) as soon as its end tag is seen, and the element is then cleared and
+detached, so even a huge file never sits in memory as a tree. The result
+is compacted like generated workouts unless ``compact=False``.
+
+``import_many`` / ``import_directory`` ingest a whole library on a process
+pool, yielding results in input order with only a bounded window of
+chunks in flight.
+"""
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lxml import etree as ET
+
+import workout_ir as ir
+from segment_compactor import compact_segments
+
+logger = logging.getLogger(__name__)
+
+# Files per task in bulk mode; enough to amortize pickling, small enough to balance
+CHUNK_SIZE = 64
+
+_HEADER_FIELDS = {'author': 'author', 'name': 'name', 'description': 'description', 'sportType': 'sport_type'}
+_SEGMENT_KINDS = (ir.STEADY, ir.WARMUP, ir.COOLDOWN, ir.RAMP, ir.FREERIDE)
+
+
+def _number(attrib, name, convert=float):
+    value = attrib.get(name)
+    if value is None:
+        return None
+    try:
+        return convert(float(value)) if convert is int else convert(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name} value: {value!r}")
+
+
+def _duration(attrib, name='Duration'):
+    duration = _number(attrib, name, int)
+    if duration is None:
+        raise ValueError(f"Missing {name}")
+    if duration <= 0:
+        raise ValueError(f"{name} must be positive: {attrib.get(name)!r}")
+    return duration
+
+
+def _powers(attrib, prefix=''):
+    """(low, high) from ``<prefix>Power`` or ``<prefix>PowerLow``/``<prefix>PowerHigh``."""
+    power = _number(attrib, f'{prefix}Power')
+    low = _number(attrib, f'{prefix}PowerLow')
+    high = _number(attrib, f'{prefix}PowerHigh')
+    if low is None and high is None:
+        return power, power
+    if low is None or high is None:
+        low = high = low if high is None else high
+    return low, high
+
+
+def _segment(tag, attrib):
+    low, high = _powers(attrib)
+    return ir.Segment(tag, _duration(attrib), low, high, _number(attrib, 'Cadence', int))
+
+
+def _intervals(attrib):
+    """IntervalsT as a Repeat of its on/off pair; powers may be single or ranges."""
+    count = _number(attrib, 'Repeat', int)
+    if count is None:
+        count = 1
+    elif count <= 0:
+        raise ValueError(f"Repeat must be positive: {attrib.get('Repeat')!r}")
+    cadence = _number(attrib, 'Cadence', int)
+    resting = _number(attrib, 'CadenceResting', int)
+    on_low, on_high = _powers(attrib, 'On')
+    off_low, off_high = _powers(attrib, 'Off')
+    if on_low is None or off_low is None:
+        raise ValueError("IntervalsT needs on and off powers")
+    return ir.Repeat(count, [
+        ir.steady_range(_duration(attrib, 'OnDuration'), on_low, on_high, cadence),
+        ir.steady_range(_duration(attrib, 'OffDuration'), off_low, off_high,
+                        cadence if resting is None else resting),
+    ])
+
+
+def _release(element):
+    """Free a handled element and any earlier siblings still attached."""
+    element.clear()
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def import_zwo(source, compact: bool = True) -> ir.Workout:
+    """Parse a .zwo file (a path or binary file object) into a Workout IR.
+
+    Raises ValueError for files that aren't workouts, use a block type the
+    IR can't represent or have non-positive durations, and lxml's
+    XMLSyntaxError for malformed XML.
+    """
+    workout = ir.Workout(author=None)
+    segments, tags = [], []
+    saw_root = False
+    for _, element in ET.iterparse(source, events=('end',), resolve_entities=False,
+                                   no_network=True, remove_comments=True, remove_pis=True):
+        tag = element.tag
+        parent = element.getparent()
+        parent_tag = parent.tag if parent is not None else None
+        if parent_tag == 'workout':
+            if tag == 'IntervalsT':
+                segments.append(_intervals(element.attrib))
+            elif tag in _SEGMENT_KINDS:
+                segments.append(_segment(tag, element.attrib))
+            else:
+                raise ValueError(f"Unsupported workout element: {tag}")
+            _release(element)
+        elif parent_tag == 'workout_file':
+            if tag in _HEADER_FIELDS:
+                setattr(workout, _HEADER_FIELDS[tag], element.text or '')
+            _release(element)
+        elif parent_tag == 'tags' and tag == 'tag':
+            # Zwift writes <tag name="INTERVALS"/>; older files put the text inside
+            tags.append(element.get('name') or element.text or '')
+        elif parent is None:
+            saw_root = tag == 'workout_file'
+        # Anything deeper (textevent cues inside a block) is dropped with its block
+    if not saw_root:
+        raise ValueError("Not a ZWO workout file")
+
+    if workout.author is None:
+        workout.author = ir.DEFAULT_AUTHOR
+    workout.tags = tags
+    workout.segments = compact_segments(segments) if compact else segments
+    return workout
+
+
+def _import_chunk(paths: List[str], compact: bool) -> List[Tuple[str, Optional[ir.Workout], Optional[Dict]]]:
+    results = []
+    for path in paths:
+        try:
+            results.append((path, import_zwo(path, compact), None))
+        except Exception as e:
+            # Whatever a bad file raises, it must not take the rest of its chunk with it
+            results.append((path, None, {"path": path, "error": str(e), "error_type": type(e).__name__}))
+    return results
+
+
+def _chunks(paths: Iterable[str], size: int) -> Iterator[List[str]]:
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_many(paths: Iterable[str], workers: int = 1, compact: bool = True,
+                chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, Optional[ir.Workout], Optional[Dict]]]:
+    """Import many files, yielding ``(path, workout, error)`` in input order.
+
+    With ``workers`` > 1 chunks of files are parsed on a process pool, with
+    at most two chunks per worker in flight. Failures are reported as an
+    error dict rather than raised.
+    """
+    if not workers or workers <= 1:
+        for chunk in _chunks(paths, chunk_size):
+            yield from _import_chunk(chunk, compact)
+        return
+
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in _chunks(paths, chunk_size):
+            pending.append(executor.submit(_import_chunk, chunk, compact))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def iter_zwo_files(directory: str) -> Iterator[str]:
+    """Every .zwo file under ``directory``, recursively, in a stable order."""
+    with os.scandir(directory) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from iter_zwo_files(entry.path)
+        elif entry.name.lower().endswith('.zwo') and entry.is_file():
+            yield entry.path
+
+
+def import_directory(directory: str, workers: Optional[int] = None, compact: bool = True,
+                     chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, Optional[ir.Workout], Optional[Dict]]]:
+    """Import every .zwo file under ``directory``; ``workers`` defaults to the CPU count."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return import_many(iter_zwo_files(directory), workers, compact, chunk_size)
+
+
+if __name__ == '__main__':
+    import sys
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    imported = failed = 0
+    for target in sys.argv[1:] or ['.']:
+        results = import_directory(target) if os.path.isdir(target) else import_many([target])
+        for path, workout, error in results:
+            if error is None:
+                imported += 1
+                logger.debug("%s: %d blocks, %d s", path, len(workout.segments),
+                             ir.total_duration(workout.segments))
+            else:
+                failed += 1
+                logger.warning("%s: %s", path, error['error'])
+    logger.info("Imported %d workouts, %d failed", imported, failed)
@@ -0,0 +1,150 @@
+"""Incremental ZWO serializer for workout IR.
+
+``write_workout`` writes a workout straight to a binary file object (a
+file, a BytesIO, a socket's ``makefile('wb')``), element by element, with
+no intermediate tree or document string. Output is buffered into chunks of
+about ``CHUNK_SIZE`` characters so small writes don't each hit the sink.
+
+The description is written as CDATA by default. A ``]]>`` inside it is
+split across two CDATA sections, so any text round-trips; characters that
+XML 1.0 can't represent at all raise ValueError.
+"""
+import io
+import re
+
+import workout_ir as ir
+
+CHUNK_SIZE = 16 * 1024
+
+_INVALID_XML_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+_TEXT_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+_ATTR_SPECIAL_RE = re.compile(r'[&<>"\x00-\x1f\ufffe\uffff]')
+_ATTR_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;',
+                               '\n': '&#10;', '\r': '&#13;', '\t': '&#9;'})
+
+
+def _check(text):
+    if _INVALID_XML_RE.search(text):
+        raise ValueError("Text contains characters that are not allowed in XML")
+    return text
+
+
+def escape_text(text):
+    return _check(text).translate(_TEXT_ESCAPES)
+
+
+def escape_attribute(value):
+    return _check(value).translate(_ATTR_ESCAPES)
+
+
+def cdata(text):
+    """Wrap text in CDATA, splitting any ``]]>`` across two sections."""
+    return '<![CDATA[' + _check(text).replace(']]>', ']]]]><![CDATA[>') + ']]>'
+
+
+class _BufferedSink:
+    def __init__(self, out, chunk_size):
+        self.out = out
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.out.write(''.join(self.parts).encode('utf-8'))
+            self.parts.clear()
+            self.size = 0
+
+
+def write_workout(workout, out, indent='\t', use_cdata=True, xml_declaration=True, chunk_size=CHUNK_SIZE):
+    """Serialize a Workout IR to the binary file object ``out``.
+
+    ``indent`` is the per-level indentation, or None for a single line.
+    The layout matches what ``ElementTree.indent`` plus ``tostring`` used
+    to produce, including ``<tags />`` for an empty tag list.
+    """
+    sink = _BufferedSink(out, chunk_size)
+    write = sink.write
+    one = '\n' + indent if indent is not None else ''
+    two = '\n' + indent * 2 if indent is not None else ''
+    end = '\n' if indent is not None else ''
+
+    if xml_declaration:
+        write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    write('<workout_file>')
+    write(f'{one}<author>{escape_text(workout.author)}</author>')
+    if workout.name is not None:
+        write(f'{one}<name>{escape_text(workout.name)}</name>')
+    description = cdata(workout.description) if use_cdata else escape_text(workout.description)
+    write(f'{one}<description>{description}</description>')
+    write(f'{one}<sportType>{escape_text(workout.sport_type)}</sportType>')
+    if workout.tags:
+        write(f'{one}<tags>')
+        for tag in workout.tags:
+            write(f'{two}<tag>{escape_text(tag)}</tag>')
+        write(f'{one}</tags>')
+    else:
+        write(f'{one}<tags />')
+
+    lines = _element_lines(workout.segments, two, {})
+    first = next(lines, None)
+    if first is None:
+        write(f'{one}<workout />')
+    else:
+        write(f'{one}<workout>')
+        write(first)
+        for line in lines:
+            write(line)
+        write(f'{one}</workout>')
+    write(f'{end}</workout_file>')
+    sink.flush()
+
+
+def _segment_key(segment):
+    return (segment.kind, segment.duration, segment.power_low, segment.power_high, segment.cadence)
+
+
+def _element_lines(segments, prefix, cache):
+    """Serialized elements, in ir.iter_elements order.
+
+    Identical segments share one cached string, and a repeat that has to
+    be expanded serializes its body once.
+    """
+    for node in segments:
+        if isinstance(node, ir.Repeat):
+            pair = ir.interval_pair(node)
+            if pair is None:
+                body = list(_element_lines(node.body, prefix, cache))
+                for _ in range(node.count):
+                    yield from body
+                continue
+            key = ('IntervalsT', node.count, _segment_key(pair[0]), _segment_key(pair[1]))
+            line = cache.get(key)
+            if line is None:
+                line = cache[key] = f'{prefix}<IntervalsT{_attributes(ir.interval_attributes(node.count, *pair))} />'
+        else:
+            key = _segment_key(node)
+            line = cache.get(key)
+            if line is None:
+                line = cache[key] = f'{prefix}<{node.kind}{_attributes(ir.segment_attributes(node))} />'
+        yield line
+
+
+def _attributes(attrib):
+    # Generated values are plain numbers; only escape when something needs it
+    if _ATTR_SPECIAL_RE.search(''.join(attrib.values())) is None:
+        return ''.join([f' {name}="{value}"' for name, value in attrib.items()])
+    return ''.join([f' {name}="{escape_attribute(value)}"' for name, value in attrib.items()])
+
+
+def serialize(workout, **options) -> bytes:
+    """Serialize a Workout IR to bytes; ``options`` are those of write_workout."""
+    buffer = io.BytesIO()
+    write_workout(workout, buffer, **options)
+    return buffer.getvalue()